@@ -15,7 +15,7 @@ class AnafiCamera:
 		the drone camera controls method interface
 	'''
 	
-	def __init__(self, drone_object, drone_ip, drone_rtsp_port, drone_url, download_dir):
+	def __init__(self, drone_object, drone_ip, drone_rtsp_port, drone_url, download_dir, stream_options=None):
 		'''
 		Parameters
 		----------
@@ -29,7 +29,9 @@ class AnafiCamera:
 			the url used request to make requests from the drone
 		download_dir : str
 			The location drone media will be downloaded
+		stream_options : dict, optional
+			setup_stream() defaults (default = None)
 		'''
 	
-		self.media = AnafiCameraMedia(drone_object, drone_ip, drone_rtsp_port, drone_url, download_dir)
+		self.media = AnafiCameraMedia(drone_object, drone_ip, drone_rtsp_port, drone_url, download_dir, stream_options)
 		self.controls = AnafiCameraControls(drone_object)
@@ -2,12 +2,19 @@ import csv
 import os
 import queue
 import threading
-import cv2
 import requests
 import shutil
 import olympe
-import json
 import datetime
+from AnafiMediaDownloader import AnafiMediaDownloader
+from AnafiFrameQueue import AnafiFrameQueue
+from AnafiFrameMailbox import AnafiFrameMailbox
+from AnafiSnapshotPublisher import AnafiSnapshotPublisher
+from AnafiStreamStats import AnafiStreamStats
+from AnafiRestreamer import AnafiRestreamer
+from AnafiFrameBus import AnafiFrameBus
+from AnafiTelemetry import frame_data
+from AnafiSegmentRecorder import AnafiSegmentRecorder
 from olympe.messages.ardrone3.PilotingState import PositionChanged
 #from olympe.video.renderer import PdrawRenderer
 
@@ -24,6 +31,19 @@ from olympe.messages.camera import (
 	recording_progress,
 )
 
+class PhotoProgressListener(olympe.EventListener):
+	'''
+	Forwards every photo_progress event to AnafiCameraMedia.photo_progress_cb
+	'''
+
+	def __init__(self, media):
+		self.media = media
+		super().__init__(media.drone)
+
+	@olympe.listen_event(photo_progress(_policy="check"))
+	def onPhotoProgress(self, event, scheduler):
+		self.media.photo_progress_cb(event.args)
+
 # << Camera Photo, Recording and Stream Methods >>			
 class AnafiCameraMedia:
 	'''
@@ -45,10 +65,18 @@ class AnafiCameraMedia:
 		the complete url used to make media requests from the drone
 	download_dir : str
 		The location drone media will be downloaded
+	stream_options : dict
+		setup_stream() defaults, used for every parameter the caller leaves to None
 	camera_mode : str
 		the drone's current camera mode (None, photo, recording, streaming)
 	media_id_list
 		A list of media id's of all media saved this mission
+	photo_log : dict[]
+		the drone position at every photo taken while the photo log is running
+	session : requests.Session
+		the http session shared by every media request
+	downloader : AnafiMediaDownloader
+		the background downloader while background downloads are running, else None
 		
 	Methods
 	-------
@@ -60,6 +88,16 @@ class AnafiCameraMedia:
 		Starts to take time/gps lapse photos
 	stop_lapse_photo()
 		Stops current time/gps lapse photos
+	start_photo_log()
+		Starts logging the drone position at every photo taken
+	stop_photo_log(path)
+		Stops the photo log and optionally writes it to a csv file
+	start_background_download(path, max_workers)
+		Starts downloading every new photo as soon as it is saved
+	stop_background_download(timeout)
+		Waits for queued downloads to finish and stops background downloads
+	sync_media(path, max_workers, max_bandwidth)
+		Downloads every media on the drone that is not already on disk
 	setup_recording(mode, resolution, framerate, hyperlapse)
 		Prepares the drone camera for recording, and changes camera_mode to "recording"
 	start_recording()
@@ -72,15 +110,21 @@ class AnafiCameraMedia:
 		Downloads the given media with the given download name at the given location
 	download_last_media(name, path)
 		Downloads the last media taken at the given download name at the given location
-	setup_stream(value, record, yuv_frame_processing, yuv_frame_cb, h264_frame_cb, start_cb, end_cb, flush_cb)
+	setup_stream(value, record, yuv_frame_processing, yuv_frame_cb, h264_frame_cb, start_cb, end_cb, flush_cb, frame_queue_depth, frame_rate, snapshot_quality, snapshot_width, restream, restream_port, hls_segment, hls_window, frame_bus_slots, snapshot_rate, record_mode, segment_duration, record_max_bytes, record_dir)
 		Prepares the drone camera for streaming, and changes camera_mode to "streaming"
 	start_stream()
 		Starts the live video stream
+	next_frame(timeout)
+		Returns the next decoded frame to process, from the frame mailbox or frame queue
+	locate_recording(timestamp, frame, session)
+		Returns the recorded segment and offset of a stream timestamp or frame number
+	get_stream_stats()
+		Returns the live H.264 stream metrics, None if the default h264 callback is not used
 	strop_stream()
 		Stops the current live video stream
 	'''
 
-	def __init__(self, drone_object, drone_ip, drone_rtsp_port, drone_url, download_dir):
+	def __init__(self, drone_object, drone_ip, drone_rtsp_port, drone_url, download_dir, stream_options=None):
 		'''
 		Parameters
 		----------
@@ -94,6 +138,8 @@ class AnafiCameraMedia:
 			the url used request to make requests from the drone
 		download_dir : str
 			The location drone media will be downloaded
+		stream_options : dict, optional
+			setup_stream() defaults, e.g. {"restream": True, "restream_port": 8888} from config.toml (default = None)
 		media_id_list : str[]
 			A list of the media id's of all taken media
 		'''
@@ -105,8 +151,15 @@ class AnafiCameraMedia:
 		self.drone_media_api_url = self.drone_url + "api/v1/media/medias/"
 
 		self.download_dir = download_dir
+		self.stream_options = stream_options or {}
 		self.camera_mode = "None"
 		self.media_id_dict = {}
+		self.photo_log = []
+		self.photo_logging = False
+		self.photo_listener = None
+		self.session = requests.Session()
+		self.downloader = None
+		self.download_path = None
 	
 	# << Photo Methods >>
 	def setup_photo(self,
@@ -191,6 +244,74 @@ class AnafiCameraMedia:
 		self.add_last_media()
 		print("< Lapse Photo Stopped >")
 
+	def start_photo_log(self):
+		'''
+		Starts logging the drone position at every photo taken, including each
+		photo of a time/gps lapse
+		'''
+
+		self.photo_log = []
+		self.photo_logging = True
+		self.subscribe_photo_progress()
+		print("< Photo Log Started >")
+
+	def stop_photo_log(self, path=None):
+		'''
+		Stops the photo log and optionally writes it to a csv file
+		
+		Parameters
+		----------
+		path : str, optional
+			the csv file to write the photo log to, if None is provided nothing is written
+		
+		Return
+		----------
+		photo_log : dict[]
+			one row per photo taken (time, media_id, photo_count, latitude, longitude, altitude)
+		'''
+
+		self.photo_logging = False
+		self.unsubscribe_photo_progress()
+		if path is not None:
+			with open(path, "w", newline="") as log_file:
+				writer = csv.DictWriter(
+					log_file, ["time", "media_id", "photo_count", "latitude", "longitude", "altitude"]
+				)
+				writer.writeheader()
+				writer.writerows(self.photo_log)
+		print("< Photo Log Stopped >")
+		return self.photo_log
+
+	def subscribe_photo_progress(self):
+		if self.photo_listener is None:
+			self.photo_listener = PhotoProgressListener(self)
+			self.photo_listener.subscribe()
+
+	def unsubscribe_photo_progress(self):
+		# the listener stays subscribed while the photo log or background downloads need it
+		if self.photo_listener is not None and not self.photo_logging and self.downloader is None:
+			self.photo_listener.unsubscribe()
+			self.photo_listener = None
+
+	def photo_progress_cb(self, args):
+		'''
+		Called by the photo listener for each photo_progress event
+		'''
+
+		result = getattr(args["result"], "name", args["result"])
+		if result == "photo_taken":
+			latitude, longitude, altitude = self.getDroneCoordinates()
+			self.photo_log.append({
+				"time": datetime.datetime.now().isoformat(),
+				"media_id": args.get("media_id", ""),
+				"photo_count": args.get("photo_count", len(self.photo_log) + 1),
+				"latitude": latitude,
+				"longitude": longitude,
+				"altitude": altitude,
+			})
+		elif result == "photo_saved" and self.downloader is not None:
+			self.downloader.submit(args["media_id"], self.download_path)
+
 	# << Recording Methods >>
 	def setup_recording(self,
 		mode = "standard",
@@ -288,7 +409,7 @@ class AnafiCameraMedia:
 			the location of the downloaded image
 		'''
 		
-		media_info_response = requests.get(self.drone_media_api_url + media_id)
+		media_info_response = self.session.get(self.drone_media_api_url + media_id)
 		media_info_response.raise_for_status()
 
 		# self.download_dir = f'/home/icicle/icicleEdge/local.softwarepilotservice/static/{folderName}/'
@@ -299,7 +420,7 @@ class AnafiCameraMedia:
 		# os.mkdir(self.download_dir)
 		# Download the photo
 		for resource in media_info_response.json()["resources"]:
-			image_response = requests.get(self.drone_url + resource["url"], stream=True)
+			image_response = self.session.get(self.drone_url + resource["url"], stream=True)
 			if path == None:
 				if name == None:
 					download_path = os.path.join(self.download_dir, resource["resource_id"])
@@ -351,6 +472,82 @@ class AnafiCameraMedia:
 		media_id = self.media_saved.received_events().last().args["media_id"]
 		return self.download_media(media_id, name, path)
 	
+	def start_background_download(self, path=None, max_workers=4):
+		'''
+		Starts downloading every new photo as soon as the drone reports it saved.
+		Downloads run on a worker pool so flight and capture are never blocked.
+		
+		Parameters
+		----------
+		path : str, optional
+			the location to download the media at, if None is provided it will
+			default to self.download_dir
+		max_workers : int, optional
+			the number of concurrent downloads (default = 4)
+		'''
+
+		if self.downloader is None:
+			self.download_path = path
+			if path is not None:
+				os.makedirs(path, exist_ok=True)
+			self.downloader = AnafiMediaDownloader(self.drone_url, self.download_dir, max_workers=max_workers)
+			self.subscribe_photo_progress()
+		print("< Background Download Started >")
+
+	def stop_background_download(self, timeout=None):
+		'''
+		Waits for queued downloads to finish and stops background downloads
+		
+		Parameters
+		----------
+		timeout : float, optional
+			the maximum time to wait for queued downloads in seconds (default = no limit)
+		
+		Return
+		----------
+		failed : str[]
+			the media ids that did not finish downloading
+		'''
+
+		if self.downloader is None:
+			return []
+		downloader = self.downloader
+		self.downloader = None
+		self.unsubscribe_photo_progress()
+		failed = downloader.wait(timeout)
+		downloader.close(wait=False)
+		print("< Background Download Stopped >")
+		return failed
+	
+	def sync_media(self, path=None, max_workers=4, max_bandwidth=None):
+		'''
+		Downloads every media on the drone that is not already on disk, according to
+		the download manifest kept in self.download_dir
+		
+		Parameters
+		----------
+		path : str, optional
+			the location to download the media at, if None is provided it will
+			default to self.download_dir
+		max_workers : int, optional
+			the number of concurrent downloads (default = 4)
+		max_bandwidth : float, optional
+			the combined download rate cap in bytes per second (default = no cap)
+		
+		Return
+		----------
+		summary : dict
+			see AnafiMediaDownloader.sync
+		'''
+
+		downloader = AnafiMediaDownloader(
+			self.drone_url, self.download_dir, max_workers=max_workers, max_bandwidth=max_bandwidth
+		)
+		try:
+			return downloader.sync(path)
+		finally:
+			downloader.close()
+	
 	# << Stream Methods >>
 	def setup_stream(self,
 		value = 2,
@@ -361,6 +558,20 @@ class AnafiCameraMedia:
 		start_cb = "None",
 		end_cb = "None",
 		flush_cb = "None",
+		frame_queue_depth = 4,
+		frame_rate = None,
+		snapshot_quality = 80,
+		snapshot_width = None,
+		restream = None,
+		restream_port = None,
+		hls_segment = 1.0,
+		hls_window = 6,
+		frame_bus_slots = None,
+		snapshot_rate = 1.0,
+		record_mode = "file",
+		segment_duration = 10.0,
+		record_max_bytes = 2 * 1024**3,
+		record_dir = None,
 	):
 		'''
 		Prepares the drone camera for streaming, and changes camera_mode to "streaming"
@@ -374,6 +585,16 @@ class AnafiCameraMedia:
 			- 2 or "hight_reliability_low_framerate"
 		record : bool, optional
 			if true the drone sends a recording of the videos (default = False)
+		record_mode : str, optional
+			how the stream is recorded when {record} is true (default = "file")
+			- "file": a single streaming.mp4 and metadata file for the session
+			- "segments": keyframe-aligned segments with a time index in {record_dir}, see AnafiSegmentRecorder
+		segment_duration : float, optional
+			the minimum duration of a recorded segment in seconds (default = 10)
+		record_max_bytes : int, optional
+			the disk budget of the recorded segments, the oldest are evicted beyond it (default = 2 GiB)
+		record_dir : str, optional
+			the directory of the recorded segments (default = stream_options["record_dir"], {download_dir}/recordings)
 		yuv_frame_processing : method, optional
 			a callback for live video processing
 			default: saves each yuv frame as an image from a frame queue
@@ -382,7 +603,7 @@ class AnafiCameraMedia:
 			default: sends each yuv frame to a frame queue
 		h264_frame_cb : method, optional
 			a callback for h264 frame processing
-			default: saves bitrate and framerate information
+			default: feeds bitrate, framerate and jitter to stream_stats
 		start_cb : method, optional
 			a callback for the start of the stream
 			default: pass
@@ -392,21 +613,87 @@ class AnafiCameraMedia:
 		flush_cb: method, optional
 			a callback to flush the frame queue
 			default: flushes the frame queue
+		frame_queue_depth : int, optional
+			the maximum number of decoded frames waiting for processing (default = 4)
+			once full the oldest frame is dropped, see frame_queue.stats()
+		frame_rate : float, optional
+			if provided, frames are delivered through a latest-frame mailbox at this
+			rate in Hz instead of the frame queue (default = None)
+			frames that are not needed are released in the stream callback
+		snapshot_quality : int, optional
+			the JPEG quality of the stream snapshot (default = 80)
+		snapshot_width : int, optional
+			the stream snapshot is downscaled to this width (default = None, frame resolution)
+		restream : bool, optional
+			if true the H.264 stream is remuxed to HLS, without decoding, and served at
+			http://localhost:{restream_port}/drone/index.m3u8 (default = stream_options["restream"], True)
+		restream_port : int, optional
+			the HTTP port of the HLS playlist (default = stream_options["restream_port"], 8888)
+		hls_segment : float, optional
+			the target HLS segment duration in seconds, segments are cut on keyframes (default = 1)
+		hls_window : int, optional
+			the number of segments listed in the HLS playlist (default = 6)
+		frame_bus_slots : int, optional
+			if set, every decoded frame is also copied into the shared memory frame bus
+			"anafi_frames" with this many slots (default = stream_options["frame_bus_slots"], 0 for no frame bus)
+			consumers attach with frame_bus.reader(), or AnafiFrameBusReader("anafi_frames")
+			from another process, and the snapshot publisher and segment recorder read the bus themselves
+		snapshot_rate : float, optional
+			the maximum snapshot rate in Hz when the snapshot publisher reads the frame bus (default = 1)
 		'''
 		
+		if restream is None:
+			restream = self.stream_options.get("restream", True)
+		if restream_port is None:
+			restream_port = self.stream_options.get("restream_port", 8888)
+		if frame_bus_slots is None:
+			frame_bus_slots = self.stream_options.get("frame_bus_slots", 0)
+		if record_dir is None:
+			record_dir = self.default_record_dir()
+
 		yuv_frame_processing, yuv_frame_cb, h264_frame_cb, start_cb, end_cb, flush_cb = self.cb_helper(
 			yuv_frame_processing, yuv_frame_cb, h264_frame_cb, start_cb, end_cb, flush_cb
 		)	
 	
+		self.stream_stats = None
 		if h264_frame_cb == self.h264_frame_cb:
-			self.h264_frame_stats = []
-			self.h264_stats_file = open("static/h264_stats.csv", "w+")
-			self.h264_stats_writer = csv.DictWriter(
-			    self.h264_stats_file, ["fps", "bitrate"]
+			self.stream_stats = AnafiStreamStats(window=1.0, path="static/h264_stats.csv", flush_interval=1.0)
+
+		self.frame_bus = AnafiFrameBus(name="anafi_frames", slots=frame_bus_slots) if frame_bus_slots else None
+
+		# every h264 consumer is called in turn from a single olympe callback
+		self.h264_consumers = [h264_frame_cb]
+		self.recorder = None
+		if record and record_mode == "segments":
+			self.recorder = AnafiSegmentRecorder(
+				record_dir=record_dir,
+				segment_duration=segment_duration,
+				max_bytes=record_max_bytes,
+				reader=self.frame_bus.reader("recorder") if self.frame_bus is not None else None,
 			)
-			self.h264_stats_writer.writeheader()
-
-		self.frame_queue = queue.Queue()
+			self.h264_consumers.append(self.recorder.push)
+		self.restreamer = None
+		if restream:
+			self.restreamer = AnafiRestreamer(
+				output_dir="static/hls",
+				name="drone",
+				port=restream_port,
+				segment_duration=hls_segment,
+				playlist_size=hls_window,
+			)
+			self.h264_consumers.append(self.restreamer.push)
+
+		self.frame_queue = AnafiFrameQueue(maxsize=frame_queue_depth)
+		self.frame_mailbox = AnafiFrameMailbox(rate=frame_rate) if frame_rate else None
+		self.frame_stamp = 0.0
+		self.snapshot_publisher = AnafiSnapshotPublisher(
+			image_path="static/stream.jpg",
+			data_path="static/stream_data.json",
+			quality=snapshot_quality,
+			max_width=snapshot_width,
+			reader=self.frame_bus.reader("snapshot") if self.frame_bus is not None else None,
+			rate=snapshot_rate,
+		)
 		self.processing_thread = threading.Thread(target= yuv_frame_processing)
 		self.renderer = None
 		self.frame_counter = 0
@@ -414,7 +701,7 @@ class AnafiCameraMedia:
 		if self.drone_rtsp_port is not None:
 			self.drone.streaming.server_addr = f"{self.drone_ip}:{self.drone_rtsp_port}"
 
-		if record == True:
+		if record == True and record_mode == "file":
 			self.drone.streaming.set_output_files(
 			    video=os.path.join(self.download_dir, "streaming.mp4"),
 			    metadata=os.path.join(self.download_dir, "streaming_metadata.json"),
@@ -422,7 +709,7 @@ class AnafiCameraMedia:
 
 		self.drone.streaming.set_callbacks(
 		    raw_cb = yuv_frame_cb,
-		    h264_cb = h264_frame_cb,
+		    h264_cb = self.h264_consumers_cb if len(self.h264_consumers) > 1 else h264_frame_cb,
 		    start_cb = start_cb,
 		    end_cb = end_cb,
 		    flush_raw_cb = flush_cb,
@@ -451,16 +738,39 @@ class AnafiCameraMedia:
 		self.drone.streaming.start()
 		#self.renderer = PdrawRenderer(pdraw=self.drone.streaming)
 		self.running = True
+		self.snapshot_publisher.start()
+		if self.recorder is not None:
+			self.recorder.start()
+		if self.restreamer is not None:
+			try:
+				self.restreamer.start()
+			except OSError as e:
+				print(f"< Restream Failed : {e} >")
+				self.h264_consumers.remove(self.restreamer.push)
+				self.restreamer = None
 		self.processing_thread.start()
 		print("< Stream Started >")
 
 	def stop_stream(self):
 		self.running = False
 		self.processing_thread.join()
+		self.snapshot_publisher.stop()
+		if self.restreamer is not None:
+			self.restreamer.stop()
 		#if self.renderer is not None:
 		#	self.renderer.stop()
 		assert self.drone.streaming.stop()
-		print("< Stream Stopped >")
+		self.frame_queue.clear()
+		if self.frame_mailbox is not None:
+			self.frame_mailbox.clear()
+		if self.recorder is not None:
+			self.recorder.stop()
+		if self.stream_stats is not None:
+			self.stream_stats.close()
+		if self.frame_bus is not None:
+			self.frame_bus.close()
+		stats = self.frame_queue.stats()
+		print(f"< Stream Stopped : {stats['received']} frames received, {stats['dropped']} dropped >")
 
 	def yuv_frame_cb(self, yuv_frame):
 		"""
@@ -469,54 +779,65 @@ class AnafiCameraMedia:
 		:type yuv_frame: olympe.VideoFrame
 		"""
 		
+		if self.frame_bus is not None:
+			self.frame_bus.publish_frame(yuv_frame)
+
+		if self.frame_mailbox is not None:
+			self.frame_mailbox.offer(yuv_frame)
+			return
+
 		yuv_frame.ref()
 		self.frame_queue.put_nowait(yuv_frame)
+
+	def next_frame(self, timeout=0.1):
+		'''
+		Returns the next frame to process from the frame mailbox or frame queue, or None if
+		no frame arrived within {timeout} seconds. The caller must unref the returned frame.
+		'''
+
+		if self.frame_mailbox is not None:
+			yuv_frame, self.frame_stamp = self.frame_mailbox.get(newer_than=self.frame_stamp, timeout=timeout)
+			return yuv_frame
+		try:
+			return self.frame_queue.get(timeout=timeout)
+		except queue.Empty:
+			return None
 		
 	def yuv_frame_processing(self):
 		while self.running:
+			yuv_frame = self.next_frame(timeout=0.1)
+			if yuv_frame is None:
+				continue
 			try:
-				yuv_frame = self.frame_queue.get(timeout=0.1)
 				self.frame_counter += 1
 				
-				if self.frame_counter%20 == 0:
-					data = self.getMediaData()
-					
-					# the VideoFrame.info() dictionary contains some useful information
-					# such as the video resolution
-					info = yuv_frame.info()
-
-					height, width = (  # noqa
-						info["raw"]["frame"]["info"]["height"],
-						info["raw"]["frame"]["info"]["width"],
-					)
-
-					# yuv_frame.vmeta() returns a dictionary that contains additional
-					# metadata from the drone (GPS coordinates, battery percentage, ...)
-
-					# convert pdraw YUV flag to OpenCV YUV flag
-					cv2_cvt_color_flag = {
-						olympe.VDEF_I420: cv2.COLOR_YUV2BGR_I420,
-						olympe.VDEF_NV12: cv2.COLOR_YUV2BGR_NV12,
-					}[yuv_frame.format()]
-
-					cv2frame = cv2.cvtColor(yuv_frame.as_ndarray(), cv2_cvt_color_flag)
-					cv2.imwrite("static/stream.jpg", cv2frame)
-					
-					with open("static/stream_data.json", 'w') as coord_file:
-						json.dump(data, coord_file, default=str)
-	
-			except queue.Empty:
-				continue
-		# You should process your frames here and release (unref) them when you're done.
-		# Don't hold a reference on your frames for too long to avoid memory leaks and/or memory
-		# pool exhaustion.
-		yuv_frame.unref()
+				# the mailbox already samples frames in time, the queue delivers every frame,
+				# with a frame bus the snapshot publisher reads its own frames
+				if self.frame_bus is None and (self.frame_mailbox is not None or self.frame_counter%20 == 0):
+					self.save_snapshot(yuv_frame)
+			finally:
+				# You should process your frames here and release (unref) them when you're done.
+				# Don't hold a reference on your frames for too long to avoid memory leaks and/or memory
+				# pool exhaustion.
+				yuv_frame.unref()
+
+	def save_snapshot(self, yuv_frame):
+		'''
+		Hands the frame and its capture-time telemetry over to the snapshot publisher,
+		which encodes and writes stream.jpg and stream_data.json off this thread
+		'''
+
+		data = frame_data(yuv_frame)
+		if data is None:
+			data = self.getMediaData()
+		self.snapshot_publisher.submit(yuv_frame, data)
 
 	def flush_cb(self, stream):
 		if stream["vdef_format"] != olympe.VDEF_I420:
 			return True
-		while not self.frame_queue.empty():
-			self.frame_queue.get_nowait().unref()
+		self.frame_queue.clear()
+		if self.frame_mailbox is not None:
+			self.frame_mailbox.clear()
 		return True
 	
 	def start_cb(self):
@@ -539,20 +860,32 @@ class AnafiCameraMedia:
 		# (bitrate and FPS) but we could choose to resend it over an another
 		# interface or to decode it with our preferred hardware decoder..
 
-		# Compute some stats and dump them in a csv file
+		# Compute some stats, buffered and written to static/h264_stats.csv by stream_stats.
+		# Every frame counts towards FPS and bitrate, sync (IDR) frames are also tracked separately.
 		info = h264_frame.info()
-		frame_ts = info["ntp_raw_timestamp"]
-		if not bool(info["is_sync"]):
-			while len(self.h264_frame_stats) > 0:
-				start_ts, _ = self.h264_frame_stats[0]
-				if (start_ts + 1e6) < frame_ts:
-					self.h264_frame_stats.pop(0)
-				else:
-						break
-			self.h264_frame_stats.append((frame_ts, frame_size))
-			h264_fps = len(self.h264_frame_stats)
-			h264_bitrate = 8 * sum(map(lambda t: t[1], self.h264_frame_stats))
-			self.h264_stats_writer.writerow({"fps": h264_fps, "bitrate": h264_bitrate})
+		self.stream_stats.add(info["ntp_raw_timestamp"], frame_size, bool(info["is_sync"]))
+
+	def h264_consumers_cb(self, h264_frame):
+		for consumer in self.h264_consumers:
+			consumer(h264_frame)
+
+	def default_record_dir(self):
+		return self.stream_options.get("record_dir") or os.path.join(self.download_dir, "recordings")
+
+	def locate_recording(self, timestamp=None, frame=None, session=None):
+		recorder = getattr(self, "recorder", None) or AnafiSegmentRecorder(self.default_record_dir())
+		return recorder.locate(timestamp=timestamp, frame=frame, session=session)
+
+	def get_stream_stats(self):
+		stream_stats = getattr(self, "stream_stats", None)
+		if stream_stats is None:
+			return None
+		metrics = stream_stats.metrics()
+		if getattr(self, "restreamer", None) is not None:
+			metrics["restream"] = self.restreamer.stats()
+		if getattr(self, "frame_bus", None) is not None:
+			metrics["frame_bus"] = self.frame_bus.stats()
+		return metrics
 
 	def getMediaData(self):
 		date_time = datetime.datetime.now()
@@ -9,6 +9,36 @@ from AnafiRTH import AnafiRTH
 from olympe.messages.ardrone3.PilotingState import PositionChanged, AttitudeChanged
 from olympe.messages.obstacle_avoidance import set_mode, status
 
+def drone_addresses(connection_type = 1):
+	'''
+	Returns the drone's ip address, rtsp port and url for the given connection type
+	
+	Parameters
+	----------
+	connection_type : str or int, optional
+		The connection type to the drone (default = 1)
+		- 'physical' or 0
+		- 'controller' or 1
+	
+	Return
+	----------
+	addresses : (str, str, str)
+		the drone ip address, rtsp port and url used to make requests from the drone
+	'''
+	
+	if connection_type == "physical" or connection_type == 0:
+		drone_ip = "192.168.42.1"		
+		drone_rtsp_port = os.environ.get("DRONE_RTSP_PORT")
+		drone_url = "http://{}/".format(drone_ip)
+
+	elif connection_type == "controller" or connection_type == 1:
+		drone_ip = "192.168.53.1"		
+		drone_rtsp_port = os.environ.get("DRONE_RTSP_PORT", "554")
+		drone_url = "http://{}:180/".format(drone_ip)
+	else:
+		raise RuntimeError("Illegal object parameter")
+	return drone_ip, drone_rtsp_port, drone_url
+
 class AnafiController:
 	''' 
 	Parrot Olympe wrapper for controlling Parrot Anafi drones.
@@ -42,7 +72,7 @@ class AnafiController:
 		Returns drone's current gps coordinates
 	'''	
 	
-	def __init__(self, connection_type = 1, download_dir = "None"):
+	def __init__(self, connection_type = 1, download_dir = "None", stream_options = None):
 		'''
 		Parameters
 		----------
@@ -54,18 +84,10 @@ class AnafiController:
 			The location drone media will be downloaded (default = "None")
 			If none is provided it will download them to /AnafiMedia
 			If the directory does not exist it will be created
+		stream_options : dict, optional
+			setup_stream() defaults, e.g. from config.toml (default = None)
 		'''
-		if connection_type == "physical" or connection_type == 0:
-			self.drone_ip = "192.168.42.1"		
-			self.drone_rtsp_port = os.environ.get("DRONE_RTSP_PORT")
-			self.drone_url = "http://{}/".format(self.drone_ip)
-
-		elif connection_type == "controller" or connection_type == 1:
-			self.drone_ip = "192.168.53.1"		
-			self.drone_rtsp_port = os.environ.get("DRONE_RTSP_PORT", "554")
-			self.drone_url = "http://{}:180/".format(self.drone_ip)
-		else:
-			raise RuntimeError("Illegal object parameter")
+		self.drone_ip, self.drone_rtsp_port, self.drone_url = drone_addresses(connection_type)
 
 		self.drone = olympe.Drone(self.drone_ip)
 		if download_dir == "None":
@@ -78,7 +100,7 @@ class AnafiController:
 			self.download_dir = download_dir
 		
 		self.camera = AnafiCamera(self.drone, self.drone_ip, self.drone_rtsp_port, 
-			self.drone_url, self.download_dir)
+			self.drone_url, self.download_dir, stream_options)
 		self.piloting = AnafiPiloting(self.drone)
 		self.rth = AnafiRTH(self.drone)
 		self.rth.setup_rth()
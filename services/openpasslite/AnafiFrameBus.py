@@ -0,0 +1,549 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import tempfile
+import threading
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+MAGIC = 0x414E414649425553  # "ANAFIBUS"
+
+# int64 fields of the bus header, each reader entry and each slot header
+HEADER_FIELDS = 8
+MAGIC_FIELD, SLOTS_FIELD, SLOT_BYTES_FIELD, META_BYTES_FIELD, READERS_FIELD, WRITE_SEQ_FIELD = range(6)
+READER_FIELDS = 4
+ACTIVE_FIELD, CURSOR_FIELD, HELD_FIELD, MISSED_FIELD = range(4)
+SLOT_FIELDS = 8
+SEQ_FIELD, FRAME_NUMBER_FIELD, TIMESTAMP_FIELD, WIDTH_FIELD, HEIGHT_FIELD, FORMAT_FIELD, DATA_LEN_FIELD, META_LEN_FIELD = range(8)
+
+def bus_layout(slots, slot_bytes, meta_bytes, max_readers):
+	'''
+	Returns the byte offsets of the reader table, slot table and slot data, and the total size
+	'''
+
+	readers_offset = HEADER_FIELDS * 8
+	slots_offset = readers_offset + max_readers * READER_FIELDS * 8
+	data_offset = slots_offset + slots * SLOT_FIELDS * 8
+	size = data_offset + slots * (meta_bytes + slot_bytes)
+	return readers_offset, slots_offset, data_offset, size
+
+class AnafiBusLock:
+	'''
+	Exclusive flock on a lock file named after the bus, shared by the writer and every
+	reader in any process. It guards reader entry claims and slot pins and claims,
+	and the lock and unlock system calls order the shared memory accesses around them.
+	Each holder opens its own file, so threads of one process exclude each other too.
+	'''
+
+	def __init__(self, name):
+		directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+		self.path = os.path.join(directory, f"{name}.lock")
+		self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+
+	def __enter__(self):
+		fcntl.flock(self.fd, fcntl.LOCK_EX)
+		return self
+
+	def __exit__(self, *args):
+		fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+	def close(self):
+		# the lock file is left in place, readers of a later bus with the same name reuse it
+		os.close(self.fd)
+
+# segments created by this process, readers in the writer's process leave their tracking alone
+created_segments = set()
+
+def attach_shared_memory(name):
+	try:
+		return shared_memory.SharedMemory(name=name, track=False)
+	except TypeError:
+		# Python < 3.13 registers attached segments with the resource tracker, which
+		# would unlink the writer's segment when a reader process exits
+		shm = shared_memory.SharedMemory(name=name)
+		if name not in created_segments:
+			resource_tracker.unregister(shm._name, "shared_memory")
+		return shm
+
+class AnafiSharedFrames:
+	'''
+	numpy views over a frame bus shared memory segment
+	'''
+
+	def __init__(self, shm):
+		self.shm = shm
+		# checked before any view exists, so the segment can still be closed on failure
+		if int.from_bytes(bytes(shm.buf[:8]), sys.byteorder) != MAGIC:
+			raise ValueError(f"{shm.name} is not a frame bus")
+		header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+		self.slots = int(header[SLOTS_FIELD])
+		self.slot_bytes = int(header[SLOT_BYTES_FIELD])
+		self.meta_bytes = int(header[META_BYTES_FIELD])
+		self.max_readers = int(header[READERS_FIELD])
+		readers_offset, slots_offset, data_offset, _ = bus_layout(self.slots, self.slot_bytes, self.meta_bytes, self.max_readers)
+
+		self.header = header
+		self.readers = np.ndarray((self.max_readers, READER_FIELDS), dtype=np.int64, buffer=shm.buf, offset=readers_offset)
+		self.slot_table = np.ndarray((self.slots, SLOT_FIELDS), dtype=np.int64, buffer=shm.buf, offset=slots_offset)
+		self.slot_data = np.ndarray((self.slots, self.meta_bytes + self.slot_bytes), dtype=np.uint8, buffer=shm.buf, offset=data_offset)
+
+	def release(self):
+		# views must be dropped before the segment can be closed
+		self.header = self.readers = self.slot_table = self.slot_data = None
+
+class AnafiFrameBus:
+	'''
+	Shared memory ring of decoded stream frames for several readers
+
+	The stream callback copies each frame once into the next free slot, together
+	with a header (sequence, frame number, NTP timestamp, size, format) and the
+	frame's video metadata as JSON. Readers in this process or in other processes
+	(attached by {name}) get numpy views of the slots without copying.
+
+	Every reader has its own cursor and counts the frames it missed. A reader pins
+	the slot it is reading, and the writer skips pinned slots, so a view stays
+	valid until the reader releases it or asks for the next frame. Slow readers
+	never block the writer, they lose the oldest frames instead.
+
+	Reader entries, slot pins and the writer's slot claims all go through an
+	AnafiBusLock: the writer checks the pins and clears the slot sequence under the
+	lock, and a reader pins a slot and checks its sequence under the same lock, so
+	a pinned slot is never claimed. The sequence is only set again once the frame
+	is written. AnafiBusFrame.valid() re-checks it after a frame was copied,
+	seqlock style, as a last guard for consumers that hold on to a view after
+	releasing it.
+
+	The segment is sized from the first frame published. Larger frames (a stream
+	resolution change) are dropped and counted in {oversized}.
+
+	...
+
+	Attributes
+	----------
+	name : str
+		the shared memory segment name readers attach to
+	slots : int
+		the number of frames held in the ring
+	max_readers : int
+		the maximum number of readers attached at once
+	meta_bytes : int
+		the space reserved for each frame's metadata JSON
+	published : int
+		the number of frames written to the bus
+	oversized : int
+		the number of frames dropped because they did not fit in a slot
+
+	Methods
+	-------
+	publish_frame(yuv_frame)
+		Copies an olympe.VideoFrame into the ring
+	publish(yuv, vdef_format, frame_number, timestamp, metadata)
+		Copies a raw frame array into the ring
+	reader(name, latest)
+		Returns a reader attached to this bus
+	stats()
+		Returns the writer counters and the cursor, lag and missed frames of every reader
+	close()
+		Releases and unlinks the shared memory segment
+	'''
+
+	def __init__(self, name="anafi_frames", slots=8, max_readers=4, meta_bytes=4096):
+		'''
+		Parameters
+		----------
+		name : str, optional
+			the shared memory segment name (default = "anafi_frames")
+		slots : int, optional
+			the number of frames held in the ring, at least {max_readers} + 2 (default = 8)
+		max_readers : int, optional
+			the maximum number of readers attached at once (default = 4)
+		meta_bytes : int, optional
+			the space reserved for each frame's metadata JSON (default = 4096)
+		'''
+
+		if slots < max_readers + 2:
+			raise ValueError("slots must be at least max_readers + 2")
+		self.name = name
+		self.slots = slots
+		self.max_readers = max_readers
+		self.meta_bytes = meta_bytes
+
+		self.lock = threading.Lock()
+		self.bus_lock = None
+		self.shm = None
+		self.frames = None
+		self.last_slot = -1
+		self.frame_number = 0
+		self.published = 0
+		self.oversized = 0
+
+	def create(self, slot_bytes):
+		_, _, _, size = bus_layout(self.slots, slot_bytes, self.meta_bytes, self.max_readers)
+		try:
+			# a segment left over by a crashed session would keep its old layout
+			stale = shared_memory.SharedMemory(name=self.name)
+			stale.close()
+			stale.unlink()
+		except FileNotFoundError:
+			pass
+		self.bus_lock = AnafiBusLock(self.name)
+		self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+		created_segments.add(self.name)
+		header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+		header[:] = 0
+		header[SLOTS_FIELD] = self.slots
+		header[SLOT_BYTES_FIELD] = slot_bytes
+		header[META_BYTES_FIELD] = self.meta_bytes
+		header[READERS_FIELD] = self.max_readers
+		header[MAGIC_FIELD] = MAGIC
+		del header
+		self.frames = AnafiSharedFrames(self.shm)
+		self.frames.readers[:] = 0
+		self.frames.slot_table[:] = 0
+
+	def publish_frame(self, yuv_frame):
+		'''
+		Copies an olympe.VideoFrame into the ring, called from the stream callback.
+		The frame is not ref'd, olympe keeps ownership.
+		'''
+
+		info = yuv_frame.info()
+		try:
+			metadata = yuv_frame.vmeta()[1]
+		except Exception:
+			metadata = None
+		return self.publish(yuv_frame.as_ndarray(), yuv_frame.format(), timestamp=info.get("ntp_raw_timestamp", 0), metadata=metadata)
+
+	def publish(self, yuv, vdef_format, frame_number=None, timestamp=0, metadata=None):
+		'''
+		Copies a raw (height * 3 / 2, width) frame into the next free slot
+
+		Return
+		----------
+		published : bool
+			false if the frame did not fit in a slot
+		'''
+
+		with self.lock:
+			if self.shm is None:
+				self.create(yuv.nbytes)
+			frames = self.frames
+			if yuv.nbytes > frames.slot_bytes:
+				self.oversized += 1
+				return False
+
+			meta = json.dumps(metadata, default=str).encode() if metadata is not None else b""
+			if len(meta) > self.meta_bytes:
+				meta = b""
+
+			# skip slots pinned by a reader, there are always at least two free slots.
+			# A reader pinning the claimed slot after the lock is released sees the
+			# cleared sequence and picks another frame.
+			with self.bus_lock:
+				for step in range(1, self.slots + 1):
+					slot = (self.last_slot + step) % self.slots
+					row = frames.slot_table[slot]
+					if not self.pinned(int(row[SEQ_FIELD])):
+						row[SEQ_FIELD] = 0
+						break
+
+			self.frame_number = frame_number if frame_number is not None else self.frame_number + 1
+			height, width = yuv.shape[0] * 2 // 3, yuv.shape[1]
+			seq = int(frames.header[WRITE_SEQ_FIELD]) + 1
+
+			data = frames.slot_data[slot]
+			data[:len(meta)] = np.frombuffer(meta, dtype=np.uint8)
+			np.copyto(data[self.meta_bytes:self.meta_bytes + yuv.nbytes].reshape(yuv.shape), yuv)
+			row[FRAME_NUMBER_FIELD] = self.frame_number
+			row[TIMESTAMP_FIELD] = timestamp
+			row[WIDTH_FIELD] = width
+			row[HEIGHT_FIELD] = height
+			row[FORMAT_FIELD] = vdef_format
+			row[DATA_LEN_FIELD] = yuv.nbytes
+			row[META_LEN_FIELD] = len(meta)
+			row[SEQ_FIELD] = seq
+			frames.header[WRITE_SEQ_FIELD] = seq
+
+			self.last_slot = slot
+			self.published += 1
+			return True
+
+	def pinned(self, seq):
+		readers = self.frames.readers
+		return seq != 0 and bool(np.any((readers[:, ACTIVE_FIELD] != 0) & (readers[:, HELD_FIELD] == seq)))
+
+	def reader(self, name=None, latest=True):
+		return AnafiFrameBusReader(self.name, name=name, latest=latest)
+
+	def stats(self):
+		with self.lock:
+			stats = {"published": self.published, "oversized": self.oversized, "readers": []}
+			if self.frames is None:
+				return stats
+			write_seq = int(self.frames.header[WRITE_SEQ_FIELD])
+			for index, entry in enumerate(self.frames.readers):
+				if entry[ACTIVE_FIELD] != 0:
+					stats["readers"].append({
+						"index": index,
+						"cursor": int(entry[CURSOR_FIELD]),
+						"lag": write_seq - int(entry[CURSOR_FIELD]),
+						"missed": int(entry[MISSED_FIELD]),
+					})
+			return stats
+
+	def close(self):
+		with self.lock:
+			if self.shm is None:
+				return
+			self.frames.release()
+			self.frames = None
+			self.shm.close()
+			self.shm.unlink()
+			self.shm = None
+			self.bus_lock.close()
+			self.bus_lock = None
+			created_segments.discard(self.name)
+		print(f"< Frame Bus Closed : {self.published} frames published >")
+
+class AnafiFrameBusReader:
+	'''
+	Reads frames from an AnafiFrameBus, in this process or another one
+
+	The reader attaches to the bus segment by name as soon as it exists (at
+	creation or on the first get()) and only sees frames published after that. With {latest} it jumps to the newest
+	frame on every get(), otherwise it reads frames in order while they are still
+	in the ring. Frames that were overwritten before the reader got to them, or
+	that were skipped to reach the newest frame, are counted in {missed}.
+
+	...
+
+	Attributes
+	----------
+	bus_name : str
+		the shared memory segment name of the bus
+	name : str
+		a label for this reader, used in log messages
+	latest : bool
+		if true get() returns the newest frame, otherwise the next frame in order
+	read : int
+		the number of frames returned
+	missed : int
+		the number of frames this reader never saw
+	lag : int
+		how many frames the writer was ahead of the last frame returned
+
+	Methods
+	-------
+	get(timeout)
+		Waits for the next frame, returns an AnafiBusFrame or None on timeout
+	release()
+		Unpins the frame returned by the last get()
+	stats()
+		Returns the reader counters
+	close()
+		Releases the reader entry and detaches from the bus
+	'''
+
+	def __init__(self, bus_name="anafi_frames", name=None, latest=True, poll_interval=0.002):
+		'''
+		Parameters
+		----------
+		bus_name : str, optional
+			the shared memory segment name of the bus (default = "anafi_frames")
+		name : str, optional
+			a label for this reader (default = None)
+		latest : bool, optional
+			if true get() returns the newest frame, otherwise the next frame in order (default = True)
+		poll_interval : float, optional
+			the time in seconds between two checks for a new frame (default = 0.002)
+		'''
+
+		self.bus_name = bus_name
+		self.name = name or f"reader-{os.getpid()}"
+		self.latest = latest
+		self.poll_interval = poll_interval
+
+		self.shm = None
+		self.frames = None
+		self.bus_lock = None
+		self.index = None
+		self.cursor = 0
+		self.read = 0
+		self.missed = 0
+		self.lag = 0
+		self.attach()
+
+	def attach(self):
+		try:
+			shm = attach_shared_memory(self.bus_name)
+		except FileNotFoundError:
+			return False
+		try:
+			frames = AnafiSharedFrames(shm)
+		except ValueError:
+			# the writer is still initialising the segment
+			shm.close()
+			return False
+
+		if self.bus_lock is None:
+			self.bus_lock = AnafiBusLock(self.bus_name)
+		with self.bus_lock:
+			free = np.flatnonzero(frames.readers[:, ACTIVE_FIELD] == 0)
+			if len(free) == 0:
+				frames.release()
+				shm.close()
+				raise RuntimeError(f"Frame bus {self.bus_name} has no free reader entry")
+			index = int(free[0])
+			frames.readers[index, HELD_FIELD] = 0
+			frames.readers[index, MISSED_FIELD] = 0
+			self.cursor = int(frames.header[WRITE_SEQ_FIELD])
+			frames.readers[index, CURSOR_FIELD] = self.cursor
+			frames.readers[index, ACTIVE_FIELD] = os.getpid()
+
+		self.shm, self.frames, self.index = shm, frames, index
+		return True
+
+	def get(self, timeout=None):
+		'''
+		Waits for a frame newer than the last one returned. The previous frame is released.
+
+		Parameters
+		----------
+		timeout : float, optional
+			the maximum time to wait in seconds (default = no limit)
+
+		Return
+		----------
+		frame : AnafiBusFrame
+			a view of the frame in shared memory, valid until release() or the next get(), or None on timeout
+		'''
+
+		self.release()
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			if self.frames is not None or self.attach():
+				frame = self.pin_next()
+				if frame is not None:
+					return frame
+			if deadline is not None and time.monotonic() >= deadline:
+				return None
+			time.sleep(self.poll_interval)
+
+	def pin_next(self):
+		frames = self.frames
+		entry = frames.readers[self.index]
+		while True:
+			seqs = frames.slot_table[:, SEQ_FIELD].copy()
+			candidates = np.flatnonzero(seqs > self.cursor)
+			if len(candidates) == 0:
+				return None
+			if self.latest:
+				slot = candidates[np.argmax(seqs[candidates])]
+			else:
+				slot = candidates[np.argmin(seqs[candidates])]
+			seq = int(seqs[slot])
+
+			# pin, unless the writer took the slot in the meantime
+			with self.bus_lock:
+				if frames.slot_table[slot, SEQ_FIELD] == seq:
+					entry[HELD_FIELD] = seq
+					break
+
+		self.missed += seq - self.cursor - 1
+		self.lag = int(frames.header[WRITE_SEQ_FIELD]) - seq
+		self.cursor = seq
+		self.read += 1
+		entry[CURSOR_FIELD] = seq
+		entry[MISSED_FIELD] = self.missed
+		return AnafiBusFrame(self, slot, seq)
+
+	def release(self):
+		if self.frames is not None:
+			self.frames.readers[self.index, HELD_FIELD] = 0
+
+	def stats(self):
+		return {
+			"name": self.name,
+			"read": self.read,
+			"missed": self.missed,
+			"lag": self.lag,
+		}
+
+	def close(self):
+		if self.frames is not None:
+			with self.bus_lock:
+				self.frames.readers[self.index] = 0
+			self.frames.release()
+			self.frames = None
+			self.shm.close()
+			self.shm = None
+		if self.bus_lock is not None:
+			self.bus_lock.close()
+			self.bus_lock = None
+
+class AnafiBusFrame:
+	'''
+	A frame pinned in the frame bus, with the olympe.VideoFrame accessors consumers use
+
+	as_ndarray() is a view of the shared memory slot and is only valid until the
+	reader moves on. ref() and unref() are provided so the frame can be handed to
+	code written for olympe frames, unref() releases the pin once the count drops
+	to zero.
+	'''
+
+	def __init__(self, reader, slot, seq):
+		row = reader.frames.slot_table[slot]
+		self.reader = reader
+		self.slot = slot
+		self.seq = seq
+		self.frame_number = int(row[FRAME_NUMBER_FIELD])
+		self.timestamp = int(row[TIMESTAMP_FIELD])
+		self.width = int(row[WIDTH_FIELD])
+		self.height = int(row[HEIGHT_FIELD])
+		self.vdef_format = int(row[FORMAT_FIELD])
+		self.data_len = int(row[DATA_LEN_FIELD])
+		self.meta_len = int(row[META_LEN_FIELD])
+		self.refs = 1
+
+	def as_ndarray(self):
+		data = self.reader.frames.slot_data[self.slot]
+		meta_bytes = self.reader.frames.meta_bytes
+		return data[meta_bytes:meta_bytes + self.data_len].reshape(self.height * 3 // 2, self.width)
+
+	def format(self):
+		return self.vdef_format
+
+	def info(self):
+		return {"ntp_raw_timestamp": self.timestamp, "frame_number": self.frame_number}
+
+	def metadata(self):
+		if self.meta_len == 0:
+			return None
+		return json.loads(self.reader.frames.slot_data[self.slot, :self.meta_len].tobytes())
+
+	def valid(self):
+		'''
+		Returns True while the slot still holds this frame. Checked after reading or
+		copying the frame, it proves the writer did not overwrite it meanwhile.
+		'''
+
+		frames = self.reader.frames
+		return frames is not None and bool(frames.slot_table[self.slot, SEQ_FIELD] == self.seq)
+
+	def copy(self):
+		'''
+		Returns a copy of the frame, None if the writer overwrote the slot while it was copied
+		'''
+
+		data = self.as_ndarray().copy()
+		return data if self.valid() else None
+
+	def ref(self):
+		self.refs += 1
+
+	def unref(self):
+		self.refs -= 1
+		if self.refs == 0 and self.reader.cursor == self.seq:
+			self.reader.release()
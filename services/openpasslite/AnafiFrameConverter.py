@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+import olympe
+
+class AnafiFrameConverter:
+	'''
+	Converts decoded YUV stream frames into preallocated output buffers
+
+	Destination buffers are allocated once per input resolution and format and
+	reused for every frame. When an output width is set, the Y and UV planes are
+	downscaled first and only the small frame is colour converted, so a 4K frame
+	headed for a 640px model never exists as a full resolution BGR image.
+
+	The returned array is reused by the next conversion: copy it if it must
+	outlive the next call.
+
+	...
+
+	Attributes
+	----------
+	width : int
+		the output width, None to keep the frame resolution
+	output : str
+		the output colour space
+		- "bgr" (height, width, 3) / "gray" (height, width) / "yuv" (height * 3 / 2, width), same layout as the input
+
+	Methods
+	-------
+	convert(yuv_frame)
+		Converts an olympe.VideoFrame
+	convert_array(yuv, vdef_format)
+		Converts a raw I420 or NV12 array
+	output_size(width, height)
+		Returns the output (width, height) for the given input size
+	'''
+
+	def __init__(self, width=None, output="bgr", interpolation=cv2.INTER_AREA):
+		'''
+		Parameters
+		----------
+		width : int, optional
+			the output width, the height follows the frame aspect ratio (default = None, frame resolution)
+		output : str, optional
+			the output colour space (default = "bgr")
+			- "bgr"/"gray"/"yuv"
+		interpolation : int, optional
+			the OpenCV interpolation used to downscale (default = cv2.INTER_AREA)
+		'''
+
+		if output not in ("bgr", "gray", "yuv"):
+			raise ValueError(f"Unsupported output: {output}")
+		self.width = width
+		self.output = output
+		self.interpolation = interpolation
+		self.buffers = {}
+
+	def convert(self, yuv_frame):
+		return self.convert_array(yuv_frame.as_ndarray(), yuv_frame.format())
+
+	def output_size(self, width, height):
+		if self.width is None or self.width >= width:
+			return width, height
+		out_width = self.width - self.width % 2
+		out_height = int(round(height * out_width / width / 2)) * 2
+		return out_width, out_height
+
+	def convert_array(self, yuv, vdef_format):
+		'''
+		Parameters
+		----------
+		yuv : ndarray
+			the (height * 3 / 2, width) uint8 I420 or NV12 frame
+		vdef_format : int
+			olympe.VDEF_I420 or olympe.VDEF_NV12
+
+		Return
+		----------
+		frame : ndarray
+			the converted frame, a view of a reused buffer
+		'''
+
+		height, width = yuv.shape[0] * 2 // 3, yuv.shape[1]
+		out_width, out_height = self.output_size(width, height)
+		buffers = self.get_buffers(width, height, vdef_format)
+
+		if (out_width, out_height) != (width, height):
+			small = buffers["yuv"]
+			self.resize_planes(yuv, small, width, height, out_width, out_height, vdef_format)
+			yuv = small
+
+		if self.output == "gray":
+			return yuv[:out_height]
+		if self.output == "yuv":
+			return yuv
+
+		cv2_cvt_color_flag = {
+			olympe.VDEF_I420: cv2.COLOR_YUV2BGR_I420,
+			olympe.VDEF_NV12: cv2.COLOR_YUV2BGR_NV12,
+		}[vdef_format]
+		return cv2.cvtColor(yuv, cv2_cvt_color_flag, dst=buffers["bgr"])
+
+	def resize_planes(self, src, dst, width, height, out_width, out_height, vdef_format):
+		cv2.resize(src[:height], (out_width, out_height), dst=dst[:out_height], interpolation=self.interpolation)
+		if vdef_format == olympe.VDEF_NV12:
+			# interleaved UV plane, resized as one 2-channel image
+			src_uv = src[height:].reshape(height // 2, width // 2, 2)
+			dst_uv = dst[out_height:].reshape(out_height // 2, out_width // 2, 2)
+			cv2.resize(src_uv, (out_width // 2, out_height // 2), dst=dst_uv, interpolation=self.interpolation)
+		else:
+			# planar U then V, each (height / 2, width / 2), addressed through flat views
+			src_flat, dst_flat = src.reshape(-1), dst.reshape(-1)
+			src_plane_size = (height // 2) * (width // 2)
+			dst_plane_size = (out_height // 2) * (out_width // 2)
+			for plane in range(2):
+				src_start = height * width + plane * src_plane_size
+				dst_start = out_height * out_width + plane * dst_plane_size
+				src_plane = src_flat[src_start:src_start + src_plane_size].reshape(height // 2, width // 2)
+				dst_plane = dst_flat[dst_start:dst_start + dst_plane_size].reshape(out_height // 2, out_width // 2)
+				cv2.resize(src_plane, (out_width // 2, out_height // 2), dst=dst_plane, interpolation=self.interpolation)
+
+	def get_buffers(self, width, height, vdef_format):
+		key = (width, height, vdef_format)
+		buffers = self.buffers.get(key)
+		if buffers is None:
+			out_width, out_height = self.output_size(width, height)
+			buffers = {
+				"yuv": np.empty((out_height * 3 // 2, out_width), dtype=np.uint8),
+				"bgr": np.empty((out_height, out_width, 3), dtype=np.uint8),
+			}
+			self.buffers[key] = buffers
+		return buffers
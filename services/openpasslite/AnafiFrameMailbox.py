@@ -0,0 +1,124 @@
+import time
+import threading
+
+class AnafiFrameMailbox:
+	'''
+	Single-slot mailbox holding only the newest olympe video frame
+
+	The stream callback offers every frame. Frames arriving before the consumer
+	is due for its next sample (set by {rate}) are never ref'd, so olympe
+	releases them as soon as the callback returns. A due frame replaces (and
+	unrefs) any frame still waiting in the slot, so the consumer always gets the
+	newest frame and never a backlog.
+
+	...
+
+	Attributes
+	----------
+	interval : float
+		the minimum time in seconds between two delivered frames
+	received : int
+		the number of frames offered by the stream
+	skipped : int
+		the number of frames released in the callback because no sample was due
+	replaced : int
+		the number of frames unref'd because a newer frame arrived before the consumer took them
+	delivered : int
+		the number of frames handed to the consumer
+
+	Methods
+	-------
+	offer(frame)
+		Stream callback side, keeps the frame if a sample is due
+	get(newer_than, timeout)
+		Consumer side, waits for a frame newer than {newer_than}
+	clear()
+		Unrefs and drops the waiting frame
+	stats()
+		Returns the mailbox counters
+	'''
+
+	def __init__(self, rate=None):
+		'''
+		Parameters
+		----------
+		rate : float, optional
+			the target delivery rate in Hz, if None is provided every frame is a candidate
+		'''
+
+		self.interval = 1.0 / rate if rate else 0.0
+		self.cond = threading.Condition(threading.Lock())
+		self.frame = None
+		self.stamp = 0.0
+		self.next_due = 0.0
+		self.received = 0
+		self.skipped = 0
+		self.replaced = 0
+		self.delivered = 0
+
+	def offer(self, frame):
+		'''
+		Called from the stream callback for each decoded frame, without a reference
+		'''
+
+		now = time.monotonic()
+		with self.cond:
+			self.received += 1
+			if now < self.next_due:
+				self.skipped += 1
+				return
+			frame.ref()
+			previous = self.frame
+			self.frame = frame
+			self.stamp = now
+			if previous is not None:
+				self.replaced += 1
+			self.cond.notify_all()
+		if previous is not None:
+			previous.unref()
+
+	def get(self, newer_than=0.0, timeout=None):
+		'''
+		Waits for a frame that arrived after {newer_than}. The caller owns the frame's
+		reference and must unref it once done.
+
+		Parameters
+		----------
+		newer_than : float, optional
+			a time.monotonic() arrival time, usually the stamp of the previous frame (default = 0)
+		timeout : float, optional
+			the maximum time to wait in seconds (default = no limit)
+
+		Return
+		----------
+		frame : olympe.VideoFrame
+			the newest frame, or None on timeout
+		stamp : float
+			the frame's time.monotonic() arrival time, or {newer_than} on timeout
+		'''
+
+		with self.cond:
+			ready = self.cond.wait_for(lambda: self.frame is not None and self.stamp > newer_than, timeout)
+			if not ready:
+				return None, newer_than
+			frame, stamp = self.frame, self.stamp
+			self.frame = None
+			self.next_due = stamp + self.interval
+			self.delivered += 1
+		return frame, stamp
+
+	def clear(self):
+		with self.cond:
+			frame = self.frame
+			self.frame = None
+		if frame is not None:
+			frame.unref()
+
+	def stats(self):
+		with self.cond:
+			return {
+				"received": self.received,
+				"skipped": self.skipped,
+				"replaced": self.replaced,
+				"delivered": self.delivered,
+			}
@@ -0,0 +1,112 @@
+import queue
+import threading
+from collections import deque
+
+class AnafiFrameQueue:
+	'''
+	Bounded ring queue of referenced olympe video frames
+
+	When the queue is full the oldest frame is unref'd and dropped so a slow
+	consumer sees fewer, fresher frames instead of an ever growing backlog that
+	exhausts the olympe frame pool.
+
+	...
+
+	Attributes
+	----------
+	maxsize : int
+		the maximum number of frames held at once
+	dropped : int
+		the number of frames dropped because the queue was full
+	received : int
+		the number of frames put in the queue
+
+	Methods
+	-------
+	put(frame) / put_nowait(frame)
+		Adds a frame, dropping the oldest one if the queue is full
+	get(timeout) / get_nowait()
+		Removes and returns the oldest frame, raises queue.Empty if there is none
+	clear()
+		Unrefs and drops every queued frame
+	depth()
+		Returns the number of frames currently queued
+	stats()
+		Returns the queue depth and counters
+	'''
+
+	def __init__(self, maxsize=4):
+		'''
+		Parameters
+		----------
+		maxsize : int, optional
+			the maximum number of frames held at once (default = 4)
+		'''
+
+		if maxsize < 1:
+			raise ValueError("maxsize must be at least 1")
+		self.maxsize = maxsize
+		self.frames = deque()
+		self.not_empty = threading.Condition(threading.Lock())
+		self.dropped = 0
+		self.received = 0
+
+	def put(self, frame):
+		'''
+		Adds a frame that the caller has already ref'd. The queue now owns that reference.
+		'''
+
+		oldest = None
+		with self.not_empty:
+			if len(self.frames) >= self.maxsize:
+				oldest = self.frames.popleft()
+				self.dropped += 1
+			self.frames.append(frame)
+			self.received += 1
+			self.not_empty.notify()
+		if oldest is not None:
+			oldest.unref()
+
+	put_nowait = put
+
+	def get(self, block=True, timeout=None):
+		'''
+		Removes and returns the oldest frame. The caller owns the frame's reference
+		and must unref it once done.
+		'''
+
+		with self.not_empty:
+			if block and not self.not_empty.wait_for(lambda: len(self.frames) > 0, timeout):
+				raise queue.Empty
+			if not self.frames:
+				raise queue.Empty
+			return self.frames.popleft()
+
+	def get_nowait(self):
+		return self.get(block=False)
+
+	def clear(self):
+		with self.not_empty:
+			frames = list(self.frames)
+			self.frames.clear()
+		for frame in frames:
+			frame.unref()
+
+	def empty(self):
+		return self.depth() == 0
+
+	def qsize(self):
+		return self.depth()
+
+	def depth(self):
+		with self.not_empty:
+			return len(self.frames)
+
+	def stats(self):
+		with self.not_empty:
+			return {
+				"depth": len(self.frames),
+				"maxsize": self.maxsize,
+				"received": self.received,
+				"dropped": self.dropped,
+			}
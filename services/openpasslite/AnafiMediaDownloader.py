@@ -0,0 +1,358 @@
+import os
+import json
+import hashlib
+import time
+import threading
+import requests
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from requests.adapters import HTTPAdapter
+
+class BandwidthLimiter:
+	'''
+	Caps the combined throughput of every download thread, in bytes per second
+	'''
+
+	def __init__(self, rate, burst=0.25):
+		self.rate = float(rate)
+		self.burst = burst
+		self.lock = threading.Lock()
+		self.next_free = time.monotonic()
+
+	def consume(self, size):
+		with self.lock:
+			now = time.monotonic()
+			start = max(self.next_free, now - self.burst)
+			self.next_free = start + size / self.rate
+			delay = self.next_free - now
+		if delay > 0:
+			time.sleep(delay)
+
+# << Background Media Download Methods >>
+class AnafiMediaDownloader:
+	'''
+	Downloads drone media in the background over a pooled HTTP session
+
+	...
+
+	Attributes
+	----------
+	drone_url : str
+		the url used request to make requests from the drone
+	drone_media_api_url : str
+		the complete url used to make media requests from the drone
+	download_dir : str
+		The location drone media will be downloaded
+	session : requests.Session
+		the shared http session, pooled for {max_workers} connections
+	manifest : dict
+		media_id -> resource_id -> {path, size, sha256} of every resource already on disk
+
+	Methods
+	-------
+	submit(media_id, path)
+		Queues the given media for download, returns a future
+	sync(path)
+		Downloads every resource on the drone that is missing from the manifest
+	download_media(media_id, path)
+		Downloads every resource of the given media that is not already on disk
+	download_resource(media_id, resource, path)
+		Downloads a single resource, resuming a partial file if there is one
+	claim(tmp_path)
+		Holds the given ".part" file for the calling thread, across every downloader
+	wait(timeout)
+		Waits until every queued download is finished
+	close(wait)
+		Stops the worker pool and closes the http session
+	'''
+
+	# ".part" file -> [lock, holders], shared by every downloader in the process so a
+	# mission's background downloads and a sync never write the same file at once
+	part_locks = {}
+	part_locks_guard = threading.Lock()
+
+	def __init__(self, drone_url, download_dir, max_workers=4, max_bandwidth=None, manifest_name="media_manifest.json", chunk_size=1 << 16):
+		'''
+		Parameters
+		----------
+		drone_url : str
+			the url used request to make requests from the drone
+		download_dir : str
+			The location drone media will be downloaded, and where the manifest is kept
+		max_workers : int, optional
+			the number of concurrent downloads (default = 4)
+		max_bandwidth : float, optional
+			the combined download rate cap in bytes per second (default = no cap)
+		manifest_name : str, optional
+			the manifest file name inside {download_dir} (default = "media_manifest.json")
+		chunk_size : int, optional
+			the size in bytes of each chunk written to disk (default = 64 KiB)
+		'''
+
+		self.drone_url = drone_url
+		self.drone_media_api_url = self.drone_url + "api/v1/media/medias/"
+		self.download_dir = download_dir
+		self.chunk_size = chunk_size
+		os.makedirs(self.download_dir, exist_ok=True)
+
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+		self.session.mount("http://", adapter)
+		self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MediaDownload")
+		self.limiter = BandwidthLimiter(max_bandwidth) if max_bandwidth else None
+
+		self.lock = threading.Lock()
+		self.pending = {}
+		self.manifest_path = os.path.join(self.download_dir, manifest_name)
+		self.manifest = self.load_manifest()
+
+	def load_manifest(self):
+		if not os.path.exists(self.manifest_path):
+			return {}
+		try:
+			with open(self.manifest_path, "r") as manifest_file:
+				return json.load(manifest_file)
+		except (OSError, ValueError):
+			return {}
+
+	def save_manifest(self):
+		# another downloader (a mission's background downloads, a sync) may share the
+		# manifest, keep the entries it saved since this one was loaded
+		tmp_path = f"{self.manifest_path}.{id(self)}.tmp"
+		saved = self.load_manifest()
+		with self.lock:
+			for media_id, resources in saved.items():
+				for resource_id, entry in resources.items():
+					self.manifest.setdefault(media_id, {}).setdefault(resource_id, entry)
+			with open(tmp_path, "w") as manifest_file:
+				json.dump(self.manifest, manifest_file, indent=1)
+			os.replace(tmp_path, self.manifest_path)
+
+	@contextmanager
+	def claim(self, tmp_path):
+		'''
+		Holds the given ".part" file for the calling thread, across every downloader
+		'''
+
+		key = os.path.abspath(tmp_path)
+		with AnafiMediaDownloader.part_locks_guard:
+			entry = AnafiMediaDownloader.part_locks.setdefault(key, [threading.Lock(), 0])
+			entry[1] += 1
+		try:
+			with entry[0]:
+				yield
+		finally:
+			with AnafiMediaDownloader.part_locks_guard:
+				entry[1] -= 1
+				if entry[1] == 0:
+					del AnafiMediaDownloader.part_locks[key]
+
+	def is_downloaded(self, media_id, resource_id, size=None):
+		'''
+		Returns True if the resource is in the manifest and its file is still on disk
+		'''
+
+		with self.lock:
+			entry = self.manifest.get(media_id, {}).get(resource_id)
+		return (
+			entry is not None
+			and (size is None or entry["size"] == size)
+			and os.path.exists(entry["path"])
+			and os.path.getsize(entry["path"]) == entry["size"]
+		)
+
+	def submit(self, media_id, path=None):
+		'''
+		Queues the given media for download. Media already queued are not queued twice.
+
+		Parameters
+		----------
+		media_id : str
+			the media to download
+		path : str, optional
+			the location to download the media at, if None is provided it will
+			default to self.download_dir
+
+		Return
+		----------
+		future : concurrent.futures.Future
+			resolves to the list of downloaded file paths
+		'''
+
+		with self.lock:
+			future = self.pending.get(media_id)
+			if future is None or future.done():
+				future = self.executor.submit(self.download_media, media_id, path)
+				self.pending[media_id] = future
+		return future
+
+	def download_media(self, media_id, path=None):
+		'''
+		Downloads every resource of the given media that is not already on disk
+
+		Return
+		----------
+		download_paths : str[]
+			the location of every resource of the media
+		'''
+
+		media_info_response = self.session.get(self.drone_media_api_url + media_id, timeout=10)
+		media_info_response.raise_for_status()
+		download_paths = []
+		for resource in media_info_response.json()["resources"]:
+			download_paths.append(self.download_resource(media_id, resource, path))
+		self.save_manifest()
+		print(f"< Media {media_id} Downloaded >")
+		return download_paths
+
+	def download_resource(self, media_id, resource, path=None):
+		'''
+		Downloads a single resource through a ".part" file renamed into place once
+		complete. A ".part" file left by an interrupted download is resumed with an
+		HTTP Range request.
+
+		Return
+		----------
+		download_path : str
+			the location of the downloaded resource
+		'''
+
+		resource_id = resource["resource_id"]
+		if self.is_downloaded(media_id, resource_id, resource.get("size")):
+			return self.manifest[media_id][resource_id]["path"]
+
+		download_path = os.path.join(path or self.download_dir, resource_id)
+		tmp_path = download_path + ".part"
+		with self.claim(tmp_path):
+			expected_size = resource.get("size")
+			finished = (
+				expected_size is not None
+				and not os.path.exists(tmp_path)
+				and os.path.exists(download_path)
+				and os.path.getsize(download_path) == expected_size
+			)
+			# another downloader may have finished the resource while this one waited
+			if not finished:
+				self.fetch_resource(resource, download_path, tmp_path)
+		size = os.path.getsize(download_path)
+
+		with self.lock:
+			self.manifest.setdefault(media_id, {})[resource_id] = {
+				"path": download_path,
+				"size": size,
+				"sha256": self.checksum(download_path),
+			}
+		return download_path
+
+	def fetch_resource(self, resource, download_path, tmp_path):
+		'''
+		Streams a resource into {tmp_path}, resuming it if it exists, and renames it
+		to {download_path} once complete
+		'''
+
+		offset = os.path.getsize(tmp_path) if os.path.exists(tmp_path) else 0
+		headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
+
+		with self.session.get(self.drone_url + resource["url"], headers=headers, stream=True, timeout=30) as response:
+			if response.status_code == 416:
+				# the partial file is already complete, or does not match the resource
+				if offset != resource.get("size"):
+					os.remove(tmp_path)
+					return self.fetch_resource(resource, download_path, tmp_path)
+			else:
+				response.raise_for_status()
+				# the drone may ignore the range and send the whole file again
+				mode = "ab" if response.status_code == 206 else "wb"
+				with open(tmp_path, mode) as resource_file:
+					for chunk in response.iter_content(chunk_size=self.chunk_size):
+						if self.limiter is not None:
+							self.limiter.consume(len(chunk))
+						resource_file.write(chunk)
+
+		size = os.path.getsize(tmp_path)
+		expected_size = resource.get("size")
+		if expected_size is not None and size != expected_size:
+			raise IOError(f"Incomplete download of {resource['resource_id']}: {size}/{expected_size} bytes")
+		os.replace(tmp_path, download_path)
+
+	def sync(self, path=None, timeout=None):
+		'''
+		Lists the drone media once and downloads, in parallel, every resource missing
+		from the manifest. When nothing is new this costs a single listing request.
+		
+		Parameters
+		----------
+		path : str, optional
+			the location to download the media at, if None is provided it will
+			default to self.download_dir
+		timeout : float, optional
+			the maximum time to wait for the downloads in seconds (default = no limit)
+		
+		Return
+		----------
+		summary : dict
+			media (number of media listed), downloaded and failed (resource ids),
+			and skipped (number of resources already on disk)
+		'''
+
+		media_list_response = self.session.get(self.drone_media_api_url, timeout=10)
+		media_list_response.raise_for_status()
+		media_list = media_list_response.json()
+
+		futures = {}
+		skipped = 0
+		for media in media_list:
+			for resource in media.get("resources", []):
+				if self.is_downloaded(media["media_id"], resource["resource_id"], resource.get("size")):
+					skipped += 1
+					continue
+				future = self.executor.submit(self.download_resource, media["media_id"], resource, path)
+				futures[resource["resource_id"]] = future
+
+		if futures:
+			wait_futures(futures.values(), timeout=timeout)
+			self.save_manifest()
+		downloaded = [r for r, f in futures.items() if f.done() and f.exception() is None]
+		failed = [r for r in futures if r not in downloaded]
+		print(f"< Media Sync : {len(downloaded)} downloaded, {skipped} skipped, {len(failed)} failed >")
+		return {"media": len(media_list), "downloaded": downloaded, "skipped": skipped, "failed": failed}
+
+	def checksum(self, file_path):
+		digest = hashlib.sha256()
+		with open(file_path, "rb") as resource_file:
+			for chunk in iter(lambda: resource_file.read(1 << 20), b""):
+				digest.update(chunk)
+		return digest.hexdigest()
+
+	def wait(self, timeout=None):
+		'''
+		Waits until every queued download is finished
+
+		Parameters
+		----------
+		timeout : float, optional
+			the maximum time to wait in seconds (default = no limit)
+
+		Return
+		----------
+		failed : str[]
+			the media ids that did not finish downloading
+		'''
+
+		with self.lock:
+			futures = dict(self.pending)
+		wait_futures(futures.values(), timeout=timeout)
+		failed = []
+		for media_id, future in futures.items():
+			if not future.done() or future.exception() is not None:
+				failed.append(media_id)
+		return failed
+
+	def close(self, wait=True):
+		'''
+		Stops the worker pool and closes the http session, dropping any download
+		that has not started yet
+		'''
+
+		self.executor.shutdown(wait=wait, cancel_futures=True)
+		self.session.close()
@@ -0,0 +1,300 @@
+import os
+import glob
+import json
+import ctypes
+import threading
+import subprocess
+from collections import deque
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+START_CODE = b"\x00\x00\x00\x01"
+
+class AnafiRestreamHandler(SimpleHTTPRequestHandler):
+	'''
+	Serves the HLS playlist and segments, and accepts latency reports from players
+	'''
+
+	def end_headers(self):
+		self.send_header("Access-Control-Allow-Origin", "*")
+		if self.path.endswith(".m3u8"):
+			self.send_header("Cache-Control", "no-cache")
+		super().end_headers()
+
+	def do_OPTIONS(self):
+		self.send_response(204)
+		self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+		self.send_header("Access-Control-Allow-Headers", "Content-Type")
+		self.end_headers()
+
+	def do_POST(self):
+		if self.path != "/latency":
+			self.send_error(404)
+			return
+		try:
+			length = int(self.headers.get("Content-Length", 0))
+			report = json.loads(self.rfile.read(length) or b"{}")
+			self.server.restreamer.record_latency(float(report["latency"]))
+		except (ValueError, KeyError, TypeError):
+			self.send_error(400)
+			return
+		self.send_response(204)
+		self.end_headers()
+
+	def log_message(self, format, *args):
+		pass
+
+class AnafiRestreamer:
+	'''
+	Re-streams the drone H.264 feed as HLS without decoding or re-encoding
+
+	The h264 stream callback copies each access unit into a bounded queue and
+	returns. A writer thread feeds the Annex B byte stream to ffmpeg, which only
+	remuxes it (-c copy) into MPEG-TS segments and a sliding playlist with
+	EXT-X-PROGRAM-DATE-TIME tags. A small HTTP server publishes the playlist at
+	http://<host>:{port}/{name}/index.m3u8 for any number of viewers.
+
+	Segments are cut on keyframes, so a segment is never shorter than the drone's
+	GOP. If ffmpeg falls behind, queued frames are discarded and writing resumes
+	at the next keyframe so viewers never receive a broken GOP.
+
+	Players report their latency (wall clock minus the program date time being
+	played) with a POST to /latency, see stats(). ffmpeg stamps segments with the
+	wall clock at ingest, so this covers ingest, segmenting, delivery and player
+	buffering; the drone's encode and radio link add to it on top.
+
+	...
+
+	Attributes
+	----------
+	output_dir : str
+		the directory the HLS files are written to and served from
+	name : str
+		the stream path, the playlist is {output_dir}/{name}/index.m3u8
+	port : int
+		the HTTP port the playlist is served on
+	segment_duration : float
+		the target segment duration in seconds
+	playlist_size : int
+		the number of segments listed in the playlist
+	pushed : int
+		the number of frames received from the stream
+	written : int
+		the number of frames written to ffmpeg
+	dropped : int
+		the number of frames discarded because ffmpeg fell behind
+
+	Methods
+	-------
+	start()
+		Starts ffmpeg, the writer thread and the HTTP server
+	stop()
+		Stops the HTTP server, the writer thread and ffmpeg
+	push(h264_frame)
+		Stream callback, queues an H.264 access unit
+	record_latency(latency)
+		Records a player latency report in seconds
+	stats()
+		Returns the frame counters and the reported latency
+	'''
+
+	def __init__(self, output_dir="static/hls", name="drone", port=8888, segment_duration=1.0, playlist_size=6, queue_frames=90, ffmpeg="ffmpeg"):
+		'''
+		Parameters
+		----------
+		output_dir : str, optional
+			the directory the HLS files are written to and served from (default = "static/hls")
+		name : str, optional
+			the stream path (default = "drone")
+		port : int, optional
+			the HTTP port the playlist is served on (default = 8888)
+		segment_duration : float, optional
+			the target segment duration in seconds (default = 1)
+		playlist_size : int, optional
+			the number of segments listed in the playlist (default = 6)
+		queue_frames : int, optional
+			the number of frames that may wait for ffmpeg before frames are dropped (default = 90)
+		ffmpeg : str, optional
+			the ffmpeg executable (default = "ffmpeg")
+		'''
+
+		self.output_dir = output_dir
+		self.name = name
+		self.port = port
+		self.segment_duration = segment_duration
+		self.playlist_size = playlist_size
+		self.queue_frames = queue_frames
+		self.ffmpeg = ffmpeg
+		self.stream_dir = os.path.join(output_dir, name)
+
+		self.cond = threading.Condition(threading.Lock())
+		self.frames = deque()
+		self.wait_keyframe = True
+		self.running = False
+		self.process = None
+		self.writer_thread = None
+		self.server = None
+		self.server_thread = None
+
+		self.pushed = 0
+		self.written = 0
+		self.dropped = 0
+		self.latencies = deque(maxlen=100)
+
+	def start(self):
+		if self.process is not None:
+			return
+		os.makedirs(self.stream_dir, exist_ok=True)
+		for path in glob.glob(os.path.join(self.stream_dir, "*")):
+			os.remove(path)
+
+		handler = lambda *args, **kwargs: AnafiRestreamHandler(*args, directory=self.output_dir, **kwargs)
+		self.server = ThreadingHTTPServer(("0.0.0.0", self.port), handler)
+		self.server.daemon_threads = True
+		self.server.restreamer = self
+		try:
+			self.process = subprocess.Popen(self.ffmpeg_command(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+		except OSError:
+			self.server.server_close()
+			self.server = None
+			raise
+
+		self.server_thread = threading.Thread(target=self.server.serve_forever, name="RestreamServer", daemon=True)
+		self.server_thread.start()
+		self.running = True
+		self.wait_keyframe = True
+		self.writer_thread = threading.Thread(target=self.write_frames, name="RestreamWriter", daemon=True)
+		self.writer_thread.start()
+		print(f"< Restream Started : http://localhost:{self.port}/{self.name}/index.m3u8 >")
+
+	def stop(self):
+		if self.process is None:
+			return
+		with self.cond:
+			self.running = False
+			self.frames.clear()
+			self.cond.notify_all()
+		self.writer_thread.join()
+
+		self.server.shutdown()
+		self.server.server_close()
+		self.server_thread.join()
+
+		try:
+			self.process.stdin.close()
+		except OSError:
+			pass
+		try:
+			self.process.wait(timeout=5)
+		except subprocess.TimeoutExpired:
+			self.process.kill()
+			self.process.wait()
+		self.process = None
+		self.server = None
+
+		stats = self.stats()
+		print(f"< Restream Stopped : {stats['written']} frames written, {stats['dropped']} dropped, latency {stats['latency_mean']} s >")
+
+	def ffmpeg_command(self):
+		return [
+			self.ffmpeg, "-hide_banner", "-loglevel", "warning",
+			"-fflags", "+genpts+nobuffer",
+			"-use_wallclock_as_timestamps", "1",
+			"-f", "h264", "-i", "pipe:0",
+			"-c", "copy",
+			"-f", "hls",
+			"-hls_time", str(self.segment_duration),
+			"-hls_list_size", str(self.playlist_size),
+			"-hls_flags", "delete_segments+program_date_time+independent_segments+omit_endlist",
+			"-hls_segment_filename", os.path.join(self.stream_dir, "segment_%05d.ts"),
+			os.path.join(self.stream_dir, "index.m3u8"),
+		]
+
+	def push(self, h264_frame):
+		'''
+		Called from the h264 stream callback. The access unit is copied, olympe keeps
+		ownership of the frame.
+		'''
+
+		if not self.running:
+			return
+		frame_pointer, frame_size = h264_frame.as_ctypes_pointer()
+		is_sync = bool(h264_frame.info()["is_sync"])
+		with self.cond:
+			self.pushed += 1
+			if self.wait_keyframe and not is_sync:
+				self.dropped += 1
+				return
+			if len(self.frames) >= self.queue_frames:
+				# ffmpeg is behind: drop the backlog and restart cleanly at the next keyframe
+				self.dropped += len(self.frames)
+				self.frames.clear()
+				if not is_sync:
+					self.wait_keyframe = True
+					self.dropped += 1
+					return
+			self.wait_keyframe = False
+			self.frames.append(ctypes.string_at(frame_pointer, frame_size))
+			self.cond.notify()
+
+	def write_frames(self):
+		while True:
+			with self.cond:
+				self.cond.wait_for(lambda: self.frames or not self.running)
+				if not self.running:
+					return
+				frames = list(self.frames)
+				self.frames.clear()
+			try:
+				for data in frames:
+					self.process.stdin.write(annexb(data))
+				self.process.stdin.flush()
+			except (BrokenPipeError, OSError) as e:
+				print(f"< Restream Failed : ffmpeg exited ({e}) >")
+				with self.cond:
+					self.running = False
+				return
+			with self.cond:
+				self.written += len(frames)
+
+	def record_latency(self, latency):
+		with self.cond:
+			self.latencies.append(latency)
+
+	def stats(self):
+		'''
+		Returns the frame counters and the latency reported by players
+
+		Return
+		----------
+		stats : dict
+			pushed, written and dropped frame counts, and the last, mean and max of
+			the last 100 reported latencies in seconds (None before the first report)
+		'''
+
+		with self.cond:
+			latencies = list(self.latencies)
+			return {
+				"pushed": self.pushed,
+				"written": self.written,
+				"dropped": self.dropped,
+				"latency_last": latencies[-1] if latencies else None,
+				"latency_mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+				"latency_max": max(latencies) if latencies else None,
+			}
+
+def annexb(data):
+	'''
+	Returns the access unit as an Annex B byte stream, converting 4-byte length
+	prefixed (AVCC) NAL units to start codes if needed
+	'''
+
+	if data[:4] == START_CODE or data[:3] == START_CODE[1:]:
+		return data
+	nal_units = []
+	offset = 0
+	while offset + 4 <= len(data):
+		size = int.from_bytes(data[offset:offset + 4], "big")
+		nal_units.append(START_CODE)
+		nal_units.append(data[offset + 4:offset + 4 + size])
+		offset += 4 + size
+	return b"".join(nal_units)
@@ -0,0 +1,374 @@
+import os
+import json
+import bisect
+import ctypes
+import datetime
+import threading
+from collections import deque
+from AnafiRestreamer import annexb
+from AnafiTelemetry import frame_telemetry
+
+class AnafiSegmentRecorder:
+	'''
+	Records the drone H.264 stream as fixed-duration segments with a time index
+
+	Segments are raw Annex B H.264 files cut on keyframes once {segment_duration}
+	has elapsed, so every segment starts with a keyframe, plays on its own
+	(ffplay, VLC, ffmpeg -i segment.h264) and a crash loses at most the segment
+	being written. index.json lists every segment with its session, start and end
+	NTP timestamps, frame range and the GPS bounding box of its frames. It is
+	rewritten atomically whenever a segment is opened or closed.
+
+	Frame numbers count every access unit of the stream. When the writer falls
+	behind, the frame that does not fit in the queue is dropped and so is every
+	following frame up to the next keyframe, so the segment stays decodable. The
+	missing frame ranges are listed in the segment's "gaps".
+
+	locate() maps a stream NTP timestamp or frame number to a segment and an
+	offset in it. Frame numbers and NTP timestamps restart with each stream, so
+	lookups are scoped to a session, the latest one by default.
+
+	When the segments exceed {max_bytes} the oldest ones are deleted.
+
+	The stream callback only copies the frame, a writer thread does the disk I/O.
+	With a frame bus reader the GPS positions come from the decoded frames on the
+	bus, read by a thread of their own, instead of being parsed from the video
+	metadata of every access unit in the stream callback.
+
+	...
+
+	Attributes
+	----------
+	record_dir : str
+		the directory the segments and index.json are written to
+	segment_duration : float
+		the minimum segment duration in seconds, segments end on the next keyframe
+	max_bytes : int
+		the disk budget of the segments, None for no limit
+	session : str
+		the name of the current recording session
+	segments : list
+		the index entries, oldest first
+	reader : AnafiFrameBusReader
+		the frame bus reader positions are taken from, None to read them from the H.264 frames
+
+	Methods
+	-------
+	start()
+		Starts a new recording session
+	stop()
+		Closes the current segment and stops the writer thread
+	push(h264_frame)
+		Stream callback, queues an H.264 access unit
+	locate(timestamp, frame, session)
+		Returns the segment and offset of a timestamp or frame number
+	'''
+
+	def __init__(self, record_dir="static/recordings", segment_duration=10.0, max_bytes=2 * 1024**3, queue_frames=300, reader=None):
+		'''
+		Parameters
+		----------
+		record_dir : str, optional
+			the directory the segments and index.json are written to (default = "static/recordings")
+		segment_duration : float, optional
+			the minimum segment duration in seconds (default = 10)
+		max_bytes : int, optional
+			the disk budget of the segments, None for no limit (default = 2 GiB)
+		queue_frames : int, optional
+			the number of frames that may wait for the writer before frames are dropped (default = 300)
+		reader : AnafiFrameBusReader, optional
+			the frame bus reader positions are taken from (default = None, from the H.264 frames)
+		'''
+
+		self.record_dir = record_dir
+		self.segment_duration = segment_duration
+		self.max_bytes = max_bytes
+		self.queue_frames = queue_frames
+		self.reader = reader
+		self.index_path = os.path.join(record_dir, "index.json")
+
+		self.lock = threading.Lock()
+		self.cond = threading.Condition(threading.Lock())
+		self.frames = deque()
+		self.running = False
+		self.thread = None
+		self.wait_keyframe = False
+		self.position_thread = None
+		self.session = None
+		self.segments = self.load_index()
+
+		self.file = None
+		self.current = None
+		self.frame_number = 0
+		self.segment_count = 0
+		self.dropped = 0
+		self.evicted = 0
+
+	def load_index(self):
+		try:
+			with open(self.index_path) as index_file:
+				return json.load(index_file)["segments"]
+		except (FileNotFoundError, ValueError, KeyError):
+			return []
+
+	def save_index(self):
+		tmp_path = self.index_path + ".tmp"
+		with self.lock:
+			content = json.dumps({"segments": self.segments}, indent=1)
+		with open(tmp_path, "w") as tmp_file:
+			tmp_file.write(content)
+		os.replace(tmp_path, self.index_path)
+
+	def start(self):
+		if self.thread is not None:
+			return
+		os.makedirs(self.record_dir, exist_ok=True)
+		self.session = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+		self.frame_number = 0
+		self.segment_count = 0
+		self.wait_keyframe = False
+		self.running = True
+		self.thread = threading.Thread(target=self.write_frames, name="SegmentRecorder", daemon=True)
+		self.thread.start()
+		if self.reader is not None:
+			self.position_thread = threading.Thread(target=self.read_positions, name="SegmentRecorderPositions", daemon=True)
+			self.position_thread.start()
+		print(f"< Recording Started : {self.record_dir}, session {self.session} >")
+
+	def stop(self):
+		if self.thread is None:
+			return
+		with self.cond:
+			self.running = False
+			self.cond.notify_all()
+		self.thread.join()
+		self.thread = None
+		if self.position_thread is not None:
+			self.position_thread.join()
+			self.position_thread = None
+			self.reader.close()
+		self.close_segment()
+		print(f"< Recording Stopped : {len(self.segments)} segments indexed, {self.dropped} frames dropped, {self.evicted} segments evicted >")
+
+	def push(self, h264_frame):
+		'''
+		Called from the h264 stream callback. The access unit is copied, olympe keeps
+		ownership of the frame.
+		'''
+
+		if not self.running:
+			return
+		frame_pointer, frame_size = h264_frame.as_ctypes_pointer()
+		info = h264_frame.info()
+		position = None
+		if self.reader is None:
+			telemetry = frame_telemetry(h264_frame)
+			if telemetry is not None and telemetry["latitude"] is not None:
+				position = (telemetry["latitude"], telemetry["longitude"])
+
+		is_sync = bool(info["is_sync"])
+		with self.cond:
+			self.frame_number += 1
+			if len(self.frames) >= self.queue_frames:
+				# the writer is behind: drop the frame, the ones up to the next keyframe would not decode
+				self.wait_keyframe = True
+				self.dropped += 1
+				return
+			if self.wait_keyframe and not is_sync:
+				self.dropped += 1
+				return
+			self.wait_keyframe = False
+			self.frames.append((
+				ctypes.string_at(frame_pointer, frame_size),
+				info["ntp_raw_timestamp"],
+				is_sync,
+				self.frame_number,
+				position,
+			))
+			self.cond.notify()
+
+	def read_positions(self):
+		'''
+		Adds the position of the newest decoded frame on the frame bus to the segment
+		holding its timestamp
+		'''
+
+		while self.running:
+			frame = self.reader.get(timeout=0.1)
+			if frame is None:
+				continue
+			try:
+				telemetry = frame_telemetry(frame)
+				timestamp = frame.timestamp
+				valid = frame.valid()
+			finally:
+				self.reader.release()
+			if not valid or telemetry is None or telemetry["latitude"] is None:
+				continue
+			with self.lock:
+				# decoded frames trail the access units, the segment may already be closed
+				for segment in reversed(self.segments):
+					if segment["session"] != self.session:
+						break
+					if segment["start_timestamp"] <= timestamp:
+						self.extend_bbox(segment, telemetry["latitude"], telemetry["longitude"])
+						break
+
+	def write_frames(self):
+		while True:
+			with self.cond:
+				self.cond.wait_for(lambda: self.frames or not self.running)
+				if not self.frames and not self.running:
+					return
+				frames = list(self.frames)
+				self.frames.clear()
+			for frame in frames:
+				try:
+					self.write_frame(*frame)
+				except OSError as e:
+					print(f"< Recording Failed : {e} >")
+					self.close_segment()
+
+	def write_frame(self, data, timestamp, is_sync, frame_number, position):
+		if is_sync and (self.current is None or timestamp - self.current["start_timestamp"] >= self.segment_duration * 1e6):
+			self.close_segment()
+			self.open_segment(timestamp, frame_number)
+		if self.current is None:
+			# a segment must start on a keyframe
+			return
+
+		self.file.write(annexb(data))
+		with self.lock:
+			segment = self.current
+			if frame_number > segment["end_frame"] + 1 and segment["frames"] > 0:
+				segment["gaps"].append([segment["end_frame"] + 1, frame_number - 1])
+			segment["end_timestamp"] = timestamp
+			segment["end_frame"] = frame_number
+			segment["frames"] += 1
+			segment["bytes"] += len(data)
+			if position is not None:
+				self.extend_bbox(segment, *position)
+
+	def extend_bbox(self, segment, latitude, longitude):
+		bbox = segment["bbox"]
+		if bbox is None:
+			segment["bbox"] = [latitude, longitude, latitude, longitude]
+		else:
+			bbox[0], bbox[1] = min(bbox[0], latitude), min(bbox[1], longitude)
+			bbox[2], bbox[3] = max(bbox[2], latitude), max(bbox[3], longitude)
+
+	def open_segment(self, timestamp, frame_number):
+		self.segment_count += 1
+		name = f"{self.session}_{self.segment_count:05d}.h264"
+		self.file = open(os.path.join(self.record_dir, name), "wb", buffering=1 << 20)
+		self.current = {
+			"session": self.session,
+			"file": name,
+			"start_time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+			"start_timestamp": timestamp,
+			"end_timestamp": timestamp,
+			"start_frame": frame_number,
+			"end_frame": frame_number,
+			"frames": 0,
+			"bytes": 0,
+			"bbox": None,
+			"gaps": [],
+			"complete": False,
+		}
+		with self.lock:
+			self.segments.append(self.current)
+		self.save_index()
+
+	def close_segment(self):
+		if self.current is None:
+			return
+		try:
+			self.file.close()
+		except OSError:
+			pass
+		with self.lock:
+			self.current["complete"] = True
+		self.file = None
+		self.current = None
+		self.evict()
+		self.save_index()
+
+	def evict(self):
+		if self.max_bytes is None:
+			return
+		with self.lock:
+			total = sum(segment["bytes"] for segment in self.segments)
+			evicted = []
+			# the segment being written is never evicted
+			while total > self.max_bytes and len(self.segments) > 1 and self.segments[0] is not self.current:
+				segment = self.segments.pop(0)
+				total -= segment["bytes"]
+				evicted.append(segment)
+		for segment in evicted:
+			try:
+				os.remove(os.path.join(self.record_dir, segment["file"]))
+			except FileNotFoundError:
+				pass
+			self.evicted += 1
+
+	def locate(self, timestamp=None, frame=None, session=None):
+		'''
+		Returns the segment holding a stream NTP timestamp or frame number
+
+		Parameters
+		----------
+		timestamp : int, optional
+			the frame NTP timestamp in microseconds (h264_frame.info()["ntp_raw_timestamp"])
+		frame : int, optional
+			the frame number in the session, counted from 1 at the start of the stream
+		session : str, optional
+			the recording session (default = None, the latest session)
+
+		Return
+		----------
+		location : dict
+			the segment "file" path, the "segment" index entry, the "offset" in seconds
+			and the "frame_offset" (recorded frames) from the start of the segment, or
+			None if the moment was not recorded, fell in a gap or has been evicted
+		'''
+
+		if (timestamp is None) == (frame is None):
+			raise ValueError("Provide either a timestamp or a frame number")
+		with self.lock:
+			segments = list(self.segments)
+		if session is None:
+			if not segments:
+				return None
+			session = segments[-1]["session"]
+		segments = [segment for segment in segments if segment["session"] == session]
+
+		key, value = ("start_timestamp", timestamp) if timestamp is not None else ("start_frame", frame)
+		position = bisect.bisect_right([segment[key] for segment in segments], value) - 1
+		if position < 0:
+			return None
+		segment = segments[position]
+		end_key = "end_timestamp" if timestamp is not None else "end_frame"
+		if value > segment[end_key]:
+			return None
+
+		duration = (segment["end_timestamp"] - segment["start_timestamp"]) / 1e6
+		span = segment["end_frame"] - segment["start_frame"]
+		if timestamp is not None:
+			offset = (timestamp - segment["start_timestamp"]) / 1e6
+			frame = segment["start_frame"] + (round(offset / duration * span) if duration > 0 else 0)
+		else:
+			offset = duration * (frame - segment["start_frame"]) / span if span > 0 else 0.0
+
+		# frames dropped while recording are not in the file
+		frame_offset = frame - segment["start_frame"]
+		for first, last in segment.get("gaps", []):
+			if first <= frame <= last:
+				return None
+			if last < frame:
+				frame_offset -= last - first + 1
+		return {
+			"file": os.path.join(self.record_dir, segment["file"]),
+			"segment": segment,
+			"offset": offset,
+			"frame_offset": frame_offset,
+		}
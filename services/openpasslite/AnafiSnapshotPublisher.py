@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import threading
+import cv2
+from AnafiFrameConverter import AnafiFrameConverter
+from AnafiTelemetry import frame_data
+
+class AnafiSnapshotPublisher:
+	'''
+	Publishes the latest stream frame as a JPEG snapshot from a background thread
+
+	The frame processing thread hands frames over through a one-slot handoff and
+	returns immediately. With a frame bus reader the publisher instead takes the
+	newest frame from the bus itself, at most {rate} times per second. The publisher converts, downscales and encodes the newest
+	frame, keeps it in memory for HTTP clients and writes the image and its data
+	file atomically (temp file + os.replace) so readers never see torn files.
+
+	...
+
+	Attributes
+	----------
+	image_path : str
+		the snapshot JPEG file, None to keep the snapshot in memory only
+	data_path : str
+		the snapshot data JSON file, None to keep the data in memory only
+	quality : int
+		the JPEG quality (0-100)
+	max_width : int
+		the snapshot is downscaled to this width, None to keep the frame resolution
+	reader : AnafiFrameBusReader
+		the frame bus reader frames are taken from, None to receive frames through submit()
+	rate : float
+		the maximum snapshot rate in Hz when reading from the frame bus
+	published : int
+		the number of snapshots published
+	replaced : int
+		the number of frames dropped because a newer frame arrived first
+	torn : int
+		the number of frame bus frames dropped because the writer overwrote them while they were encoded
+
+	Methods
+	-------
+	start()
+		Starts the publisher thread
+	stop()
+		Stops the publisher thread and releases the waiting frame
+	submit(yuv_frame, data)
+		Hands a frame and its data over to the publisher
+	latest()
+		Returns the latest snapshot (jpeg, etag, data)
+	'''
+
+	def __init__(self, image_path="static/stream.jpg", data_path="static/stream_data.json", quality=80, max_width=None, reader=None, rate=1.0):
+		'''
+		Parameters
+		----------
+		image_path : str, optional
+			the snapshot JPEG file (default = "static/stream.jpg")
+		data_path : str, optional
+			the snapshot data JSON file (default = "static/stream_data.json")
+		quality : int, optional
+			the JPEG quality (default = 80)
+		max_width : int, optional
+			the snapshot is downscaled to this width (default = None, frame resolution)
+		reader : AnafiFrameBusReader, optional
+			the frame bus reader frames are taken from (default = None, frames are submitted)
+		rate : float, optional
+			the maximum snapshot rate in Hz when reading from the frame bus (default = 1)
+		'''
+
+		self.image_path = image_path
+		self.data_path = data_path
+		self.quality = quality
+		self.max_width = max_width
+		self.converter = AnafiFrameConverter(width=max_width)
+		self.reader = reader
+		self.interval = 1.0 / rate if rate else 0.0
+		self.next_due = 0.0
+
+		self.cond = threading.Condition(threading.Lock())
+		self.pending = None
+		self.snapshot = (None, None, None)
+		self.published = 0
+		self.replaced = 0
+		self.torn = 0
+		self.running = False
+		self.thread = None
+		self.etag_prefix = "{:x}".format(int(time.time()))
+
+	def start(self):
+		if self.thread is None:
+			self.running = True
+			self.thread = threading.Thread(target=self.run, name="SnapshotPublisher", daemon=True)
+			self.thread.start()
+
+	def stop(self):
+		with self.cond:
+			self.running = False
+			self.cond.notify_all()
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+		self.release(self.take())
+		if self.reader is not None:
+			self.reader.close()
+
+	def submit(self, yuv_frame, data=None):
+		'''
+		Hands a frame over to the publisher. The publisher takes its own reference,
+		the caller keeps (and must still unref) its own.
+		'''
+
+		yuv_frame.ref()
+		with self.cond:
+			previous = self.pending
+			self.pending = (yuv_frame, data)
+			if previous is not None:
+				self.replaced += 1
+			self.cond.notify()
+		self.release(previous)
+
+	def take(self):
+		with self.cond:
+			pending = self.pending
+			self.pending = None
+		return pending
+
+	def release(self, pending):
+		if pending is not None:
+			pending[0].unref()
+
+	def latest(self):
+		'''
+		Returns the latest snapshot
+
+		Return
+		----------
+		jpeg : bytes
+			the encoded snapshot, None before the first snapshot
+		etag : str
+			an entity tag unique to this snapshot
+		data : dict
+			the data submitted with the snapshot frame
+		'''
+
+		with self.cond:
+			return self.snapshot
+
+	def next_pending(self):
+		'''
+		Waits for the next frame to publish, returns (frame, data) or None once stopped
+		'''
+
+		if self.reader is None:
+			with self.cond:
+				self.cond.wait_for(lambda: self.pending is not None or not self.running)
+				if not self.running:
+					return None
+				pending = self.pending
+				self.pending = None
+				return pending
+
+		while True:
+			with self.cond:
+				self.cond.wait_for(lambda: not self.running, max(0.0, self.next_due - time.monotonic()))
+				if not self.running:
+					return None
+			frame = self.reader.get(timeout=0.1)
+			if frame is not None:
+				self.next_due = time.monotonic() + self.interval
+				data = frame_data(frame) or {}
+				data["frame_number"] = frame.frame_number
+				return frame, data
+
+	def run(self):
+		while True:
+			pending = self.next_pending()
+			if pending is None:
+				return
+			yuv_frame, data = pending
+			try:
+				jpeg = self.encode(yuv_frame)
+				# a frame bus slot is only pinned, check it was not overwritten while encoding
+				if self.reader is not None and not yuv_frame.valid():
+					self.torn += 1
+					continue
+			except Exception as e:
+				print(f"< Snapshot Failed : {e} >")
+				continue
+			finally:
+				yuv_frame.unref()
+
+			with self.cond:
+				self.published += 1
+				etag = '"{}-{}"'.format(self.etag_prefix, self.published)
+				self.snapshot = (jpeg, etag, data)
+			self.write(jpeg, data)
+
+	def encode(self, yuv_frame):
+		cv2frame = self.converter.convert(yuv_frame)
+
+		ok, jpeg = cv2.imencode(".jpg", cv2frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+		if not ok:
+			raise RuntimeError("JPEG encoding failed")
+		return jpeg.tobytes()
+
+	def write(self, jpeg, data):
+		if self.image_path is not None:
+			self.write_atomic(self.image_path, jpeg)
+		if self.data_path is not None and data is not None:
+			self.write_atomic(self.data_path, json.dumps(data, default=str).encode())
+
+	def write_atomic(self, path, content):
+		tmp_path = path + ".tmp"
+		with open(tmp_path, "wb") as tmp_file:
+			tmp_file.write(content)
+		os.replace(tmp_path, path)
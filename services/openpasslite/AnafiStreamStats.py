@@ -0,0 +1,179 @@
+import csv
+import time
+import threading
+from collections import deque
+
+class AnafiStreamStats:
+	'''
+	Sliding-window statistics of the H.264 stream, updated in O(1) per frame
+
+	Frames are kept in a deque over the last {window} seconds of stream time with a
+	running byte sum, so FPS and bitrate never rescan the window. Inter-arrival
+	jitter is estimated like RFC 3550: the difference between the arrival spacing
+	and the timestamp spacing of consecutive frames, smoothed with a 1/16 gain.
+	Rows are buffered in memory and written to the CSV file every
+	{flush_interval} seconds instead of on every frame.
+
+	...
+
+	Attributes
+	----------
+	window : float
+		the window length in seconds
+	path : str
+		the csv file the per-frame rows are written to, None to keep the metrics in memory only
+	flush_interval : float
+		the time in seconds between two writes of the buffered rows
+	frames : int
+		the number of frames seen since the stream started
+	keyframes : int
+		the number of sync (IDR) frames seen since the stream started
+	bytes : int
+		the number of bytes seen since the stream started
+
+	Methods
+	-------
+	add(timestamp, size, is_sync)
+		Adds a frame to the statistics
+	metrics()
+		Returns the current stream metrics
+	flush()
+		Writes the buffered rows to the csv file
+	close()
+		Flushes and closes the csv file
+	'''
+
+	FIELDS = ["timestamp", "size", "keyframe", "fps", "bitrate", "jitter_ms"]
+
+	def __init__(self, window=1.0, path="static/h264_stats.csv", flush_interval=1.0):
+		'''
+		Parameters
+		----------
+		window : float, optional
+			the window length in seconds (default = 1)
+		path : str, optional
+			the csv file the per-frame rows are written to (default = "static/h264_stats.csv")
+		flush_interval : float, optional
+			the time in seconds between two writes of the buffered rows (default = 1)
+		'''
+
+		self.window = window
+		self.window_us = int(window * 1e6)
+		self.path = path
+		self.flush_interval = flush_interval
+
+		self.lock = threading.Lock()
+		self.samples = deque()
+		self.window_bytes = 0
+		self.frames = 0
+		self.keyframes = 0
+		self.bytes = 0
+		self.jitter = 0.0
+		self.last_timestamp = None
+		self.last_arrival = None
+		self.last_keyframe_timestamp = None
+		self.keyframe_interval = None
+
+		self.rows = []
+		self.next_flush = time.monotonic() + flush_interval
+		self.file = None
+		self.writer = None
+		if path is not None:
+			self.file = open(path, "w", newline="")
+			self.writer = csv.DictWriter(self.file, self.FIELDS)
+			self.writer.writeheader()
+
+	def add(self, timestamp, size, is_sync=False):
+		'''
+		Adds a frame to the statistics
+
+		Parameters
+		----------
+		timestamp : int
+			the frame's NTP timestamp in microseconds
+		size : int
+			the frame size in bytes
+		is_sync : bool, optional
+			true for sync (IDR) frames (default = False)
+		'''
+
+		now = time.monotonic()
+		arrival = now * 1e6
+		with self.lock:
+			self.frames += 1
+			self.bytes += size
+			if is_sync:
+				self.keyframes += 1
+				if self.last_keyframe_timestamp is not None:
+					self.keyframe_interval = (timestamp - self.last_keyframe_timestamp) / 1e6
+				self.last_keyframe_timestamp = timestamp
+
+			if self.last_timestamp is not None:
+				transit_change = (arrival - self.last_arrival) - (timestamp - self.last_timestamp)
+				self.jitter += (abs(transit_change) - self.jitter) / 16
+			self.last_timestamp = timestamp
+			self.last_arrival = arrival
+
+			self.samples.append((timestamp, size))
+			self.window_bytes += size
+			while self.samples[0][0] + self.window_us < timestamp:
+				_, old_size = self.samples.popleft()
+				self.window_bytes -= old_size
+
+			fps = len(self.samples) / self.window
+			bitrate = 8 * self.window_bytes / self.window
+			jitter_ms = self.jitter / 1e3
+
+		if self.writer is None:
+			return
+		self.rows.append({
+			"timestamp": timestamp,
+			"size": size,
+			"keyframe": int(bool(is_sync)),
+			"fps": fps,
+			"bitrate": bitrate,
+			"jitter_ms": round(jitter_ms, 3),
+		})
+		if now >= self.next_flush:
+			self.flush()
+
+	def metrics(self):
+		'''
+		Returns the current stream metrics
+
+		Return
+		----------
+		metrics : dict
+			fps, bitrate (bits/s) and frame count over the window, jitter in ms,
+			totals since the stream started, the last keyframe interval in seconds
+			and the age in seconds of the last frame (None before the first frame)
+		'''
+
+		now = time.monotonic() * 1e6
+		with self.lock:
+			return {
+				"fps": len(self.samples) / self.window,
+				"bitrate": 8 * self.window_bytes / self.window,
+				"window_frames": len(self.samples),
+				"jitter_ms": self.jitter / 1e3,
+				"frames": self.frames,
+				"keyframes": self.keyframes,
+				"bytes": self.bytes,
+				"keyframe_interval": self.keyframe_interval,
+				"last_frame_age": None if self.last_arrival is None else (now - self.last_arrival) / 1e6,
+			}
+
+	def flush(self):
+		self.next_flush = time.monotonic() + self.flush_interval
+		if self.writer is None or not self.rows:
+			return
+		rows, self.rows = self.rows, []
+		self.writer.writerows(rows)
+		self.file.flush()
+
+	def close(self):
+		self.flush()
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+			self.writer = None
@@ -0,0 +1,128 @@
+'''
+Frame-synchronous telemetry from the video metadata (vmeta) attached to each stream frame
+
+The drone embeds its pose in every frame: position, ground distance, speed, the
+drone attitude and the camera (gimbal) attitude at capture time. Reading it from
+the frame avoids get_state() lookups on the processing path, which return the
+pose at processing time instead of capture time.
+
+Both vmeta layouts sent by ANAFI firmwares are handled: protobuf metadata
+("drone" / "camera" sections) and v3 metadata ("base" section).
+'''
+
+import math
+import datetime
+
+TELEMETRY_FIELDS = [
+	"latitude", "longitude", "altitude", "ground_distance",
+	"roll", "pitch", "yaw",
+	"gimbal_roll", "gimbal_pitch", "gimbal_yaw",
+	"speed_north", "speed_east", "speed_down",
+	"hfov", "vfov", "timestamp", "utc_timestamp",
+]
+
+def quaternion_to_euler(quat):
+	'''
+	Converts a {w, x, y, z} NED quaternion to (roll, pitch, yaw) in degrees
+
+	Parameters
+	----------
+	quat : dict
+		the quaternion with "w", "x", "y" and "z" keys
+
+	Return
+	----------
+	angles : tuple
+		roll, pitch and yaw in degrees, yaw is the heading from north
+	'''
+
+	w, x, y, z = (float(quat.get(k, 0.0)) for k in ("w", "x", "y", "z"))
+	roll = math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+	pitch = math.asin(max(-1.0, min(1.0, 2 * (w * y - z * x))))
+	yaw = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+	return math.degrees(roll), math.degrees(pitch), math.degrees(yaw)
+
+def vmeta_telemetry(vmeta):
+	'''
+	Extracts the telemetry of one frame from its video metadata
+
+	Parameters
+	----------
+	vmeta : dict
+		the metadata dict from yuv_frame.vmeta()[1]
+
+	Return
+	----------
+	telemetry : dict
+		the TELEMETRY_FIELDS values, None where the metadata does not provide them
+		(for example the position before GPS fix), or None if there is no metadata
+	'''
+
+	if not vmeta:
+		return None
+	telemetry = dict.fromkeys(TELEMETRY_FIELDS)
+
+	if "drone" in vmeta or "camera" in vmeta:
+		drone = vmeta.get("drone", {})
+		camera = vmeta.get("camera", {})
+		location = drone.get("position") or drone.get("location") or {}
+		drone_quat = drone.get("quat")
+		camera_quat = camera.get("quat")
+		speed = drone.get("speed") or {}
+		telemetry["hfov"] = camera.get("hfov")
+		telemetry["vfov"] = camera.get("vfov")
+		telemetry["timestamp"] = camera.get("timestamp")
+		telemetry["utc_timestamp"] = camera.get("utc_timestamp")
+	else:
+		drone = vmeta.get("base", vmeta)
+		location = drone.get("location") or {}
+		drone_quat = drone.get("drone_quat")
+		camera_quat = drone.get("frame_quat")
+		speed = drone.get("speed") or {}
+		telemetry["timestamp"] = vmeta.get("timestamp")
+
+	# protobuf metadata omits the position until the drone has a fix, v3 flags it
+	if location.get("valid", True) and "latitude" in location:
+		telemetry["latitude"] = float(location["latitude"])
+		telemetry["longitude"] = float(location["longitude"])
+		altitude = location.get("altitude_egm96amsl", location.get("altitude_wgs84", location.get("altitude")))
+		telemetry["altitude"] = float(altitude) if altitude is not None else None
+
+	if drone.get("ground_distance") is not None:
+		telemetry["ground_distance"] = float(drone["ground_distance"])
+	if drone_quat:
+		telemetry["roll"], telemetry["pitch"], telemetry["yaw"] = quaternion_to_euler(drone_quat)
+	if camera_quat:
+		telemetry["gimbal_roll"], telemetry["gimbal_pitch"], telemetry["gimbal_yaw"] = quaternion_to_euler(camera_quat)
+	for axis in ("north", "east", "down"):
+		if speed.get(axis) is not None:
+			telemetry["speed_" + axis] = float(speed[axis])
+	return telemetry
+
+def frame_telemetry(yuv_frame):
+	'''
+	Returns the telemetry of an olympe.VideoFrame (or frame bus frame), None if it has no metadata
+	'''
+
+	try:
+		if hasattr(yuv_frame, "vmeta"):
+			return vmeta_telemetry(yuv_frame.vmeta()[1])
+		return vmeta_telemetry(yuv_frame.metadata())
+	except Exception:
+		return None
+
+def frame_data(yuv_frame):
+	'''
+	Returns the data saved with a frame: capture time, [latitude, longitude, altitude]
+	and the full telemetry, or None if the frame has no metadata
+	'''
+
+	telemetry = frame_telemetry(yuv_frame)
+	if telemetry is None:
+		return None
+	if telemetry["utc_timestamp"]:
+		date_time = datetime.datetime.fromtimestamp(int(telemetry["utc_timestamp"]) / 1e6, tz=datetime.timezone.utc)
+	else:
+		date_time = datetime.datetime.now()
+	coordinates = [telemetry["latitude"], telemetry["longitude"], telemetry["altitude"]]
+	return {"time": date_time, "coordinates": coordinates, "telemetry": telemetry}
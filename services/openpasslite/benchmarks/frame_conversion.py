@@ -0,0 +1,79 @@
+# Compares the per-frame cost of the original YUV -> BGR path (full resolution cvtColor, then resize)
+# against AnafiFrameConverter on synthetic 4K and 1080p frames.
+#
+# Run from services/openpasslite:
+#   python benchmarks/frame_conversion.py [--frames 100] [--width 640]
+#
+# Reports ms/frame and the bytes allocated per frame (tracemalloc, numpy allocations are traced).
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import cv2
+import numpy as np
+import olympe
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from AnafiFrameConverter import AnafiFrameConverter
+
+RESOLUTIONS = {
+	"4K": (3840, 2160),
+	"1080p": (1920, 1080),
+}
+
+FORMATS = {
+	"I420": (olympe.VDEF_I420, cv2.COLOR_YUV2BGR_I420),
+	"NV12": (olympe.VDEF_NV12, cv2.COLOR_YUV2BGR_NV12),
+}
+
+def synthetic_frame(width, height):
+	rng = np.random.default_rng(0)
+	return rng.integers(0, 256, (height * 3 // 2, width), dtype=np.uint8)
+
+def naive(yuv, cv2_flag, width):
+	cv2frame = cv2.cvtColor(yuv, cv2_flag)
+	if width is not None and cv2frame.shape[1] > width:
+		height = int(round(cv2frame.shape[0] * width / cv2frame.shape[1]))
+		cv2frame = cv2.resize(cv2frame, (width, height), interpolation=cv2.INTER_AREA)
+	return cv2frame
+
+def measure(fn, frames):
+	fn()  # warm up, lets the converter allocate its buffers
+	start = time.perf_counter()
+	for _ in range(frames):
+		fn()
+	elapsed = (time.perf_counter() - start) / frames
+
+	tracemalloc.start()
+	tracemalloc.reset_peak()
+	before = tracemalloc.get_traced_memory()[0]
+	fn()
+	peak = tracemalloc.get_traced_memory()[1] - before
+	tracemalloc.stop()
+	return elapsed * 1000, peak
+
+def main():
+	parser = argparse.ArgumentParser(description="YUV to BGR conversion benchmark")
+	parser.add_argument("--frames", type=int, default=100, help="frames timed per case")
+	parser.add_argument("--width", type=int, default=640, help="output width, 0 for full resolution")
+	args = parser.parse_args()
+	width = args.width or None
+
+	print(f"{'case':<14} {'method':<10} {'ms/frame':>10} {'alloc/frame':>14}")
+	for res_name, (frame_width, frame_height) in RESOLUTIONS.items():
+		for fmt_name, (vdef_format, cv2_flag) in FORMATS.items():
+			yuv = synthetic_frame(frame_width, frame_height)
+			converter = AnafiFrameConverter(width=width)
+			cases = {
+				"naive": lambda: naive(yuv, cv2_flag, width),
+				"converter": lambda: converter.convert_array(yuv, vdef_format),
+			}
+			for method, fn in cases.items():
+				ms, allocated = measure(fn, args.frames)
+				print(f"{res_name + ' ' + fmt_name:<14} {method:<10} {ms:>10.2f} {allocated:>12,d} B")
+
+if __name__ == "__main__":
+	main()
@@ -1,15 +1,18 @@
+import json
 import logging
 import toml
 import threading
 import importlib
 import time
 from typing import Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
 from pathlib import Path
-from AnafiController import AnafiController
+from AnafiController import AnafiController, drone_addresses
+from AnafiMediaDownloader import AnafiMediaDownloader
+from AnafiSegmentRecorder import AnafiSegmentRecorder
 
 # Load configuration
 config_path = Path("/app/config.toml")
@@ -35,6 +38,41 @@ mission_thread = None
 stop_mission_flag = threading.Event()
 current_drone = None
 
+# Media sync state
+sync_lock = threading.Lock()
+sync_thread = None
+sync_result = None
+
+def stream_options():
+    """setup_stream() defaults set in config.toml"""
+    return {key: openpasslite_config[key] for key in ("restream", "restream_port", "frame_bus_slots", "record_dir") if key in openpasslite_config}
+
+def run_sync_background():
+    """Download every drone media missing from the local manifest"""
+    global sync_result
+
+    downloader = None
+    try:
+        _, _, drone_url = drone_addresses(1)
+        downloader = AnafiMediaDownloader(
+            drone_url,
+            openpasslite_config.get("media_dir", "static"),
+            max_workers=openpasslite_config.get("sync_workers", 4),
+            max_bandwidth=openpasslite_config.get("sync_max_bandwidth") or None
+        )
+        summary = downloader.sync()
+        logger.info(f"Media sync finished: {len(summary['downloaded'])} downloaded, "
+                    f"{summary['skipped']} skipped, {len(summary['failed'])} failed")
+        with sync_lock:
+            sync_result = {"status": "done", **summary}
+    except Exception as e:
+        logger.error(f"Media sync failed: {str(e)}")
+        with sync_lock:
+            sync_result = {"status": "failed", "error": str(e)}
+    finally:
+        if downloader:
+            downloader.close()
+
 def run_mission_background(mission_name: str, lat: Optional[str], long: Optional[str]):
     """Execute mission in background thread"""
     global stop_mission_flag, current_drone
@@ -49,7 +87,12 @@ def run_mission_background(mission_name: str, lat: Optional[str], long: Optional
         logger.info(f"Starting mission: {mission_name}")
         mission_module = importlib.import_module(f"mission.{mission_name}.script")
 
-        drone = AnafiController(connection_type=1)
+        # the in-flight downloads and /sync_media share media_dir and its manifest
+        drone = AnafiController(
+            connection_type=1,
+            download_dir=openpasslite_config.get("media_dir", "static"),
+            stream_options=stream_options()
+        )
         with mission_lock:
             current_drone = drone
 
@@ -226,6 +269,79 @@ async def mission_status():
             "drone_connected": current_drone is not None
         }
 
+def get_snapshot_publisher():
+    with mission_lock:
+        drone = current_drone
+    publisher = getattr(drone.camera.media, "snapshot_publisher", None) if drone else None
+    if publisher is None:
+        raise HTTPException(status_code=404, detail="No stream snapshot available")
+    return publisher
+
+@app.get("/snapshot")
+async def snapshot(if_none_match: Optional[str] = Header(None)):
+    jpeg, etag, _ = get_snapshot_publisher().latest()
+    if jpeg is None:
+        raise HTTPException(status_code=404, detail="No stream snapshot available")
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=jpeg, media_type="image/jpeg", headers=headers)
+
+@app.get("/snapshot_data")
+async def snapshot_data():
+    _, etag, data = get_snapshot_publisher().latest()
+    if data is None:
+        raise HTTPException(status_code=404, detail="No stream snapshot available")
+    return {"etag": etag, "data": json.loads(json.dumps(data, default=str))}
+
+@app.get("/stream_stats")
+async def stream_stats():
+    with mission_lock:
+        drone = current_drone
+    stats = drone.camera.media.get_stream_stats() if drone else None
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No stream statistics available")
+    return stats
+
+@app.get("/recordings/locate")
+async def locate_recording(timestamp: Optional[int] = None, frame: Optional[int] = None, session: Optional[str] = None):
+    if (timestamp is None) == (frame is None):
+        raise HTTPException(status_code=400, detail="Provide either a timestamp or a frame number")
+
+    with mission_lock:
+        drone = current_drone
+    if drone:
+        location = drone.camera.media.locate_recording(timestamp=timestamp, frame=frame, session=session)
+    else:
+        record_dir = openpasslite_config.get("record_dir") or str(Path(openpasslite_config.get("media_dir", "static")) / "recordings")
+        location = AnafiSegmentRecorder(record_dir).locate(timestamp=timestamp, frame=frame, session=session)
+    if location is None:
+        raise HTTPException(status_code=404, detail="No recorded segment for this moment")
+    return location
+
+@app.post("/sync_media")
+async def sync_media():
+    logger.info("Sync media endpoint accessed")
+
+    global sync_thread, sync_result
+
+    with sync_lock:
+        if sync_thread and sync_thread.is_alive():
+            logger.error("Media sync already running")
+            raise HTTPException(status_code=400, detail="Media sync already running")
+
+        sync_result = {"status": "running"}
+        sync_thread = threading.Thread(target=run_sync_background, name="MediaSync", daemon=True)
+        sync_thread.start()
+
+    return {"status": "success", "message": "Media sync started"}
+
+@app.get("/sync_status")
+async def sync_status():
+    with sync_lock:
+        return sync_result or {"status": "idle"}
+
 @app.get("/logs")
 async def get_logs(lines: int = 100):
     logger.info(f"Logs endpoint accessed - requesting {lines} lines")
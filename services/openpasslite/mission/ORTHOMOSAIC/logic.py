@@ -0,0 +1,385 @@
+import argparse
+import csv
+import json
+import math
+import time
+from collections import deque
+from pathlib import Path
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS = 6371008.8  # mean earth radius in meters
+
+
+def haversine_legs(points):
+    """
+    Great-circle lengths (meters) of the legs between consecutive (lat, lon) points
+    """
+    coords = np.radians(np.asarray(points, dtype=np.float64))
+    dlat = np.diff(coords[:, 0])
+    dlon = np.diff(coords[:, 1])
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(coords[:-1, 0]) * np.cos(coords[1:, 0]) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def route_length(route, points):
+    """
+    Total great-circle length of a route given as node indices into {points}
+    """
+    return float(haversine_legs(np.asarray(points)[np.asarray(route)]).sum())
+
+
+def nearest_neighbour_route(coords, neighbours, start=0):
+    """
+    Greedy closed tour seeded at {start}, returned as [start, ..., start]
+
+    The next node is the first unvisited entry of the current node's candidate
+    list, falling back to a scan of the unvisited nodes once all candidates are used.
+    """
+    n = len(coords)
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    route = np.empty(n + 1, dtype=np.intp)
+    route[0] = start
+    current = start
+    for k in range(1, n):
+        candidates = neighbours[current]
+        free = candidates[~visited[candidates]]
+        if len(free):
+            current = int(free[0])
+        else:
+            remaining = np.flatnonzero(~visited)
+            offsets = coords[remaining] - coords[current]
+            current = int(remaining[np.argmin(np.einsum('ij,ij->i', offsets, offsets))])
+        visited[current] = True
+        route[k] = current
+    route[n] = start
+    return route
+
+
+def two_opt(route, coords, neighbours, deadline):
+    """
+    Improves a closed tour with 2-opt moves, keeping both ends pinned.
+
+    Only exchanges that connect a node to one of its candidate neighbours closer
+    than its current tour neighbour are tried. Nodes are revisited from a work
+    queue that is refilled with the endpoints of every changed edge, until no
+    move shortens the tour or the {deadline} (time.perf_counter) has passed.
+    """
+    route = np.array(route, dtype=np.intp)
+    m = len(route)
+    home = int(route[0])
+    pos = np.empty(len(coords), dtype=np.intp)
+    pos[route[:-1]] = np.arange(m - 1)
+    xs = coords[:, 0].tolist()
+    ys = coords[:, 1].tolist()
+    candidates = neighbours.tolist()
+
+    def dist(i, j):
+        return math.hypot(xs[i] - xs[j], ys[i] - ys[j])
+
+    def reverse(i, j):
+        route[i:j + 1] = route[i:j + 1][::-1]
+        pos[route[i:j + 1]] = np.arange(i, j + 1)
+
+    def improve(a):
+        # the home node leaves the tour at the start and enters it at the end
+        p = int(pos[a])
+        if p < m - 1:
+            b = int(route[p + 1])
+            g = dist(a, b)
+            for c in candidates[a]:
+                g1 = dist(a, c)
+                if g1 >= g:
+                    break
+                if c == a or c == b:
+                    continue
+                # edges (a, b), (c, x) -> (a, c), (b, x)
+                q = int(pos[c])
+                x = int(route[q + 1])
+                if q > p:
+                    if g1 + dist(b, x) - g - dist(c, x) < -1e-7:
+                        reverse(p + 1, q)
+                        return b, c, x
+                elif g1 + dist(x, b) - dist(c, x) - g < -1e-7:
+                    reverse(q + 1, p)
+                    return b, c, x
+        if a == home:
+            p = m - 1
+        if p > 0:
+            b = int(route[p - 1])
+            g = dist(a, b)
+            for c in candidates[a]:
+                g1 = dist(a, c)
+                if g1 >= g:
+                    break
+                if c == a or c == b:
+                    continue
+                # edges (b, a), (y, c) -> (b, y), (a, c)
+                q = m - 1 if c == home else int(pos[c])
+                y = int(route[q - 1])
+                if g1 + dist(b, y) - g - dist(y, c) < -1e-7:
+                    if q > p:
+                        reverse(p, q - 1)
+                    else:
+                        reverse(q, p - 1)
+                    return b, c, y
+        return None
+
+    queue = deque(route[:-1].tolist())
+    queued = np.ones(len(coords), dtype=bool)
+    while queue and time.perf_counter() < deadline:
+        a = queue.popleft()
+        changed = improve(a)
+        if changed is None:
+            queued[a] = False
+            continue
+        queue.appendleft(a)
+        for node in changed:
+            if not queued[node]:
+                queued[node] = True
+                queue.append(node)
+    return route
+
+
+def optimize_route(waypoints, home, time_limit=0.3, neighbours=10):
+    """
+    Reorders waypoints to shorten the flight from {home} through every waypoint and back.
+
+    The tour is built on a local equirectangular projection around {home}, which
+    is accurate to well under a meter at survey scale, with a k-d tree supplying
+    the nearest-neighbour seed and the 2-opt candidate lists, so no n x n
+    distance matrix is ever built. Reported distances are great-circle lengths.
+
+    Parameters
+    ----------
+    waypoints : (lat, lon)[]
+        the waypoints to visit
+    home : (lat, lon)
+        the takeoff point, pinned as start and end of the route
+    time_limit : float, optional
+        the time budget in seconds for the whole optimisation (default = 0.3)
+    neighbours : int, optional
+        the candidate list size per waypoint (default = 10)
+
+    Return
+    ----------
+    ordered : (lat, lon)[]
+        the waypoints in flight order, or in file order if no shorter route was found
+    original_distance : float
+        the length in meters of the route in file order
+    optimized_distance : float
+        the length in meters of the returned route
+    """
+    deadline = time.perf_counter() + time_limit
+    n = len(waypoints)
+    points = np.vstack([np.asarray(home, dtype=np.float64)[:2], np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)])
+
+    original = np.concatenate(([0], np.arange(1, n + 1), [0]))
+    original_distance = route_length(original, points)
+    if n < 3:
+        return list(waypoints), original_distance, original_distance
+
+    coords = to_local(points, points[0])
+    _, candidates = cKDTree(coords).query(coords, k=min(neighbours + 1, n + 1))
+
+    route = nearest_neighbour_route(coords, candidates, start=0)
+    route = two_opt(route, coords, candidates, deadline)
+    optimized_distance = route_length(route, points)
+
+    if optimized_distance >= original_distance:
+        return list(waypoints), original_distance, original_distance
+
+    ordered = [waypoints[k - 1] for k in route[1:-1]]
+    return ordered, original_distance, optimized_distance
+
+
+def to_local(points, origin):
+    """
+    Projects (lat, lon) points to east/north meters around {origin}
+    """
+    points = np.radians(np.asarray(points, dtype=np.float64))
+    lat0, lon0 = np.radians(origin[0]), np.radians(origin[1])
+    east = (points[:, 1] - lon0) * np.cos(lat0) * EARTH_RADIUS
+    north = (points[:, 0] - lat0) * EARTH_RADIUS
+    return np.column_stack((east, north))
+
+
+def to_geographic(local, origin):
+    """
+    Inverse of to_local, returns (lat, lon) points in degrees
+    """
+    local = np.asarray(local, dtype=np.float64)
+    lat0, lon0 = np.radians(origin[0]), np.radians(origin[1])
+    lat = lat0 + local[:, 1] / EARTH_RADIUS
+    lon = lon0 + local[:, 0] / (EARTH_RADIUS * np.cos(lat0))
+    return np.column_stack((np.degrees(lat), np.degrees(lon)))
+
+
+def photo_spacing(altitude, hfov=75.5, vfov=60.2, front_overlap=0.75, side_overlap=0.65):
+    """
+    Returns the (photo spacing, line spacing) in meters for a nadir camera at {altitude}
+
+    The long side of the image (hfov) is laid across the survey lines.
+    """
+    footprint_across = 2.0 * altitude * np.tan(np.radians(hfov) / 2.0)
+    footprint_along = 2.0 * altitude * np.tan(np.radians(vfov) / 2.0)
+    return footprint_along * (1.0 - front_overlap), footprint_across * (1.0 - side_overlap)
+
+
+def survey_lines(polygon, altitude, hfov=75.5, vfov=60.2, front_overlap=0.75, side_overlap=0.65, heading=0.0):
+    """
+    Generates a lawnmower (boustrophedon) grid clipped to a field polygon
+
+    Parameters
+    ----------
+    polygon : (lat, lon)[]
+        the field boundary, open or closed ring
+    altitude : float
+        the flight altitude above the field in meters
+    hfov : float, optional
+        the camera horizontal field of view in degrees (default = 75.5)
+    vfov : float, optional
+        the camera vertical field of view in degrees (default = 60.2)
+    front_overlap : float, optional
+        the overlap between consecutive photos on a line, 0-1 (default = 0.75)
+    side_overlap : float, optional
+        the overlap between neighbouring lines, 0-1 (default = 0.65)
+    heading : float, optional
+        the direction of the survey lines in degrees from north (default = 0)
+
+    Return
+    ----------
+    lines : ndarray[]
+        one (k, 2) array of (lat, lon) photo positions per line segment, in flight order
+    """
+    ring = np.asarray(polygon, dtype=np.float64)
+    if np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    if len(ring) < 3:
+        raise ValueError("A survey polygon needs at least 3 vertices")
+
+    origin = ring.mean(axis=0)
+    local = to_local(ring, origin)
+
+    # rotate so the survey lines run along +u, stacked along v
+    theta = np.radians(heading)
+    along = np.array([np.sin(theta), np.cos(theta)])
+    across = np.array([np.cos(theta), -np.sin(theta)])
+    u = local @ along
+    v = local @ across
+
+    step, line_step = photo_spacing(altitude, hfov, vfov, front_overlap, side_overlap)
+    v_min, v_max = v.min(), v.max()
+    n_lines = max(int(np.ceil((v_max - v_min) / line_step)), 1)
+    offsets = v_min + (v_max - v_min - (n_lines - 1) * line_step) / 2.0 + line_step * np.arange(n_lines)
+
+    # intersect every line with every polygon edge at once (half-open rule on v)
+    v0, v1 = v, np.roll(v, -1)
+    u0, u1 = u, np.roll(u, -1)
+    lo, hi = np.minimum(v0, v1), np.maximum(v0, v1)
+    dv = np.where(v1 == v0, 1.0, v1 - v0)
+    crosses = (offsets[:, None] >= lo) & (offsets[:, None] < hi)
+    u_cross = u0 + (offsets[:, None] - v0) * (u1 - u0) / dv
+    u_cross = np.where(crosses, u_cross, np.nan)
+    u_cross.sort(axis=1)
+
+    lines = []
+    for k, offset in enumerate(offsets):
+        xs = u_cross[k][~np.isnan(u_cross[k])]
+        segments = xs[:len(xs) // 2 * 2].reshape(-1, 2)
+        if k % 2 == 1:
+            segments = segments[::-1, ::-1]
+        for start, end in segments:
+            count = int(np.ceil(abs(end - start) / step)) + 1
+            us = np.linspace(start, end, count)
+            pts = np.outer(us, along) + offset * across
+            lines.append(to_geographic(pts, origin))
+    return lines
+
+
+def survey_grid(polygon, altitude, **kwargs):
+    """
+    Flattens survey_lines into a waypoint list in the format script.py consumes
+    """
+    return [(float(lat), float(lon)) for line in survey_lines(polygon, altitude, **kwargs) for lat, lon in line]
+
+
+def split_lines(waypoints, angle_tolerance=20.0):
+    """
+    Groups consecutive waypoints into straight survey lines
+
+    A line keeps growing while each next leg stays within {angle_tolerance}
+    degrees of the line's first leg. The leg between two lines is a transit and
+    belongs to neither.
+    """
+    points = np.asarray(waypoints, dtype=np.float64)
+    if len(points) < 2:
+        return [points]
+    legs = np.diff(to_local(points, points[0]), axis=0)
+    bearings = np.degrees(np.arctan2(legs[:, 0], legs[:, 1]))
+
+    lines = []
+    start = 0
+    while start < len(points):
+        end = start + 1
+        if end < len(points):
+            while end < len(legs):
+                turn = (bearings[end] - bearings[start] + 180.0) % 360.0 - 180.0
+                if abs(turn) > angle_tolerance:
+                    break
+                end += 1
+        lines.append(points[start:end + 1])
+        start = end + 1
+    return lines
+
+
+def write_waypoints(path, waypoints):
+    """
+    Writes waypoints to a data.csv style file (one lat,lon row per waypoint)
+    """
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        for lat, lon in waypoints:
+            writer.writerow([f"{lat:.8f}", f"{lon:.8f}"])
+
+
+def load_polygon(path):
+    """
+    Reads a field polygon from a JSON list of [lat, lon] pairs or a GeoJSON polygon
+    """
+    with open(path, 'r') as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        if data.get("type") == "FeatureCollection":
+            data = data["features"][0]
+        if data.get("type") == "Feature":
+            data = data["geometry"]
+        # GeoJSON stores the outer ring as [lon, lat]
+        return [(lat, lon) for lon, lat in data["coordinates"][0]]
+    return [tuple(point) for point in data]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an orthomosaic survey grid from a field polygon")
+    parser.add_argument("polygon", help="JSON list of [lat, lon] pairs or a GeoJSON polygon")
+    parser.add_argument("output", nargs="?", default=str(Path(__file__).parent / "data.csv"))
+    parser.add_argument("--altitude", type=float, default=25)
+    parser.add_argument("--hfov", type=float, default=75.5)
+    parser.add_argument("--vfov", type=float, default=60.2)
+    parser.add_argument("--front-overlap", type=float, default=0.75)
+    parser.add_argument("--side-overlap", type=float, default=0.65)
+    parser.add_argument("--heading", type=float, default=0.0)
+    args = parser.parse_args()
+
+    waypoints = survey_grid(
+        load_polygon(args.polygon),
+        args.altitude,
+        hfov=args.hfov,
+        vfov=args.vfov,
+        front_overlap=args.front_overlap,
+        side_overlap=args.side_overlap,
+        heading=args.heading
+    )
+    write_waypoints(args.output, waypoints)
+    print(f"Wrote {len(waypoints)} waypoints to {args.output}")
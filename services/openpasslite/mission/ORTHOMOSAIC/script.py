@@ -2,6 +2,81 @@ import json
 import csv
 from pathlib import Path
 import time
+from . import logic
+
+def fly_to(drone, lat, lon, height):
+    try:
+        drone.piloting.move_to(
+            lat=float(lat), 
+            lon=float(lon), 
+            alt=height, 
+            orientation_mode="NONE", 
+            heading=0, 
+            wait=True
+        )
+        print("Navigation completed successfully")
+        
+    except AssertionError as e:
+        print(f"Navigation with wait=True failed: {e}")
+        print("Attempting navigation without waiting...")
+        
+        drone.piloting.move_to(
+            lat=float(lat), 
+            lon=float(lon), 
+            alt=height, 
+            orientation_mode="NONE", 
+            heading=0, 
+            wait=False
+        )
+        print("Navigation command sent (not waiting for completion)")
+        time.sleep(3)
+
+def fly_stop_and_shoot(drone, waypoints, height):
+    """
+    Hovers at every waypoint and takes a single photo
+    """
+    for i, (lat, lon) in enumerate(waypoints):
+        print(f"=== WAYPOINT {i+1}/{len(waypoints)} ===")
+        print(f"Target: Lat={lat:.6f}, Lon={lon:.6f}, Alt={height}m")
+        
+        fly_to(drone, lat, lon, height)
+        
+        print("=== CAPTURING IMAGE ===")
+        try:
+            drone.camera.media.take_photo()
+            print("✓ Image captured")
+        except Exception as e:
+            print(f"Photo capture failed: {e}")
+        
+        time.sleep(2)
+
+def fly_gps_lapse(drone, lines, height, log_path):
+    """
+    Flies each survey line without stopping while the camera captures in gps lapse
+    mode, logging the drone position at every photo to {log_path}
+    """
+    drone.camera.media.start_photo_log()
+    try:
+        for i, line in enumerate(lines):
+            (start_lat, start_lon), (end_lat, end_lon) = line[0], line[-1]
+            print(f"=== SURVEY LINE {i+1}/{len(lines)} ({len(line)} waypoints) ===")
+            print(f"From: Lat={start_lat:.6f}, Lon={start_lon:.6f} To: Lat={end_lat:.6f}, Lon={end_lon:.6f}")
+            
+            fly_to(drone, start_lat, start_lon, height)
+            
+            print("=== CAPTURING GPS LAPSE ===")
+            try:
+                drone.camera.media.start_lapse_photo()
+                fly_to(drone, end_lat, end_lon, height)
+            finally:
+                try:
+                    drone.camera.media.stop_lapse_photo()
+                    print("✓ Survey line captured")
+                except Exception as e:
+                    print(f"Photo capture failed: {e}")
+    finally:
+        photo_log = drone.camera.media.stop_photo_log(str(log_path))
+        print(f"✓ {len(photo_log)} photo positions logged to {log_path}")
 
 def run(drone,lat_sample=None, long_sample=None):
     mission_dir = Path(__file__).parent
@@ -9,21 +84,42 @@ def run(drone,lat_sample=None, long_sample=None):
     csv_path = mission_dir / "data.csv"
     
     waypoints = []
-    height = 25
-    
+
     try:
-        with open(csv_path, 'r') as file:
-            csv_reader = csv.reader(file)
-            for row in csv_reader:
-                if len(row) >= 2:
-                    lat_val = float(row[0])
-                    lon_val = float(row[1])
-                    waypoints.append((lat_val, lon_val))
+        config = json.loads(config_path.read_text() or "{}")
     except Exception as e:
-        raise Exception(f"Failed to read coordinates from CSV: {e}")
+        raise Exception(f"Failed to read mission config: {e}")
+
+    height = config.get("height", 25)
+    capture_mode = config.get("capture_mode", "stop_and_shoot")
+    
+    if config.get("polygon"):
+        try:
+            waypoints = logic.survey_grid(
+                config["polygon"],
+                height,
+                hfov=config.get("hfov", 75.5),
+                vfov=config.get("vfov", 60.2),
+                front_overlap=config.get("front_overlap", 0.75),
+                side_overlap=config.get("side_overlap", 0.65),
+                heading=config.get("heading", 0)
+            )
+        except Exception as e:
+            raise Exception(f"Failed to generate survey grid from polygon: {e}")
+    else:
+        try:
+            with open(csv_path, 'r') as file:
+                csv_reader = csv.reader(file)
+                for row in csv_reader:
+                    if len(row) >= 2:
+                        lat_val = float(row[0])
+                        lon_val = float(row[1])
+                        waypoints.append((lat_val, lon_val))
+        except Exception as e:
+            raise Exception(f"Failed to read coordinates from CSV: {e}")
     
     if not waypoints:
-        raise Exception("No valid coordinates found in data.csv")
+        raise Exception("No valid coordinates found in data.csv or survey polygon")
         
     try:
         print("=== INITIALIZING DRONE ===")
@@ -35,7 +131,18 @@ def run(drone,lat_sample=None, long_sample=None):
         time.sleep(10)
 
         print("=== SETTING UP IMAGE MODE ===")
-        drone.camera.media.setup_photo()
+        if capture_mode == "gps_lapse":
+            lapse_interval = config.get("lapse_interval") or logic.photo_spacing(
+                height,
+                hfov=config.get("hfov", 75.5),
+                vfov=config.get("vfov", 60.2),
+                front_overlap=config.get("front_overlap", 0.75),
+                side_overlap=config.get("side_overlap", 0.65)
+            )[0]
+            print(f"GPS lapse capture every {lapse_interval:.1f}m")
+            drone.camera.media.setup_photo(mode="gps_lapse", capture_interval=float(lapse_interval))
+        else:
+            drone.camera.media.setup_photo()
         
         print("=== CHECKING GPS STATUS ===")
         coordinates = drone.get_drone_coordinates()
@@ -43,6 +150,16 @@ def run(drone,lat_sample=None, long_sample=None):
             raise Exception("GPS coordinates not available - drone may not have GPS lock")
         
         print(f"Current GPS coordinates: Lat={coordinates[0]:.6f}, Lon={coordinates[1]:.6f}, Alt={coordinates[2]:.2f}m")
+
+        if config.get("optimize_route", True) and capture_mode != "gps_lapse":
+            print("=== OPTIMIZING WAYPOINT ORDER ===")
+            waypoints, original_distance, optimized_distance = logic.optimize_route(
+                waypoints,
+                home=(coordinates[0], coordinates[1]),
+                time_limit=config.get("route_time_limit", 0.3)
+            )
+            print(f"Route length: {original_distance:.1f}m -> {optimized_distance:.1f}m "
+                  f"(saved {original_distance - optimized_distance:.1f}m)")
         
         print("=== INITIATING TAKEOFF ===")
         drone.piloting.takeoff()
@@ -51,52 +168,37 @@ def run(drone,lat_sample=None, long_sample=None):
         print("=== STABILIZING AFTER TAKEOFF ===")
         time.sleep(5)
         
+        if config.get("background_download", True):
+            print("=== STARTING BACKGROUND MEDIA DOWNLOAD ===")
+            drone.camera.media.start_background_download(
+                path=str(Path(drone.camera.media.download_dir) / ("orthomosaic_" + time.strftime("%Y%m%d_%H%M%S"))),
+                max_workers=config.get("download_workers", 4)
+            )
+        
         print(f"=== STARTING ORTHOMOSAIC MISSION ===")
         print(f"Total waypoints: {len(waypoints)} at {height}m altitude")
-        
-        for i, (lat, lon) in enumerate(waypoints):
-            print(f"=== WAYPOINT {i+1}/{len(waypoints)} ===")
-            print(f"Target: Lat={lat:.6f}, Lon={lon:.6f}, Alt={height}m")
-            
-            try:
-                drone.piloting.move_to(
-                    lat=float(lat), 
-                    lon=float(lon), 
-                    alt=height, 
-                    orientation_mode="NONE", 
-                    heading=0, 
-                    wait=True
-                )
-                print("Navigation completed successfully")
-                
-            except AssertionError as e:
-                print(f"Navigation with wait=True failed: {e}")
-                print("Attempting navigation without waiting...")
-                
-                drone.piloting.move_to(
-                    lat=float(lat), 
-                    lon=float(lon), 
-                    alt=height, 
-                    orientation_mode="NONE", 
-                    heading=0, 
-                    wait=False
-                )
-                print("Navigation command sent (not waiting for completion)")
-                time.sleep(3)
-            
-            print("=== CAPTURING IMAGE ===")
-            try:
-                drone.camera.media.take_photo()
-                print("✓ Image captured")
-            except Exception as e:
-                print(f"Photo capture failed: {e}")
-            
-            time.sleep(2)
+
+        if capture_mode == "gps_lapse":
+            lines = logic.split_lines(waypoints)
+            log_path = Path(drone.camera.media.download_dir) / (
+                "orthomosaic_photo_log_" + time.strftime("%Y%m%d_%H%M%S") + ".csv"
+            )
+            fly_gps_lapse(drone, lines, height, log_path)
+        else:
+            fly_stop_and_shoot(drone, waypoints, height)
         
         print("=== RETURNING TO HOME ===")
         drone.rth.setup_rth()
         drone.rth.return_to_home()
         print("✓ Returning to home position")
+
+        if config.get("background_download", True):
+            print("=== WAITING FOR MEDIA DOWNLOADS ===")
+            failed = drone.camera.media.stop_background_download(timeout=config.get("download_timeout", 300))
+            if failed:
+                print(f"Media download incomplete for: {', '.join(failed)}")
+            else:
+                print("✓ All media downloaded")
         
         print("=== ORTHOMOSAIC MISSION COMPLETED SUCCESSFULLY ===")
         
@@ -106,6 +208,13 @@ def run(drone,lat_sample=None, long_sample=None):
         
     finally:
         if drone:
+            try:
+                # a failed mission leaves the background download running
+                failed = drone.camera.media.stop_background_download(timeout=config.get("download_timeout", 300))
+                if failed:
+                    print(f"Media download incomplete for: {', '.join(failed)}")
+            except Exception as e:
+                print(f"Background download warning: {e}")
             try:
                 print("=== DISCONNECTING FROM DRONE ===")
                 drone.disconnect()
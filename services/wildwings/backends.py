@@ -0,0 +1,226 @@
+# Detection backends for the tracker.
+# Every backend is called like an ultralytics model, backend(frame), and returns a list with one
+# ultralytics Results, so navigation (boxes.xyxy / boxes.xywh / boxes.cls / orig_shape) and the
+# annotated image saving (results[0].save) work unchanged whichever runtime produced the boxes.
+#
+#   ultralytics  PyTorch eager mode, the reference and the fallback
+#   onnx         ONNX Runtime on an exported model with a fixed input size, optional INT8 weights
+#   openvino     OpenVINO model exported and run through ultralytics
+#
+# load_backend() exports and caches the ONNX / OpenVINO model next to the weights on first use and
+# falls back to ultralytics if the runtime is missing or the export fails.
+
+import os
+import ast
+import time
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("ultralytics", "onnx", "openvino")
+
+
+class UltralyticsBackend:
+    """
+    ultralytics YOLO in PyTorch (or any format ultralytics can load, e.g. an OpenVINO export directory)
+    """
+
+    name = "ultralytics"
+
+    def __init__(self, weights, imgsz=None, threads=None, conf=0.25, iou=0.7):
+        from ultralytics import YOLO
+
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(weights, task="detect")
+        self.imgsz = list(imgsz) if imgsz else None
+        self.conf = conf
+        self.iou = iou
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def __call__(self, frame, classes=None):
+        kwargs = {"imgsz": self.imgsz} if self.imgsz else {}
+        return self.model(frame, conf=self.conf, iou=self.iou, classes=classes, verbose=False, **kwargs)
+
+    def warmup(self, shape):
+        self(np.zeros(shape, dtype=np.uint8))
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime session on a YOLO model exported with a fixed input size (height, width).
+
+    Pre- and post-processing are done with OpenCV/numpy: letterbox into a reused buffer, one
+    blob conversion, then class-aware NMS on the (4 + classes, anchors) output.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path, threads=None, conf=0.25, iou=0.7, max_det=300):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = tuple(self.session.get_inputs()[0].shape[2:4])
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.padded = None
+        self.padded_shape = None
+
+    def letterbox(self, frame):
+        height, width = frame.shape[:2]
+        input_height, input_width = self.input_size
+        scale = min(input_height / height, input_width / width)
+        new_height, new_width = round(height * scale), round(width * scale)
+        top, left = (input_height - new_height) // 2, (input_width - new_width) // 2
+
+        if self.padded_shape != (height, width):
+            self.padded = np.full((input_height, input_width, 3), 114, dtype=np.uint8)
+            self.padded_shape = (height, width)
+        region = self.padded[top:top + new_height, left:left + new_width]
+        if (new_height, new_width) == (height, width):
+            region[:] = frame
+        else:
+            cv2.resize(frame, (new_width, new_height), dst=region, interpolation=cv2.INTER_LINEAR)
+        return self.padded, scale, left, top
+
+    def detect(self, frame, classes=None):
+        """
+        Returns (xyxy, conf, cls) numpy arrays in frame coordinates, only for `classes` if given
+        """
+        padded, scale, left, top = self.letterbox(frame)
+        blob = cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)
+        prediction = self.session.run(None, {self.input_name: blob})[0][0].T
+
+        scores = prediction[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf > self.conf
+        if classes is not None:
+            # like ultralytics: best class first, then the class filter, before NMS
+            keep &= np.isin(cls, classes)
+        boxes, conf, cls = prediction[keep, :4], conf[keep], cls[keep]
+        if len(boxes) == 0:
+            return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.float32)
+
+        # (cx, cy, w, h) -> (x, y, w, h) for OpenCV's NMS, done per class like ultralytics
+        nms_boxes = boxes.copy()
+        nms_boxes[:, :2] -= nms_boxes[:, 2:] / 2
+        indices = cv2.dnn.NMSBoxesBatched(nms_boxes.tolist(), conf.tolist(), cls.tolist(), self.conf, self.iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:self.max_det]
+
+        xyxy = np.empty((len(indices), 4), dtype=np.float32)
+        xyxy[:, :2] = boxes[indices, :2] - boxes[indices, 2:] / 2
+        xyxy[:, 2:] = boxes[indices, :2] + boxes[indices, 2:] / 2
+        xyxy -= (left, top, left, top)
+        xyxy /= scale
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, frame.shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, frame.shape[0])
+        return xyxy, conf[indices].astype(np.float32), cls[indices].astype(np.float32)
+
+    def __call__(self, frame, classes=None):
+        return [make_results(frame, self.names, *self.detect(frame, classes))]
+
+    def warmup(self, shape):
+        self.detect(np.zeros(shape, dtype=np.uint8))
+
+
+def make_results(image, names, xyxy, conf, cls):
+    """
+    ultralytics Results for detections computed outside ultralytics, boxes in image coordinates
+    """
+    import torch
+    from ultralytics.engine.results import Results
+
+    boxes = np.concatenate([xyxy, conf[:, None], cls[:, None]], axis=1).astype(np.float32)
+    return Results(image, path="", names=names, boxes=torch.from_numpy(boxes))
+
+
+def export_onnx(weights, imgsz, int8=False):
+    """
+    Export the weights to ONNX with a fixed (height, width) input, cached next to the weights.
+    With int8 the exported model is quantized with ONNX Runtime dynamic quantization (INT8 weights).
+    Returns the model path.
+    """
+    stem = os.path.splitext(weights)[0]
+    onnx_path = f"{stem}_{imgsz[0]}x{imgsz[1]}.onnx"
+    if not os.path.exists(onnx_path):
+        from ultralytics import YOLO
+
+        logger.info(f"Exporting {weights} to ONNX at {imgsz[0]}x{imgsz[1]}")
+        exported = YOLO(weights, task="detect").export(format="onnx", imgsz=list(imgsz), dynamic=False, simplify=False, half=False)
+        os.replace(exported, onnx_path)
+    if not int8:
+        return onnx_path
+
+    int8_path = f"{stem}_{imgsz[0]}x{imgsz[1]}_int8.onnx"
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"Quantizing {onnx_path} to INT8")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+def export_openvino(weights, imgsz):
+    stem = os.path.splitext(weights)[0]
+    export_dir = f"{stem}_{imgsz[0]}x{imgsz[1]}_openvino_model"
+    if not os.path.isdir(export_dir):
+        from ultralytics import YOLO
+
+        logger.info(f"Exporting {weights} to OpenVINO at {imgsz[0]}x{imgsz[1]}")
+        exported = YOLO(weights, task="detect").export(format="openvino", imgsz=list(imgsz), dynamic=False, half=False)
+        os.replace(exported, export_dir)
+    return export_dir
+
+
+def load_backend(weights, backend="onnx", imgsz=(384, 640), int8=False, threads=None, conf=0.25, iou=0.7):
+    """
+    Load a detection backend, falling back to ultralytics if the requested one cannot be used.
+
+    weights   ultralytics weights name or path, e.g. "yolov5su"
+    backend   "onnx", "openvino" or "ultralytics"
+    imgsz     (height, width) network input, multiples of 32: fixed for the exported models, the
+              letterbox size for ultralytics; (384, 640) fits 640 px wide 16:9 frames without padding
+    int8      quantize the ONNX model weights to INT8
+    threads   intra-op CPU threads, None for all cores
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detection backend: {backend}")
+    if not os.path.splitext(weights)[1]:
+        weights += ".pt"
+
+    start = time.monotonic()
+    try:
+        if backend == "onnx":
+            model = OnnxBackend(export_onnx(weights, imgsz, int8), threads=threads, conf=conf, iou=iou)
+            if int8:
+                model.name = "onnx-int8"
+        elif backend == "openvino":
+            model = UltralyticsBackend(export_openvino(weights, imgsz), imgsz=imgsz, threads=threads, conf=conf, iou=iou)
+            model.name = "openvino"
+        else:
+            model = UltralyticsBackend(weights, imgsz=imgsz, threads=threads, conf=conf, iou=iou)
+    except Exception as e:
+        if backend == "ultralytics":
+            raise
+        logger.warning(f"{backend} backend unavailable ({e}), falling back to ultralytics")
+        model = UltralyticsBackend(weights, imgsz=imgsz, threads=threads, conf=conf, iou=iou)
+    logger.info(f"Loaded {model.name} detection backend in {time.monotonic() - start:.1f} s")
+    return model
@@ -0,0 +1,145 @@
+# Compares the detection backends (backends.py) on recorded frames: latency per frame and agreement
+# with the ultralytics PyTorch reference.
+#
+# Run from services/wildwings:
+#   python benchmarks/detector_backends.py <video or image directory> [--frames 200] [--threads 4]
+#       [--backends ultralytics onnx onnx-int8 openvino]
+#
+# Any video OpenCV can read works, e.g. a segment written by the openpasslite segment recorder
+# (static/recordings/*.h264) or a mission recording. Frames are downscaled to the tracker's
+# inference width first, like the live path.
+#
+# Agreement per frame: detections are matched to the reference greedily (same class, IoU >= 0.5),
+# the F1 of the match is averaged over frames; "same move" is the share of frames where
+# navigation.auto_navigation returns the same (x, y, z) move as with the reference detections.
+
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import navigation
+from backends import load_backend
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_frames(path, count, width):
+    frames = []
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:count]:
+            frames.append(cv2.imread(os.path.join(path, name)))
+    else:
+        capture = cv2.VideoCapture(path)
+        while len(frames) < count:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+
+    resized = []
+    for frame in frames:
+        if frame is None:
+            continue
+        if frame.shape[1] > width:
+            height = int(round(frame.shape[0] * width / frame.shape[1] / 2)) * 2
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        resized.append(frame)
+    return resized
+
+
+def parse_backend(name):
+    if name == "onnx-int8":
+        return "onnx", True
+    return name, False
+
+
+def box_iou(a, b):
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def agreement(reference, candidate, threshold=0.5):
+    """
+    F1 of greedily matched detections (same class, IoU >= threshold)
+    """
+    ref_boxes, ref_cls = reference
+    boxes, cls = candidate
+    if len(ref_boxes) == 0 and len(boxes) == 0:
+        return 1.0
+    if len(ref_boxes) == 0 or len(boxes) == 0:
+        return 0.0
+    iou = box_iou(ref_boxes, boxes)
+    iou[ref_cls[:, None] != cls[None, :]] = 0
+    matched = 0
+    while True:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[i, j] < threshold:
+            break
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    precision, recall = matched / len(boxes), matched / len(ref_boxes)
+    return 2 * precision * recall / (precision + recall) if matched else 0.0
+
+
+def run(model, frames):
+    latencies, detections, moves = [], [], []
+    model.warmup(frames[0].shape)
+    for frame in frames:
+        start = time.perf_counter()
+        results = model(frame)
+        latencies.append(time.perf_counter() - start)
+        boxes = results[0].boxes
+        detections.append((boxes.xyxy.numpy(), boxes.cls.numpy()))
+        moves.append(navigation.auto_navigation(results))
+    return np.array(latencies) * 1000, detections, moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection backend benchmark")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--frames", type=int, default=200, help="frames read from the source")
+    parser.add_argument("--width", type=int, default=640, help="inference width the frames are downscaled to")
+    parser.add_argument("--weights", default="yolov5su", help="ultralytics weights")
+    parser.add_argument("--imgsz", type=int, nargs=2, default=(384, 640), help="fixed input height and width of exported models")
+    parser.add_argument("--threads", type=int, default=None, help="inference threads, all cores by default")
+    parser.add_argument("--backends", nargs="+", default=["ultralytics", "onnx", "onnx-int8", "openvino"])
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames, args.width)
+    if not frames:
+        sys.exit(f"No frames read from {args.source}")
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    reference = None
+    print(f"{'backend':<12} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'dets/frame':>11} {'F1 vs ref':>10} {'same move':>10}")
+    for name in ["ultralytics"] + [name for name in args.backends if name != "ultralytics"]:
+        backend, int8 = parse_backend(name)
+        model = load_backend(args.weights, backend, imgsz=tuple(args.imgsz), int8=int8, threads=args.threads)
+        if name != "ultralytics" and model.name == "ultralytics":
+            print(f"{name:<12} unavailable, skipped")
+            continue
+        latencies, detections, moves = run(model, frames)
+        if reference is None:
+            reference = (detections, moves)
+        f1 = np.mean([agreement(ref, det) for ref, det in zip(reference[0], detections)])
+        same_move = np.mean([ref == move for ref, move in zip(reference[1], moves)])
+        if name == "ultralytics" and "ultralytics" not in args.backends:
+            continue
+        print(f"{name:<12} {latencies.mean():>8.1f} {np.percentile(latencies, 50):>8.1f} {np.percentile(latencies, 95):>8.1f} "
+              f"{np.mean([len(det[0]) for det in detections]):>11.2f} {f1:>10.3f} {same_move:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
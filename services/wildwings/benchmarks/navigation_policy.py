@@ -0,0 +1,248 @@
+# Golden-output check and microbenchmark for navigation.auto_navigation.
+#
+# auto_navigation used to build pandas DataFrames from the boxes on every frame; it now works on the
+# numpy arrays directly. The pandas version is kept below, verbatim, as the reference: the numpy
+# version must return exactly the same move for every detection set, including the policy quirks
+# (left/right moves cancelled, "backward" sent on the y axis, no move without detections).
+#
+# Run from services/wildwings (needs pandas, which the service itself no longer imports):
+#   python benchmarks/navigation_policy.py [--frames 20000] [--detections recorded.npz]
+#
+# Detection sets are generated with a fixed seed: empty frames, single boxes, herds, ties on the
+# widest box, boxes touching the frame edges and the centre band limits. --detections adds recorded
+# sets: an .npz with an "orig_shape" (height, width) array and one (N, 4) xywh array per frame.
+# Exits with status 1 if any output differs.
+#
+# --write-fixture freezes detection sets and the moves of this reference into the .npz read by
+# tests/test_navigation.py (same layout plus an (F, 3) "expected" array), so the golden check runs
+# under pytest without pandas:
+#   python benchmarks/navigation_policy.py --frames 200 --write-fixture tests/data/navigation_detections.npz
+
+import os
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import navigation
+from navigation import x_dist, y_dist
+
+
+class Boxes(np.ndarray):
+    """
+    numpy array with the .numpy() accessor of the ultralytics box tensors
+    """
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+class DetectionResult:
+    """
+    The part of an ultralytics Results that auto_navigation reads
+    """
+
+    def __init__(self, xywh, orig_shape):
+        xywh = np.asarray(xywh, dtype=np.float32).reshape(-1, 4)
+        xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+        self.orig_shape = tuple(orig_shape)
+        self.boxes = SimpleNamespace(xywh=xywh.view(Boxes), xyxy=xyxy.view(Boxes))
+
+
+def auto_navigation_pandas(results):
+    # orig_shape outputs (height, width)
+    centroid_camera = (results[0].orig_shape[1]/2, results[0].orig_shape[0]/2)
+    
+    #px = pd.DataFrame((results[0].boxes.boxes).numpy(), columns = ('x1', 'y1','x2', 'y2', 'confidence', 'class'))
+    px = pd.DataFrame((results[0].boxes.xyxy).numpy(), columns = ('x1', 'y1','x2', 'y2'))
+    # get x, y, w, h for results and convert to dataframe
+    pxywh = pd.DataFrame((results[0].boxes.xywh).numpy(), columns = ('x', 'y','w', 'h'))
+    px = px.join(pxywh)
+
+    # Increase bounding box size for better tracking (1.5x expansion)
+    expansion_factor = 1.5
+    px['w'] = px['w'] * expansion_factor
+    px['h'] = px['h'] * expansion_factor
+
+    # Recalculate corner coordinates based on expanded dimensions
+    px['x1'] = px['x'] - (px['w'] / 2)
+    px['y1'] = px['y'] - (px['h'] / 2)
+    px['x2'] = px['x'] + (px['w'] / 2)
+    px['y2'] = px['y'] + (px['h'] / 2)
+
+    # calculate bounding box sizes in terms of pixel width and height
+    bbox_sizes = []
+    for b in results[0].boxes.xywh:
+        bbox_sizes.append((b[2] * expansion_factor, b[3] * expansion_factor)) # get width and height of bounding box
+
+    # get centroid of single person (if multiple detections, use the largest/closest one)
+    if len(px) > 0:
+        # Find the largest bounding box (assuming closest person)
+        largest_idx = px['w'].idxmax()
+        centroid_person = (px.loc[largest_idx, 'x'], px.loc[largest_idx, 'y'])
+    else:
+        # Fallback to center if no detection
+        centroid_person = (results[0].orig_shape[1]/2, results[0].orig_shape[0]/2)
+
+    # Use single person centroid instead of herd centroid
+    centroid_herd = centroid_person
+
+    image_shape_h, image_shape_w = results[0].orig_shape
+    x_center_range = image_shape_w/2 - image_shape_w/8, image_shape_w/2 + image_shape_w/8
+    y_center_range = image_shape_h/2 - image_shape_h/8, image_shape_h/2 + image_shape_h/8
+
+    # calculate differencee between centroid of herd and camera
+    dif_x = centroid_herd[0] - centroid_camera[0]
+    dif_y = centroid_herd[1] - centroid_camera[1]
+
+    # get the middle 75% of the image, i.e. 12.5% on each side
+    left_range = results[0].orig_shape[1]/8
+    right_range = results[0].orig_shape[1] - left_range
+    top_range = results[0].orig_shape[0]/8
+    bottom_range = results[0].orig_shape[0] - top_range
+
+    # get range of x values for herd
+    x_min_herd, x_max_herd = px['x1'].min(), px['x2'].max()
+    y_min_herd, y_max_herd = px['y1'].min(), px['y2'].max()
+
+    # Calculate next move for drone in x, y, z direction
+
+    # navigation policy: move x, y, z, yaw until herd is in center of camera frame, keep checking every 1 sec to adjust
+    # continuous adjustments allows us to avoid complex calculations and avoid overshooting
+    # direction_x = "No movement in x-axis"
+    # direction_y = "No movement in y-axis"
+    # direction_z = "No movement in z-axis"
+    direction_x = 0
+    direction_y = 0
+    direction_z = 0
+
+    if (centroid_herd[0] < x_center_range[0]) | (centroid_herd[0] > x_center_range[1]):
+        if dif_x > 0:
+            #print("y-axis: Move right")
+            direction_y = +y_dist # move right
+        elif dif_x < 0:
+            #print("y-axis: Move left")
+            direction_y = -y_dist # move left
+        else:
+            #print("y-axis: No movement in y-axis")
+            direction_y = 0
+    else:
+        #print("y-axis: No movement in y-axis")
+        direction_y = 0
+
+    # if no movement left or right, move forward or backward
+    if direction_y == 0:
+        # check to see if herd is in center 75% of camera frame
+        if (x_min_herd >= left_range) | (x_max_herd <= right_range):
+            #print("x-axis: Move forward")
+            direction_x = x_dist # move forward
+        elif (x_min_herd <= left_range) | (x_max_herd >= right_range):
+            #print("x-axis: Move backward")
+            direction_y = -x_dist # move backward
+    else:
+        #print("No movement in x-axis")
+        direction_y = 0
+
+    # note: y-axis in image is actually z-axis in drone; y-axis in image is inverted (0,0 is top left corner)
+    # Keep height constant at 13.0 meters - no vertical movement
+    direction_z = 0
+
+    return  direction_x, direction_y, direction_z
+
+
+def generate(frames, orig_shape=(360, 640), seed=0):
+    rng = np.random.default_rng(seed)
+    height, width = orig_shape
+    cases = [
+        [],
+        [[width / 2, height / 2, 40, 30]],
+        # centre band limits (width / 2 +- width / 8) and the 75% extent limits
+        [[width * 3 / 8, height / 2, 40, 30]],
+        [[width * 5 / 8, height / 2, 40, 30]],
+        [[width * 3 / 8 - 0.5, height / 2, 40, 30]],
+        [[width / 2, height / 2, width * 3 / 4 / 1.5, 30]],
+        [[width / 2, height / 2, width / 1.5, 30]],
+        # two boxes of the same width, the first one wins
+        [[100, 100, 50, 50], [width / 2, height / 2, 50, 50]],
+        [[width / 2, height / 2, 50, 50], [100, 100, 50, 50]],
+        # herd spanning the frame
+        [[10, 50, 20, 20], [width - 10, 50, 20, 20], [width / 2, height / 2, 30, 30]],
+        # herd reaching both 12.5% margins only once the boxes are expanded 1.5x
+        [[width / 8 + 10, height / 2, 14, 14], [width * 7 / 8 - 10, height / 2, 14, 14], [width / 2, height / 2, 20, 20]],
+    ]
+    sets = [(case, orig_shape) for case in cases]
+    while len(sets) < frames:
+        count = rng.choice([0, 1, 1, 2, 3, 5, 8, 12])
+        centers = rng.uniform((0, 0), (width, height), size=(count, 2))
+        sizes = rng.uniform(4, (width / 2, height / 2), size=(count, 2))
+        if count > 1 and rng.random() < 0.1:
+            sizes[1] = sizes[0]
+        sets.append((np.concatenate([centers, sizes], axis=1), orig_shape))
+    return sets
+
+
+def load_recorded(path):
+    data = np.load(path)
+    orig_shape = tuple(int(v) for v in data["orig_shape"])
+    return [(data[key], orig_shape) for key in data.files if key not in ("orig_shape", "expected")]
+
+
+def write_fixture(path, sets, expected):
+    """
+    Detection sets (all of one orig_shape) and their reference moves in the load_recorded layout
+    """
+    orig_shape = sets[0][1]
+    if any(shape != orig_shape for _, shape in sets):
+        raise ValueError("a fixture holds detection sets of a single frame size")
+    frames = {f"frame_{i:05d}": np.asarray(xywh, dtype=np.float32).reshape(-1, 4) for i, (xywh, _) in enumerate(sets)}
+    np.savez_compressed(path, orig_shape=np.array(orig_shape), expected=np.array(expected, dtype=np.float64), **frames)
+
+
+def timed(fn, inputs):
+    start = time.perf_counter()
+    outputs = [fn(results) for results in inputs]
+    return outputs, (time.perf_counter() - start) / len(inputs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="auto_navigation golden check and microbenchmark")
+    parser.add_argument("--frames", type=int, default=20000, help="generated detection sets")
+    parser.add_argument("--detections", help="recorded detection sets (.npz)")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=(360, 640), metavar=("HEIGHT", "WIDTH"),
+                        help="orig_shape of the generated sets")
+    parser.add_argument("--write-fixture", help="save the sets and the reference moves to this .npz")
+    args = parser.parse_args()
+
+    sets = generate(args.frames, orig_shape=tuple(args.frame_size))
+    if args.detections:
+        sets += load_recorded(args.detections)
+    inputs = [[DetectionResult(xywh, orig_shape)] for xywh, orig_shape in sets]
+
+    expected, pandas_us = timed(auto_navigation_pandas, inputs)
+    actual, numpy_us = timed(navigation.auto_navigation, inputs)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if tuple(a) != tuple(b)]
+    moves = {}
+    for move in expected:
+        moves[tuple(move)] = moves.get(tuple(move), 0) + 1
+    print(f"{len(inputs)} detection sets, reference moves: {moves}")
+    print(f"{'implementation':<16} {'us/call':>10}")
+    print(f"{'pandas':<16} {pandas_us:>10.1f}")
+    print(f"{'numpy':<16} {numpy_us:>10.1f}")
+    print(f"speedup {pandas_us / numpy_us:.1f}x")
+    if mismatches:
+        for i in mismatches[:10]:
+            print(f"mismatch on set {i}: {sets[i][0]!r} expected {expected[i]} got {actual[i]}")
+        sys.exit(1)
+    print("outputs identical")
+    if args.write_fixture:
+        write_fixture(args.write_fixture, sets, expected)
+        print(f"fixture written to {args.write_fixture}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,24 @@
 import cv2
 import time
-import queue
-import olympe
+import numpy as np
 from SoftwarePilot import SoftwarePilot
-from ultralytics import YOLO
+from backends import load_backend, make_results
+from roi import RoiPlanner
+from mot import MultiObjectTracker
+from frame_writer import FrameWriter
+from telemetry_sink import TelemetrySink
+from follow import VelocityController, ground_offset, DEFAULT_HFOV, DEFAULT_VFOV
+from end_conditions import LIMIT_TYPES, MissionEnd, MissionLimits
 import navigation as navigation
+from frames import FrameMailbox, FrameConverter
+from telemetry import frame_telemetry, capture_time
+from pipeline import Channel, Stage, StageLatency
 import sys
 import json
-import time
-import csv
 import os
-import datetime
 import logging
+import toml
+from pathlib import Path
 
 # Configure logging
 logging.basicConfig(
@@ -28,284 +35,658 @@ logger = logging.getLogger(__name__)
 IN_DOCKER = os.environ.get('IN_DOCKER', 'false').lower() == 'true' or os.path.exists('/.dockerenv')
 
 # User-defined mission parameters
-DURATION = 25  # duration in seconds
-
-# Retrieve the filename from command-line arguments
-if len(sys.argv) < 2:
-    logger.error("Usage: python controller.py <output_directory> [lat] [lon]")
-    sys.exit(1)
-
-output_directory = sys.argv[1]
-logger.info(f"Output directory: {output_directory}")
-
-# Optional lat/lon coordinates
-mission_lat = None
-mission_lon = None
-if len(sys.argv) >= 4:
-    try:
-        mission_lat = float(sys.argv[2])
-        mission_lon = float(sys.argv[3])
-        logger.info(f"Mission coordinates received: lat={mission_lat}, lon={mission_lon}")
-    except (ValueError, IndexError) as e:
-        logger.warning(f"Invalid lat/lon coordinates provided: {e}")
-else:
-    logger.info("No mission coordinates provided")
-
-# Ensure output directory exists with proper permissions
-try:
+DURATION = 25  # default maximum tracking duration in seconds, see end_conditions.py
+MODEL_NAME = 'yolov5su'
+DETECTOR_BACKEND = 'onnx'  # 'onnx', 'openvino' or 'ultralytics', falls back to ultralytics
+DETECTOR_INPUT_SIZE = (384, 640)  # fixed (height, width) input of exported models
+DETECTOR_INT8 = False  # INT8 weights for the onnx backend
+DETECTOR_THREADS = None  # inference CPU threads, None for all cores
+ROI_ENABLED = True  # detect on a native-resolution window around the target once one is found
+ROI_WINDOW = (320, 320)  # (height, width) of the ROI window and of the ROI detector input
+ROI_FULL_FRAME_INTERVAL = 10  # full-frame detection every N frames while tracking a target
+TRACK_RATE_HZ = None  # max frames processed per second by the tracker (detected or predicted), None: every frame
+DETECTION_RATE_HZ = None  # max detections per second, None: back to back; tracks are predicted on the frames in between
+TRACK_MAX_AGE = 3.0  # seconds a tracked animal is kept without a matching detection
+INFERENCE_WIDTH = 640  # frames are downscaled to this width before detection
+IO_BACKLOG = 30  # records waiting for the disk before the oldest are dropped
+LATENCY_LOG_INTERVAL = 10.0  # seconds between two stage latency log lines
+FOLLOW_MODE = 'velocity'  # 'velocity': PID velocity setpoints (follow.py), 'move_by': fixed move_by steps
+MOVE_BY_INTERVAL = 1.0  # seconds between two move_by steps, one per 30 frames at 30 fps like the original loop
+CONTROL_RATE_HZ = 10.0  # velocity setpoints sent per second
+TRACKING_ALTITUDE = 5.0  # meters above ground, used when the frame metadata has no ground distance
+TRACKING_GIMBAL_PITCH = -65  # gimbal pitch while tracking, degrees
+ARRIVAL_TOLERANCE = 2.0  # meters from the mission target counted as arrived
+ARRIVAL_TIMEOUT = 120.0  # seconds of transit to the mission target before tracking starts anyway
+
+def load_config():
+    """
+    The [wildwings] section of config.toml, empty if the file is not found
+    """
+    for config_path in (Path("/app/config.toml"), Path(__file__).parent.parent.parent / "config.toml"):
+        if config_path.exists():
+            return toml.load(config_path).get("wildwings", {})
+    return {}
+
+
+def load_species_filter():
+    """
+    Species filter from config.toml, read per mission so edits apply without restarting the worker
+    """
+    config = load_config()
+    return navigation.SpeciesFilter(
+        species=config.get("species", navigation.SPECIES),
+        min_confidence=config.get("min_confidence", navigation.MIN_CONFIDENCE)
+    )
+
+
+def load_frame_writer(images_dir):
+    """
+    Annotated-frame writer configured from config.toml (frame_policy, frame_interval,
+    frame_width, frame_format, frame_quality), read per mission like the species filter
+    """
+    config = load_config()
+    return FrameWriter(
+        images_dir,
+        policy=config.get("frame_policy", "all"),
+        interval=config.get("frame_interval", 1.0),
+        width=config.get("frame_width") or None,
+        image_format=config.get("frame_format", "jpg"),
+        quality=config.get("frame_quality", 95)
+    )
+
+
+def load_telemetry_sink(output_directory):
+    """
+    Telemetry log of the mission, telemetry_log.csv / .parquet / .arrow as set by
+    telemetry_format in config.toml
+    """
+    config = load_config()
+    return TelemetrySink(
+        os.path.join(output_directory, 'telemetry_log.csv'),
+        file_format=config.get("telemetry_format", "csv"),
+        flush_interval=config.get("telemetry_flush_interval", 2.0)
+    )
+
+
+def battery_percent(drone):
+    """
+    Battery level of the drone in percent, None when the drone has not reported it
+    """
+    from olympe.messages.common.CommonState import BatteryStateChanged
+
+    return drone.drone.get_state(BatteryStateChanged)["percent"]
+
+
+class MissionStopped(Exception):
+    """
+    The stop request arrived before the tracking phase started
+    """
+
+
+def check_stop(stop_event):
+    if stop_event is not None and stop_event.is_set():
+        raise MissionStopped("stop requested")
+
+
+def fly_to_target(drone, lat, lon, alt, stop_event=None, poll_interval=0.5):
+    """
+    Send move_to without waiting and poll the drone position until it is within ARRIVAL_TOLERANCE
+    meters of the target, so a stop request cancels the transit instead of waiting for the arrival.
+    Returns False if the target is still not reached after ARRIVAL_TIMEOUT seconds.
+    """
+    drone.piloting.move_to(lat=lat, lon=lon, alt=alt, orientation_mode="TO_TARGET", heading=0, wait=False)
+    deadline = time.monotonic() + ARRIVAL_TIMEOUT
+    meters_per_degree = 111320.0
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            try:
+                drone.piloting.cancel_move_to()
+            except Exception as e:
+                logger.warning(f"Could not cancel navigation: {e}")
+            raise MissionStopped("stop requested during navigation")
+        coordinates = drone.get_drone_coordinates()
+        north = (coordinates[0] - lat) * meters_per_degree
+        east = (coordinates[1] - lon) * meters_per_degree * np.cos(np.radians(lat))
+        if np.hypot(north, east) <= ARRIVAL_TOLERANCE:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        if stop_event is not None:
+            stop_event.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+
+
+def prepare_output(output_directory):
+    """
+    Create the mission output directory and its images subdirectory.
+    Returns images_dir.
+    """
     os.makedirs(output_directory, exist_ok=True)
     os.chmod(output_directory, 0o755)
-except Exception as e:
-    logger.error(f"Failed to create output directory: {e}")
-    sys.exit(1)
-
-# Define CSV file path to store telemetry data
-csv_file_path = os.path.join(output_directory, 'telemetry_log.csv')
-
-# Create images subdirectory
-images_dir = os.path.join(output_directory, 'images')
-try:
-    os.makedirs(images_dir, exist_ok=True)
-    os.chmod(images_dir, 0o755)
-    logger.info(f"Created images directory: {images_dir}")
-except Exception as e:
-    logger.error(f"Failed to create images directory: {e}")
-
-# Ensure the CSV file has a header row
-if not os.path.exists(csv_file_path):
+
+    # Create images subdirectory
+    images_dir = os.path.join(output_directory, 'images')
     try:
-        with open(csv_file_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["timestamp", "x", "y", "z", "move_x", "move_y", "move_z", "frame"])
-        os.chmod(csv_file_path, 0o644)
-        logger.info("Created telemetry CSV file")
+        os.makedirs(images_dir, exist_ok=True)
+        os.chmod(images_dir, 0o755)
+        logger.info(f"Created images directory: {images_dir}")
     except Exception as e:
-        logger.error(f"Failed to create CSV file: {e}")
+        logger.error(f"Failed to create images directory: {e}")
+
+    return images_dir
+
+
+def load_model():
+    """
+    Load the detection backend and run one inference on a blank frame, so the first
+    mission frame does not pay for lazy initialisation (weights to device, fused layers)
+    """
+    logger.info("Loading YOLO model")
+    model = load_backend(MODEL_NAME, DETECTOR_BACKEND, imgsz=DETECTOR_INPUT_SIZE,
+                         int8=DETECTOR_INT8, threads=DETECTOR_THREADS)
+    start = time.monotonic()
+    model.warmup((INFERENCE_WIDTH * 9 // 16, INFERENCE_WIDTH, 3))
+    logger.info(f"YOLO model warmed up in {(time.monotonic() - start) * 1000:.0f} ms")
+    return model
+
+
+def load_roi_model():
+    """
+    Load the detector used on ROI windows, None when ROI detection is disabled
+    """
+    if not ROI_ENABLED:
+        return None
+    model = load_backend(MODEL_NAME, DETECTOR_BACKEND, imgsz=ROI_WINDOW,
+                         int8=DETECTOR_INT8, threads=DETECTOR_THREADS)
+    model.warmup((ROI_WINDOW[0], ROI_WINDOW[1], 3))
+    return model
+
 
 class Tracker:
-    def __init__(self, drone, model):
+    """
+    Staged tracking pipeline, one thread per stage:
+
+    intake (this thread)  newest frame from the mailbox, telemetry, downscale to BGR,
+                          plus the native-resolution ROI window when tracking a target
+    inference             YOLO detection on the ROI window or the full frame, then the
+                          multi-object tracker update (persistent IDs, locked target)
+    navigation            ground error of the target from the tracked boxes at the frame's
+                          capture time, fed to the VelocityController, which sends piloting
+                          setpoints from its own thread at CONTROL_RATE_HZ
+    command               drone.piloting.move_by, only with FOLLOW_MODE = 'move_by': on detection
+                          frames, at most one step every MOVE_BY_INTERVAL seconds
+    io                    telemetry row buffered in the TelemetrySink, annotated image
+                          handed to the FrameWriter pool
+
+    Stages are connected by latest-value channels: a stage that falls behind skips to the
+    newest item instead of stalling the stages before it. Intake hands a frame to inference
+    whenever inference is free, so detection runs back to back (or at DETECTION_RATE_HZ);
+    with the velocity controller every other frame only goes to navigation, which steers by
+    the Kalman-predicted boxes.
+    The io channel keeps a short backlog so records are only lost if the disk stalls for
+    several frames. Records are written for detection frames only.
+    """
+
+    def __init__(self, drone, model, telemetry_log, frame_writer, rate=TRACK_RATE_HZ, roi_model=None, species=None,
+                 follow_mode=FOLLOW_MODE, mission_end=None):
         self.drone = drone
+        self.telemetry_log = telemetry_log
+        self.frame_writer = frame_writer
         self.media = drone.camera.media
         self.model = model
         self.frame = None
         self.FPS = 1/60
         self.FPS_MS = int(self.FPS * 1000)
+        self.mailbox = FrameMailbox(rate=rate)
+        self.converter = FrameConverter(width=INFERENCE_WIDTH)
+        self.roi_model = roi_model
+        self.species = species or navigation.SpeciesFilter()
+        self.roi = RoiPlanner(window=ROI_WINDOW, full_frame_interval=ROI_FULL_FRAME_INTERVAL)
+        self.mot = MultiObjectTracker(max_age=TRACK_MAX_AGE)
+        self.detection_interval = 1 / DETECTION_RATE_HZ if DETECTION_RATE_HZ else 0.0
+        self.frame_shape = None
+        self.last_telemetry = None
+        self.last_move = None
+        self.mission_end = mission_end or MissionEnd(MissionLimits())
+        self.velocity = None
+        if follow_mode == 'velocity':
+            # drone.drone is the olympe.Drone behind the SoftwarePilot controller
+            self.velocity = VelocityController(drone.drone, rate=CONTROL_RATE_HZ, on_sent=self.command_sent)
+
+        self.latency = StageLatency(interval=LATENCY_LOG_INTERVAL)
+        self.inference_channel = Channel("inference")
+        self.navigation_channel = Channel("navigation")
+        self.command_channel = Channel("command")
+        self.io_channel = Channel("io", capacity=IO_BACKLOG)
+        self.stages = [
+            Stage("inference", self.inference_channel, self.infer, self.latency),
+            Stage("navigation", self.navigation_channel, self.navigate, self.latency),
+            Stage("command", self.command_channel, self.command, self.latency),
+            Stage("io", self.io_channel, self.write_record, self.latency),
+        ]
+        if self.velocity is not None:
+            self.stages = [stage for stage in self.stages if stage.name != "command"]
         logger.info("Tracker initialized")
 
     def track(self):
         logger.info("Starting tracking loop")
         frame_count = 0
-        
+        predicted_count = 0
+        frame_stamp = 0.0
+        last_detection = 0.0
+        self.frame_writer.start()
+        self.telemetry_log.start()
+        for stage in self.stages:
+            stage.start()
+        if self.velocity is not None:
+            self.velocity.start()
+
         while self.media.running:
-            yuv_frame = None
+            yuv_frame, frame_stamp = self.mailbox.get(newer_than=frame_stamp, timeout=0.1)
+            if yuv_frame is None:
+                continue
+
+            # detect when inference has taken the previous frame, otherwise navigation steers
+            # by the tracks predicted at this frame's capture time
+            if (not self.inference_channel.wait_space(timeout=0)
+                    or time.monotonic() - last_detection < self.detection_interval):
+                # the velocity controller projects the target with the pose of this frame,
+                # move_by steps are only taken on detection frames
+                if self.velocity is None:
+                    yuv_frame.unref()
+                    continue
+                telemetry = frame_telemetry(yuv_frame)
+                yuv_frame.unref()
+                # never replaces a detection waiting for navigation
+                if self.frame_shape is not None and self.navigation_channel.offer(
+                        {"frame": None, "stamp": frame_stamp, "shape": self.frame_shape, "telemetry": telemetry}):
+                    predicted_count += 1
+                continue
+            last_detection = time.monotonic()
+            start = time.monotonic()
             try:
-                yuv_frame = self.media.frame_queue.get(timeout=0.1)
                 self.media.frame_counter += 1
                 frame_count += 1
 
-                if (self.media.frame_counter % 30) == 0:
-                    logger.info(f"Processing frame {self.media.frame_counter}")
-                    
-                    # Get frame info
-                    info = yuv_frame.info()
-                    height, width = (
-                        info["raw"]["frame"]["info"]["height"],
-                        info["raw"]["frame"]["info"]["width"],
-                    )
-
-                    # Convert YUV to BGR
-                    cv2_cvt_color_flag = {
-                        olympe.VDEF_I420: cv2.COLOR_YUV2BGR_I420,
-                        olympe.VDEF_NV12: cv2.COLOR_YUV2BGR_NV12,
-                    }[yuv_frame.format()]
-
-                    cv2frame = cv2.cvtColor(yuv_frame.as_ndarray(), cv2_cvt_color_flag)
-
-                    # Get navigation action
-                    x_direction, y_direction, z_direction = navigation.get_next_action(
-                        cv2frame, self.model, images_dir, self.media.frame_counter
-                    )
-
-                    # Get and save telemetry
-                    try:
-                        telemetry = drone.get_drone_coordinates()
-                        timestamp = datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S')
-                        
-                        with open(csv_file_path, mode='a', newline='') as file:
-                            writer = csv.writer(file)
-                            writer.writerow([timestamp, telemetry[0], telemetry[1], telemetry[2], 
-                                           x_direction, y_direction, z_direction, self.media.frame_counter])
-                        
-                        logger.debug(f"Telemetry saved for frame {self.media.frame_counter}")
-                    except Exception as e:
-                        logger.error(f"Failed to save telemetry: {e}")
-
-                    # Uncomment to enable drone movement
-                    logger.info(f"Coodinate/Direction : {x_direction, y_direction, z_direction, 0}")
-                    self.drone.piloting.move_by(x_direction, y_direction, z_direction, 0)
-
-                if yuv_frame is not None:
-                    yuv_frame.unref()
-                    
-            except queue.Empty:
-                continue
+                logger.debug(f"Processing frame {self.media.frame_counter}")
+
+                # Pose at capture time, from the frame's own metadata
+                telemetry = frame_telemetry(yuv_frame)
+                if telemetry is None:
+                    # no video metadata on this frame, fall back to the drone state
+                    coordinates = self.drone.get_drone_coordinates()
+                    telemetry = {"latitude": coordinates[0], "longitude": coordinates[1], "altitude": coordinates[2]}
+
+                # Downscale and convert YUV to BGR; copied out of the converter's reused
+                # buffer because inference runs while the next frame is converted
+                cv2frame = self.converter.convert(yuv_frame).copy()
+                self.frame_shape = cv2frame.shape[:2]
+
+                # Native-resolution window around the target, None for full-frame detection
+                yuv_height, native_width = yuv_frame.as_ndarray().shape
+                native_height = yuv_height * 2 // 3
+                window = None
+                if self.roi_model is not None:
+                    window = self.roi.plan(native_width, native_height, frame_stamp)
+                crop = self.converter.convert_crop(yuv_frame, *window) if window is not None else None
             except Exception as e:
                 logger.error(f"Error processing frame: {e}")
-                if yuv_frame is not None:
-                    yuv_frame.unref()
                 continue
-
-        logger.info(f"Tracking loop ended. Processed {frame_count} frames")
-
-# Main execution
-try:
-    # Setup drone
-    logger.info("Setting up drone connection")
-    sp = SoftwarePilot()
-
-    # Load YOLO model
-    logger.info("Loading YOLO model")
-    model = YOLO('yolov5su')
-
-    # Connect to drone (drone should be flying from TAKEOFF mission)
-    drone = sp.setup_drone("parrot_anafi", 1, "None")
-
-    drone.connect()
-    logger.info("Drone connected")
-
-    if mission_lat is not None and mission_lon is not None:
+            finally:
+                yuv_frame.unref()
+
+            self.inference_channel.put({
+                "frame": self.media.frame_counter,
+                "stamp": frame_stamp,
+                "telemetry": telemetry,
+                "image": cv2frame,
+                "window": window,
+                "crop": crop,
+                "scale": cv2frame.shape[1] / native_width,
+            })
+            self.latency.record("intake", time.monotonic() - start)
+
+        # close the stages in pipeline order so in-flight items reach the command and io stages
+        for stage in self.stages:
+            stage.channel.close()
+            stage.join(timeout=10)
+        if self.velocity is not None:
+            self.velocity.stop()
+        self.frame_writer.close()
+        self.telemetry_log.close()
+        self.mailbox.clear()
+        logger.info(f"Tracking loop ended. Detected on {frame_count} frames, predicted {predicted_count}, "
+                    f"stream stats: {self.mailbox.stats()}")
+        logger.info(f"Multi-object tracker: {self.mot.stats()}")
+        logger.info(f"Annotated frames: {self.frame_writer.stats()}")
+        logger.info(f"Telemetry log: {self.telemetry_log.stats()}")
+        logger.info(f"Stage stats: { {stage.name: stage.stats() for stage in self.stages} }")
+        logger.info(f"Stage latency: {self.latency.format()}")
+        if self.roi_model is not None:
+            logger.info(f"ROI detection: {self.roi.stats()}")
+
+    def lock_target(self, track_id):
+        """
+        Steer towards the animal with this track ID, returns False if it is not tracked
+        """
+        return self.mot.lock_target(track_id)
+
+    def infer(self, item):
+        window, scale = item["window"], item["scale"]
+        start = time.monotonic()
+        if window is None:
+            item["count"], item["results"] = navigation.detect_animals(item["image"], self.model, self.species)
+        else:
+            _, roi_results = navigation.detect_animals(item["crop"], self.roi_model, self.species)
+            boxes = roi_results[0].boxes
+            x, y = window[:2]
+            native_boxes = boxes.xyxy.numpy() + (x, y, x, y)
+            # back to downscaled full-frame coordinates, which navigation and the saved image use
+            item["results"] = [make_results(item["image"], self.roi_model.names, native_boxes * scale,
+                                            boxes.conf.numpy(), boxes.cls.numpy())]
+            item["count"] = len(native_boxes)
+        item["inference_ms"] = (time.monotonic() - start) * 1000
+
+        boxes = item["results"][0].boxes
+        self.mot.update(boxes.xyxy.numpy(), boxes.conf.numpy(), boxes.cls.numpy(), item["stamp"])
+        if item["count"]:
+            self.mission_end.target_seen()
+        # the ROI window follows the locked target while this frame still sees it
+        target = self.mot.target()
+        if target is not None and target.last_update == item["stamp"]:
+            self.roi.update(target.box[None] / scale, item["stamp"], window)
+        else:
+            self.roi.update(np.zeros((0, 4)), item["stamp"], window)
+        item["shape"] = item["image"].shape[:2]
+        self.navigation_channel.put(item)
+
+    def navigate(self, item):
+        # tracked boxes at the capture time: filtered detections on a detection frame, predictions otherwise
+        if item["frame"] is None and self.velocity is None:
+            return
+        ids, boxes, target = self.mot.predict(item["stamp"])
+        xywh = np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]], axis=1)
+        item["track_id"] = ids[target] if target is not None else None
+        if self.velocity is not None:
+            item["move"] = self.steer(item, xywh, target)
+        else:
+            item["move"] = navigation.box_navigation(xywh, item["shape"], target)
+            # move_by is a fixed step the drone takes time to fly, send one per MOVE_BY_INTERVAL;
+            # the move of the frames in between is recorded without command_sent_ms
+            if self.last_move is None or item["stamp"] - self.last_move >= MOVE_BY_INTERVAL:
+                self.last_move = item["stamp"]
+                self.command_channel.put(item)
+        if item["frame"] is not None:
+            self.io_channel.put(item)
+
+    def steer(self, item, xywh, target):
+        """
+        Hand the ground error of the subject to the velocity controller, returns it as the
+        (forward, right, 0) move in meters still needed to centre it
+        """
+        if item.get("telemetry"):
+            self.last_telemetry = item["telemetry"]
+        telemetry = self.last_telemetry or {}
+        if len(xywh) == 0:
+            self.velocity.clear()
+            return 0, 0, 0
+
+        # the locked track, or the widest box like auto_navigation
+        subject = target if target is not None else int(np.argmax(xywh[:, 2]))
+        height, width = item["shape"]
+        gimbal_pitch = telemetry.get("gimbal_pitch")
+        offset = ground_offset(
+            xywh[subject, 0], xywh[subject, 1], width, height,
+            altitude=telemetry.get("ground_distance") or TRACKING_ALTITUDE,
+            gimbal_pitch=gimbal_pitch if gimbal_pitch is not None else TRACKING_GIMBAL_PITCH,
+            hfov=telemetry.get("hfov") or DEFAULT_HFOV,
+            vfov=telemetry.get("vfov") or DEFAULT_VFOV
+        )
+        if offset is None:
+            self.velocity.clear()
+            return 0, 0, 0
+        self.velocity.update(offset, item["stamp"], key=item["frame"])
+        return round(offset[0], 2), round(offset[1], 2), 0
+
+    def command_sent(self, frame_number, seconds):
+        self.latency.record("capture_to_command", seconds)
+        self.telemetry_log.annotate(frame_number, command_sent_ms=round(seconds * 1000, 1))
+
+    def command(self, item):
+        x_direction, y_direction, z_direction = item["move"]
+        # Uncomment to enable drone movement
+        logger.debug(f"Coodinate/Direction : {x_direction, y_direction, z_direction, 0}")
+        sent = time.monotonic() - item["stamp"]
+        self.latency.record("capture_to_command", sent)
+        if item["frame"] is not None:
+            self.telemetry_log.annotate(item["frame"], command_sent_ms=round(sent * 1000, 1))
+        self.drone.piloting.move_by(x_direction, y_direction, z_direction, 0)
+
+    def write_record(self, item):
+        frame_number, telemetry = item["frame"], item["telemetry"]
+        x_direction, y_direction, z_direction = item["move"]
+
+        # annotated frame, rendered and written by the frame writer threads
+        self.frame_writer.submit(frame_number, item["results"], item["stamp"], item["count"])
+        self.mission_end.frame_recorded()
+
+        # Buffer telemetry, written in batches by the sink; command_sent_ms is added by the command stage
         try:
-            logger.info("=== CHECKING GPS STATUS ===")
-            coordinates = drone.get_drone_coordinates()
-            if not coordinates or coordinates[0] == 0.0 or coordinates[1] == 0.0:
-                raise Exception("GPS coordinates not available - drone may not have GPS lock")
+            row = {
+                "timestamp": capture_time(telemetry).strftime('%Y-%m-%d %H:%M:%S'),
+                "x": telemetry["latitude"], "y": telemetry["longitude"], "z": telemetry["altitude"],
+                "move_x": x_direction, "move_y": y_direction, "move_z": z_direction,
+                "frame": frame_number,
+                "track_id": item["track_id"],
+                "detections": item["count"],
+                "inference_ms": round(item["inference_ms"], 1),
+            }
+            for field in ("ground_distance", "roll", "pitch", "yaw", "gimbal_roll", "gimbal_pitch", "gimbal_yaw"):
+                row[field] = telemetry.get(field)
+            self.telemetry_log.write(row, key=frame_number)
+
+            logger.debug(f"Telemetry saved for frame {frame_number}")
+        except Exception as e:
+            logger.error(f"Failed to save telemetry: {e}")
+
+def run_mission(output_directory, mission_lat=None, mission_lon=None, model=None, sp=None, stop_event=None, roi_model=None,
+                limits=None):
+    """
+    Fly one tracking mission and write its records to output_directory.
+
+    The models and the SoftwarePilot instance can be passed in by a resident worker
+    (worker.py) so they are loaded once per service instead of once per mission.
+    The tracking phase ends on the first of the MissionLimits `limits` (a MissionLimits or a
+    dict, by default DURATION seconds) or when stop_event is set; the drone still returns home
+    and disconnects. stop_event is also checked between the steps before tracking and during the
+    transit to the mission target, which is then cancelled. Returns the reason tracking ended,
+    raises if the mission fails.
+    """
+    if not isinstance(limits, MissionLimits):
+        limits = MissionLimits.from_dict(limits, default_duration=DURATION)
+    logger.info(f"Output directory: {output_directory}")
+    if mission_lat is not None and mission_lon is not None:
+        logger.info(f"Mission coordinates received: lat={mission_lat}, lon={mission_lon}")
+    else:
+        logger.info("No mission coordinates provided")
+
+    drone = None
+    telemetry_log = None
+    end_reason = None
 
-            logger.info(f"Current GPS: Lat={coordinates[0]:.6f}, Lon={coordinates[1]:.6f}, Alt={coordinates[2]:.2f}m")
+    try:
+        images_dir = prepare_output(output_directory)
 
-            logger.info("=== INITIATING TAKEOFF ===")
-            drone.piloting.takeoff()
-            time.sleep(2)
-            logger.info("✓ Takeoff completed")
+        # Setup drone
+        logger.info("Setting up drone connection")
+        if sp is None:
+            sp = SoftwarePilot()
 
-            logger.info("=== STABILIZING AFTER TAKEOFF ===")
+        # Load YOLO model
+        if model is None:
+            model = load_model()
+        if roi_model is None:
+            roi_model = load_roi_model()
 
-            logger.info("=== CHANGING THE DRONE GIMBAL MOTION ===")
-            drone.camera.controls.set_orientation(0, -90, 0, wait=True)
-            time.sleep(2)
+        # Connect to drone (drone should be flying from TAKEOFF mission)
+        drone = sp.setup_drone("parrot_anafi", 1, "None")
 
-            logger.info(f"=== NAVIGATING TO TARGET ===")
-            logger.info(f"Target: Lat={mission_lat:.6f}, Lon={mission_lon:.6f}, Alt=13m")
+        drone.connect()
+        logger.info("Drone connected")
+        check_stop(stop_event)
 
+        if mission_lat is not None and mission_lon is not None:
             try:
-                drone.piloting.move_to(
-                    lat=mission_lat,
-                    lon=mission_lon,
-                    alt=5,
-                    orientation_mode="TO_TARGET",
-                    heading=0,
-                    wait=True
-                )
-                logger.info("Navigation completed successfully")
-
-            except AssertionError as e:
-                logger.info(f"Navigation with wait=True failed: {e}")
-                logger.info("Attempting navigation without waiting...")
-
-                drone.piloting.move_to(
-                    lat=mission_lat,
-                    lon=mission_lon,
-                    alt=5,
-                    orientation_mode="TO_TARGET",
-                    heading=0,
-                    wait=False
-                )
-                logger.info("Navigation command sent (not waiting for completion)")
-
-            logger.info("=== CHECKING FINAL POSITION ===")
-            final_coords = drone.get_drone_coordinates()
-            logger.info(f"Final position: Lat={final_coords[0]:.6f}, Lon={final_coords[1]:.6f}, Alt={final_coords[2]:.2f}m")
-
-            logger.info("=== MISSION COMPLETED SUCCESSFULLY ===")
+                logger.info("=== CHECKING GPS STATUS ===")
+                coordinates = drone.get_drone_coordinates()
+                if not coordinates or coordinates[0] == 0.0 or coordinates[1] == 0.0:
+                    raise Exception("GPS coordinates not available - drone may not have GPS lock")
 
-        except Exception as e:
-            logger.info(f"Mission failed: {e}")
-            raise
-    else:
-        logger.info("No mission coordinates were provided for this mission")
+                logger.info(f"Current GPS: Lat={coordinates[0]:.6f}, Lon={coordinates[1]:.6f}, Alt={coordinates[2]:.2f}m")
 
+                logger.info("=== INITIATING TAKEOFF ===")
+                drone.piloting.takeoff()
+                time.sleep(2)
+                logger.info("✓ Takeoff completed")
+                check_stop(stop_event)
 
-    logger.info("=== CHANGING THE DRONE GIMBAL MOTION ===")
-    drone.camera.controls.set_orientation(0, -65, 0, wait=True)
-    time.sleep(2)
-    
-    # Create tracker
-    tracker = Tracker(drone, model)
+                logger.info("=== STABILIZING AFTER TAKEOFF ===")
 
-    time.sleep(2)
+                logger.info("=== CHANGING THE DRONE GIMBAL MOTION ===")
+                drone.camera.controls.set_orientation(0, -90, 0, wait=True)
+                time.sleep(2)
+                check_stop(stop_event)
 
-    # Start stream with tracking
-    logger.info("Starting video stream")
-    drone.camera.media.setup_stream(yuv_frame_processing=tracker.track)
-    drone.camera.media.start_stream()
+                logger.info(f"=== NAVIGATING TO TARGET ===")
+                logger.info(f"Target: Lat={mission_lat:.6f}, Lon={mission_lon:.6f}, Alt=13m")
 
-    # Setup OpenCV window (only if not in Docker or if display is available)
-    if not IN_DOCKER or os.environ.get('DISPLAY'):
-        try:
-            cv2.namedWindow('tracking', cv2.WINDOW_KEEPRATIO)
-            cv2.resizeWindow('tracking', 500, 500)
-            cv2.moveWindow('tracking', 0, 0)
-            logger.info("OpenCV window created")
-        except Exception as e:
-            logger.warning(f"Could not create OpenCV window (running headless): {e}")
-
-    # Run for specified duration
-    logger.info(f"Running mission for {DURATION} seconds")
-    time.sleep(DURATION)
-
-    # Stop stream
-    logger.info("Stopping stream")
-    drone.camera.media.stop_stream()
-    
-except Exception as e:
-    logger.error(f"Mission failed with error: {e}", exc_info=True)
-    # logger.info mission coordinates before disconnection
-    if mission_lat is not None and mission_lon is not None:
-        try:
-            logger.info("=== SETTING UP RETURN TO HOME ===")
-            drone.rth.setup_rth()
+                if fly_to_target(drone, mission_lat, mission_lon, 5, stop_event=stop_event):
+                    logger.info("Navigation completed successfully")
+                else:
+                    logger.info(f"Target not reached after {ARRIVAL_TIMEOUT:.0f} s, tracking from the current position")
 
-            logger.info("=== RETURNING BACK HOME ===")
-            drone.rth.return_to_home()
+                logger.info("=== CHECKING FINAL POSITION ===")
+                final_coords = drone.get_drone_coordinates()
+                logger.info(f"Final position: Lat={final_coords[0]:.6f}, Lon={final_coords[1]:.6f}, Alt={final_coords[2]:.2f}m")
 
-        except Exception as e:
-            print(f"RTB mission failed: {e}")
-            raise
+                logger.info("=== MISSION COMPLETED SUCCESSFULLY ===")
 
+            except MissionStopped:
+                raise
+            except Exception as e:
+                logger.info(f"Mission failed: {e}")
+                raise
+        else:
+            logger.info("No mission coordinates were provided for this mission")
+
+
+        logger.info("=== CHANGING THE DRONE GIMBAL MOTION ===")
+        drone.camera.controls.set_orientation(0, TRACKING_GIMBAL_PITCH, 0, wait=True)
+        time.sleep(2)
+        check_stop(stop_event)
+
+        # Create tracker
+        species = load_species_filter()
+        logger.info(f"Tracking species {species.species} with confidence >= {species.min_confidence}")
+        telemetry_log = load_telemetry_sink(output_directory)
+        mission_end = MissionEnd(limits, stop_event=stop_event, battery=lambda: battery_percent(drone))
+        tracker = Tracker(drone, model, telemetry_log, load_frame_writer(images_dir), roi_model=roi_model, species=species,
+                          mission_end=mission_end)
+
+        time.sleep(2)
+
+        # Start stream with tracking
+        logger.info("Starting video stream")
+        drone.camera.media.setup_stream(
+            yuv_frame_processing=tracker.track,
+            yuv_frame_cb=tracker.mailbox.offer,
+            flush_cb=tracker.mailbox.flush_cb
+        )
+        drone.camera.media.start_stream()
+
+        # Setup OpenCV window (only if not in Docker or if display is available)
+        if not IN_DOCKER or os.environ.get('DISPLAY'):
+            try:
+                cv2.namedWindow('tracking', cv2.WINDOW_KEEPRATIO)
+                cv2.resizeWindow('tracking', 500, 500)
+                cv2.moveWindow('tracking', 0, 0)
+                logger.info("OpenCV window created")
+            except Exception as e:
+                logger.warning(f"Could not create OpenCV window (running headless): {e}")
 
-    # Disconnect
-    logger.info("Disconnecting drone")
-    drone.disconnect()
-    logger.info("Mission Completed")
+        # Track until the first end condition
+        end_reason = mission_end.wait()
+        logger.info(f"Ending tracking: {end_reason}")
 
-    cv2.destroyAllWindows()
-    sys.exit(1)
-finally:
-    cv2.destroyAllWindows()
-    # logger.info mission coordinates before disconnection
-    if mission_lat is not None and mission_lon is not None:
-        try:
-            logger.info("=== SETTING UP RETURN TO HOME ===")
-            drone.rth.setup_rth()
+        # Stop stream
+        logger.info("Stopping stream")
+        drone.camera.media.stop_stream()
 
-            logger.info("=== RETURNING BACK HOME ===")
-            drone.rth.return_to_home()
+    except MissionStopped as e:
+        end_reason = str(e)
+        logger.info(f"Mission stopped before tracking: {e}")
+    except Exception as e:
+        logger.error(f"Mission failed with error: {e}", exc_info=True)
+        raise
+    finally:
+        cv2.destroyAllWindows()
+        if telemetry_log is not None:
+            telemetry_log.close()
+        if drone is not None:
+            # logger.info mission coordinates before disconnection
+            if mission_lat is not None and mission_lon is not None:
+                try:
+                    logger.info("=== SETTING UP RETURN TO HOME ===")
+                    drone.rth.setup_rth()
+
+                    logger.info("=== RETURNING BACK HOME ===")
+                    drone.rth.return_to_home()
+
+                except Exception as e:
+                    print(f"RTB mission failed: {e}")
+                    raise
+
+
+            # Disconnect
+            logger.info("Disconnecting drone")
+            drone.disconnect()
+        logger.info("Mission Completed")
+    return end_reason
+
+
+def main():
+    # Retrieve the filename from command-line arguments
+    if len(sys.argv) < 2:
+        logger.error("Usage: python controller.py <output_directory> [lat] [lon]")
+        sys.exit(1)
+
+    output_directory = sys.argv[1]
+
+    # Optional lat/lon coordinates
+    mission_lat = None
+    mission_lon = None
+    if len(sys.argv) >= 4:
+        try:
+            mission_lat = float(sys.argv[2])
+            mission_lon = float(sys.argv[3])
+        except (ValueError, IndexError) as e:
+            logger.warning(f"Invalid lat/lon coordinates provided: {e}")
+            mission_lat = mission_lon = None
+
+    # Optional end conditions, MISSION_MAX_DURATION etc. set by the service for launch.sh
+    limits = {name: os.environ.get(f"MISSION_{name.upper()}") for name in LIMIT_TYPES}
+    try:
+        limits = MissionLimits.from_dict(limits, default_duration=DURATION)
+    except ValueError as e:
+        logger.warning(f"Invalid mission limits provided: {e}")
+        limits = MissionLimits(max_duration=DURATION)
 
-        except Exception as e:
-            print(f"RTB mission failed: {e}")
-            raise
+    try:
+        run_mission(output_directory, mission_lat, mission_lon, limits=limits)
+    except Exception:
+        sys.exit(1)
 
 
-    # Disconnect
-    logger.info("Disconnecting drone")
-    drone.disconnect()
-    logger.info("Mission Completed")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Mission end conditions for the tracking phase.
+# The tracking phase used to last a fixed DURATION whatever the camera saw. The limits now come
+# with the mission (/start_mission) and the phase ends on whichever happens first: the maximum
+# duration, no animal in view for target_lost_timeout seconds, max_frames detection frames
+# recorded, the battery at or below battery_floor percent, or a stop request. The tracker reports
+# frames and sightings as they happen, so the mission ends as soon as a condition is met.
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# limit name -> type, also the /start_mission query parameters and the MISSION_<NAME> variables
+LIMIT_TYPES = {
+    "max_duration": float,
+    "target_lost_timeout": float,
+    "max_frames": int,
+    "battery_floor": int,
+}
+
+
+class MissionLimits:
+    """
+    End conditions of one mission, None disables a condition
+
+    max_duration         seconds of tracking
+    target_lost_timeout  seconds without any animal detected, counted from the start of tracking
+    max_frames           detection frames recorded
+    battery_floor        battery percentage at or below which the mission ends
+    """
+
+    def __init__(self, max_duration=None, target_lost_timeout=None, max_frames=None, battery_floor=None):
+        self.max_duration = max_duration
+        self.target_lost_timeout = target_lost_timeout
+        self.max_frames = max_frames
+        self.battery_floor = battery_floor
+
+    @classmethod
+    def from_dict(cls, values, default_duration=None):
+        """
+        Limits from a dict of (possibly string) values, e.g. the worker message or the environment.
+        Raises ValueError on an unknown name or a value that is not a positive number.
+        """
+        limits = {}
+        for name, value in (values or {}).items():
+            if name not in LIMIT_TYPES:
+                raise ValueError(f"Unknown mission limit: {name}")
+            if value is None or value == "":
+                continue
+            value = LIMIT_TYPES[name](value)
+            if value < 0 or (value == 0 and name != "battery_floor"):
+                raise ValueError(f"Mission limit {name} must be positive, got {value}")
+            limits[name] = value
+        limits.setdefault("max_duration", default_duration)
+        return cls(**limits)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in LIMIT_TYPES}
+
+
+class MissionEnd:
+    """
+    Waits for the first end condition of the tracking phase.
+
+    The tracker calls frame_recorded() and target_seen(); wait() returns the reason the phase
+    ended. Conditions reported by the tracker end the wait at once, the stop request and the
+    battery are polled every `poll_interval` seconds.
+    """
+
+    def __init__(self, limits, stop_event=None, battery=None, poll_interval=0.1, battery_interval=2.0):
+        """
+        limits            MissionLimits
+        stop_event        threading.Event set to stop the mission early
+        battery           callable returning the battery percentage, or None when unknown
+        """
+        self.limits = limits
+        self.stop_event = stop_event
+        self.battery = battery
+        self.poll_interval = poll_interval
+        self.battery_interval = battery_interval
+        self.lock = threading.Lock()
+        self.ended = threading.Event()
+        self.reason = None
+        self.started = None
+        self.last_seen = None
+        self.frames = 0
+        self.battery_warned = False
+
+    def end(self, reason):
+        with self.lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+        logger.info(f"Mission end condition: {reason}")
+        self.ended.set()
+
+    def frame_recorded(self):
+        with self.lock:
+            self.frames += 1
+            frames = self.frames
+        if self.limits.max_frames and frames >= self.limits.max_frames:
+            self.end(f"{frames} frames recorded")
+
+    def target_seen(self):
+        with self.lock:
+            self.last_seen = time.monotonic()
+
+    def check(self, now):
+        """
+        The reason to end at `now` from the polled conditions, None to go on
+        """
+        limits = self.limits
+        if self.stop_event is not None and self.stop_event.is_set():
+            return "stop requested"
+        if limits.max_duration and now - self.started >= limits.max_duration:
+            return f"maximum duration of {limits.max_duration} s reached"
+        with self.lock:
+            last_seen = self.last_seen if self.last_seen is not None else self.started
+        if limits.target_lost_timeout and now - last_seen >= limits.target_lost_timeout:
+            return f"no animal in view for {limits.target_lost_timeout} s"
+        return None
+
+    def check_battery(self):
+        try:
+            percent = self.battery()
+        except Exception as e:
+            if not self.battery_warned:
+                logger.warning(f"Could not read the battery level: {e}")
+                self.battery_warned = True
+            return None
+        if percent is not None and percent <= self.limits.battery_floor:
+            return f"battery at {percent}%, floor {self.limits.battery_floor}%"
+        return None
+
+    def wait(self):
+        """
+        Block until an end condition is met, returns the reason
+        """
+        self.started = time.monotonic()
+        logger.info(f"Tracking until: {self.limits.to_dict()}")
+        next_battery = self.started
+        while not self.ended.wait(self.poll_interval):
+            now = time.monotonic()
+            reason = self.check(now)
+            if reason is None and self.battery is not None and self.limits.battery_floor is not None and now >= next_battery:
+                next_battery = now + self.battery_interval
+                reason = self.check_battery()
+            if reason is not None:
+                self.end(reason)
+        return self.reason
+
+    def stats(self):
+        with self.lock:
+            return {"reason": self.reason, "frames": self.frames,
+                    "tracked_s": round(time.monotonic() - self.started, 1) if self.started else None}
@@ -0,0 +1,201 @@
+# Closed-loop target following with velocity setpoints.
+# Instead of fixed move_by steps, the pixel position of the target is projected onto the ground
+# (altitude, gimbal pitch and camera field of view), a PID per horizontal axis turns that ground
+# error into a velocity, and a control thread sends it as piloting (PCMD) setpoints at a fixed
+# rate, with a deadband around the target, a speed limit and an acceleration (slew) limit.
+#
+# Setpoints go through olympe's piloting interface: start_piloting() once, then
+# piloting(roll, pitch, yaw, gaz, piloting_time) with values in percent of the maximum tilt,
+# which olympe keeps sending to the drone until they change or piloting_time expires.
+
+import math
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Anafi video field of view (degrees), used when the frame metadata does not carry it
+DEFAULT_HFOV = 69.0
+DEFAULT_VFOV = 43.0
+
+
+def ground_offset(target_x, target_y, image_width, image_height, altitude, gimbal_pitch, hfov=DEFAULT_HFOV, vfov=DEFAULT_VFOV):
+    """
+    Ground-plane position (forward, right) in meters of the pixel (target_x, target_y) relative to
+    the ground point under the image centre, for a camera `altitude` meters above flat ground,
+    pitched `gimbal_pitch` degrees (negative looking down), with the given fields of view.
+    Returns None when the pixel ray does not hit the ground (at or above the horizon).
+    """
+    depression = math.radians(-gimbal_pitch)
+    if altitude is None or altitude <= 0 or depression <= 0:
+        return None
+    tan_x = (target_x - image_width / 2) / (image_width / 2) * math.tan(math.radians(hfov) / 2)
+    tan_y = (target_y - image_height / 2) / (image_height / 2) * math.tan(math.radians(vfov) / 2)
+
+    # ray through the pixel in the level (forward, right, down) frame
+    forward = math.cos(depression) - tan_y * math.sin(depression)
+    down = math.sin(depression) + tan_y * math.cos(depression)
+    if down <= 1e-3:
+        return None
+    scale = altitude / down
+    center_forward = altitude * math.cos(depression) / math.sin(depression)
+    return scale * forward - center_forward, scale * tan_x
+
+
+class PID:
+    """
+    PID on one axis, output clamped to +/- limit. The integral is clamped so that it alone never
+    exceeds the limit, and the derivative is taken on the error between two measurements.
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, limit=1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.previous = None
+
+    def update(self, error, dt):
+        derivative = 0.0
+        if self.previous is not None and dt > 0:
+            derivative = (error - self.previous) / dt
+            if self.ki:
+                self.integral = max(-self.limit / self.ki, min(self.limit / self.ki, self.integral + error * dt))
+        self.previous = error
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        return max(-self.limit, min(self.limit, output))
+
+
+class VelocityController:
+    """
+    Follows the target with horizontal velocity setpoints.
+
+    update() takes the ground error (forward, right) of the target, measured on the frame captured
+    at `stamp`, and runs the PIDs; clear() means no target. A thread sends the resulting velocity
+    as piloting setpoints every 1 / rate seconds, slewed towards the PID output at most
+    max_acceleration. Without a new measurement for target_timeout seconds it slows to a hover.
+    """
+
+    def __init__(self, drone, rate=10.0, kp=0.4, ki=0.02, kd=0.05, max_speed=3.0, max_acceleration=2.0,
+                 deadband=0.5, full_scale_speed=15.0, target_timeout=1.0, on_sent=None):
+        """
+        drone             olympe.Drone
+        rate              setpoints sent per second
+        kp, ki, kd        PID gains, m/s of velocity per meter of ground error
+        max_speed         horizontal speed limit per axis, m/s
+        max_acceleration  largest setpoint change per second, m/s^2
+        deadband          ground errors smaller than this (m) are treated as zero, larger ones reduced by it
+        full_scale_speed  speed (m/s) reached at 100% tilt, converts velocity to piloting percent
+        target_timeout    seconds without a measurement before the drone is slowed to a hover
+        on_sent           called with (key, seconds from capture) when the setpoint computed from
+                          the measurement passed with that key is first sent
+        """
+        self.drone = drone
+        self.period = 1.0 / rate
+        self.max_acceleration = max_acceleration
+        self.deadband = deadband
+        self.full_scale_speed = full_scale_speed
+        self.target_timeout = target_timeout
+        self.on_sent = on_sent
+        self.pids = [PID(kp, ki, kd, max_speed), PID(kp, ki, kd, max_speed)]
+
+        self.lock = threading.Lock()
+        self.desired = [0.0, 0.0]
+        self.command = [0.0, 0.0]
+        self.measured_at = None
+        self.pending = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.sent = 0
+
+    def start(self):
+        self.drone.start_piloting()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="Tracker-velocity", daemon=True)
+        self.thread.start()
+        logger.info(f"Velocity control started at {1 / self.period:.0f} Hz")
+
+    def update(self, error, stamp, key=None):
+        """
+        error  (forward, right) ground error of the target in meters
+        """
+        with self.lock:
+            dt = stamp - self.measured_at if self.measured_at is not None else 0.0
+            if dt < 0:
+                # a newer (predicted) measurement already includes this one, only report the send
+                if key is not None:
+                    self.pending.append((key, stamp))
+                return
+            for axis, pid in enumerate(self.pids):
+                # shrink by the deadband instead of cutting it, so the error stays continuous
+                value = math.copysign(max(abs(error[axis]) - self.deadband, 0.0), error[axis])
+                self.desired[axis] = pid.update(value, dt)
+            self.measured_at = stamp
+            if key is not None:
+                self.pending.append((key, stamp))
+
+    def clear(self):
+        with self.lock:
+            self.desired = [0.0, 0.0]
+            self.measured_at = None
+            self.pending = []
+            for pid in self.pids:
+                pid.reset()
+
+    def run(self):
+        last = time.monotonic()
+        while not self.stop_event.wait(max(self.period - (time.monotonic() - last), 0)):
+            now = time.monotonic()
+            dt, last = now - last, now
+            with self.lock:
+                if self.measured_at is not None and now - self.measured_at > self.target_timeout:
+                    logger.info("Target measurement timed out, hovering")
+                    self.desired = [0.0, 0.0]
+                    self.measured_at = None
+                    for pid in self.pids:
+                        pid.reset()
+                step = self.max_acceleration * dt
+                for axis in range(2):
+                    change = self.desired[axis] - self.command[axis]
+                    self.command[axis] += max(-step, min(step, change))
+                forward, right = self.command
+                pending, self.pending = self.pending, []
+            try:
+                self.send(forward, right)
+            except Exception as e:
+                logger.error(f"Failed to send piloting setpoint: {e}")
+                continue
+            if self.on_sent is not None:
+                for key, stamp in pending:
+                    self.on_sent(key, time.monotonic() - stamp)
+
+    def send(self, forward, right):
+        # ARSDK piloting: roll > 0 moves right, pitch > 0 moves forward; the setpoint expires
+        # after a few periods if this loop stops sending
+        roll = int(round(max(-100.0, min(100.0, right / self.full_scale_speed * 100))))
+        pitch = int(round(max(-100.0, min(100.0, forward / self.full_scale_speed * 100))))
+        self.drone.piloting(roll, pitch, 0, 0, 3 * self.period)
+        self.sent += 1
+
+    def stop(self):
+        """
+        Stop the control thread, zero the setpoints and hand piloting back
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        try:
+            self.drone.piloting(0, 0, 0, 0, 0)
+            self.drone.stop_piloting()
+        except Exception as e:
+            logger.error(f"Failed to stop piloting: {e}")
+        logger.info(f"Velocity control stopped after {self.sent} setpoints")
+
+    def stats(self):
+        with self.lock:
+            return {"sent": self.sent, "command": [round(value, 2) for value in self.command]}
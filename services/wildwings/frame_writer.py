@@ -0,0 +1,142 @@
+# Asynchronous writer for the annotated mission images.
+# Rendering the detections and encoding a full-size JPEG used to happen inline for every record.
+# Frames are now handed to a small pool of writer threads through a bounded Channel: a policy
+# decides which frames are kept, images can be downscaled and encoded as JPEG or WebP at a given
+# quality, and when the disk cannot keep up the oldest pending frames are dropped, so nothing
+# upstream (inference, navigation, flight commands) ever waits for the disk.
+
+import os
+import time
+import logging
+import threading
+
+import cv2
+
+from pipeline import Channel
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("all", "detections", "interval", "none")
+FORMATS = {"jpg": cv2.IMWRITE_JPEG_QUALITY, "webp": cv2.IMWRITE_WEBP_QUALITY}
+
+
+class FrameWriter:
+    """
+    Bounded pool of threads saving annotated frames as <directory>/<name>.<format>.
+
+    submit() returns immediately. Policies:
+        all         every submitted frame
+        detections  only frames with at least one detection
+        interval    at most one frame every `interval` seconds of capture time
+        none        nothing
+    """
+
+    def __init__(self, directory, policy="all", interval=1.0, width=None, image_format="jpg", quality=95, workers=2, backlog=8):
+        """
+        directory     where the images are written
+        policy        which frames are kept, see above
+        interval      seconds between two kept frames for the "interval" policy
+        width         images wider than this are downscaled to it, None keeps the frame size
+        image_format  "jpg" or "webp"
+        quality       encoder quality, 0-100
+        workers       writer threads
+        backlog       frames waiting for a writer before the oldest are dropped
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown frame policy: {policy}")
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        self.directory = directory
+        self.policy = policy
+        self.interval = interval
+        self.width = width
+        self.image_format = image_format
+        self.params = [FORMATS[image_format], int(quality)]
+        self.channel = Channel("frames", capacity=backlog)
+        self.threads = [threading.Thread(target=self.run, name=f"FrameWriter-{i}", daemon=True) for i in range(workers)]
+        self.lock = threading.Lock()
+        self.last_kept = None
+        self.written = 0
+        self.skipped = 0
+        self.errors = 0
+        self.write_time = 0.0
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def wants(self, stamp, count):
+        if self.policy == "all":
+            return True
+        if self.policy == "detections":
+            return count > 0
+        if self.policy == "interval":
+            with self.lock:
+                if self.last_kept is not None and stamp - self.last_kept < self.interval:
+                    return False
+                self.last_kept = stamp
+                return True
+        return False
+
+    def submit(self, name, results, stamp, count=None):
+        """
+        Queue the annotated frame of `results` (ultralytics Results list) under `name`,
+        returns False when the policy skips it
+        """
+        if count is None:
+            count = len(results[0].boxes)
+        if not self.wants(stamp, count):
+            with self.lock:
+                self.skipped += 1
+            return False
+        self.channel.put((name, results))
+        return True
+
+    def run(self):
+        while True:
+            item = self.channel.get(timeout=0.5)
+            if item is None:
+                if self.channel.closed:
+                    return
+                continue
+            start = time.monotonic()
+            try:
+                self.write(*item)
+                with self.lock:
+                    self.written += 1
+                    self.write_time += time.monotonic() - start
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                logger.error(f"Failed to save frame {item[0]}: {e}")
+
+    def write(self, name, results):
+        # detections drawn on a copy of the frame, like Results.save()
+        image = results[0].plot()
+        if self.width and image.shape[1] > self.width:
+            height = int(round(image.shape[0] * self.width / image.shape[1]))
+            image = cv2.resize(image, (self.width, height), interpolation=cv2.INTER_AREA)
+        path = os.path.join(self.directory, f"{name}.{self.image_format}")
+        if not cv2.imwrite(path, image, self.params):
+            raise OSError(f"could not write {path}")
+
+    def close(self, timeout=10.0):
+        """
+        Write the frames still queued, waiting at most `timeout` seconds in total
+        """
+        self.channel.close()
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join(max(deadline - time.monotonic(), 0))
+
+    def stats(self):
+        channel = self.channel.stats()
+        with self.lock:
+            return {
+                "written": self.written,
+                "skipped": self.skipped,
+                "dropped": channel["dropped"],
+                "errors": self.errors,
+                "mean_write_ms": round(1000 * self.write_time / self.written, 1) if self.written else None,
+            }
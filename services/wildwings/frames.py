@@ -0,0 +1,197 @@
+# Frame delivery helpers for the tracking stream.
+# The olympe stream callback offers every decoded frame to a single-slot mailbox; the tracker
+# asks for the newest frame at a fixed rate instead of pulling every frame through a queue.
+# FrameConverter turns the YUV frame into a small BGR image for the model without per-frame allocations,
+# or cuts a native-resolution BGR region out of it for region-of-interest detection.
+
+import time
+import threading
+
+import cv2
+import numpy as np
+import olympe
+
+
+class FrameMailbox:
+    """
+    Keeps only the newest frame that is due for processing.
+
+    Frames arriving before the next sample is due are never ref'd, so olympe
+    releases them as soon as the callback returns. A due frame replaces (and
+    unrefs) any frame still waiting in the slot.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.cond = threading.Condition(threading.Lock())
+        self.frame = None
+        self.stamp = 0.0
+        self.next_due = 0.0
+        self.received = 0
+        self.skipped = 0
+        self.replaced = 0
+        self.delivered = 0
+
+    def offer(self, frame):
+        """
+        Stream callback: called by olympe for each decoded frame, without a reference
+        """
+        now = time.monotonic()
+        with self.cond:
+            self.received += 1
+            if now < self.next_due:
+                self.skipped += 1
+                return
+            frame.ref()
+            previous = self.frame
+            self.frame = frame
+            self.stamp = now
+            if previous is not None:
+                self.replaced += 1
+            self.cond.notify_all()
+        if previous is not None:
+            previous.unref()
+
+    def get(self, newer_than=0.0, timeout=None):
+        """
+        Waits for a frame that arrived after `newer_than` (a time.monotonic() stamp).
+        Returns (frame, stamp), or (None, newer_than) on timeout. The caller must unref the frame.
+        """
+        with self.cond:
+            ready = self.cond.wait_for(lambda: self.frame is not None and self.stamp > newer_than, timeout)
+            if not ready:
+                return None, newer_than
+            frame, stamp = self.frame, self.stamp
+            self.frame = None
+            self.next_due = stamp + self.interval
+            self.delivered += 1
+        return frame, stamp
+
+    def clear(self):
+        with self.cond:
+            frame = self.frame
+            self.frame = None
+        if frame is not None:
+            frame.unref()
+
+    def flush_cb(self, stream):
+        self.clear()
+        return True
+
+    def stats(self):
+        with self.cond:
+            return {
+                "received": self.received,
+                "skipped": self.skipped,
+                "replaced": self.replaced,
+                "delivered": self.delivered,
+            }
+
+
+class FrameConverter:
+    """
+    Converts YUV stream frames into reused output buffers.
+
+    With a target width the Y and UV planes are downscaled before the colour
+    conversion, so only the small frame is ever converted to BGR. The returned
+    array is overwritten by the next call; copy it if it must be kept.
+    output is "bgr", "gray" (the Y plane) or "yuv" (the downscaled input layout).
+    """
+
+    def __init__(self, width=None, output="bgr", interpolation=cv2.INTER_AREA):
+        if output not in ("bgr", "gray", "yuv"):
+            raise ValueError(f"Unsupported output: {output}")
+        self.width = width
+        self.output = output
+        self.interpolation = interpolation
+        self.buffers = {}
+
+    def convert(self, frame):
+        return self.convert_array(frame.as_ndarray(), frame.format())
+
+    def output_size(self, width, height):
+        if self.width is None or self.width >= width:
+            return width, height
+        out_width = self.width - self.width % 2
+        out_height = int(round(height * out_width / width / 2)) * 2
+        return out_width, out_height
+
+    def convert_array(self, yuv, vdef_format):
+        height, width = yuv.shape[0] * 2 // 3, yuv.shape[1]
+        out_width, out_height = self.output_size(width, height)
+        buffers = self.get_buffers(width, height, vdef_format)
+
+        if (out_width, out_height) != (width, height):
+            small = buffers["yuv"]
+            self.resize_planes(yuv, small, width, height, out_width, out_height, vdef_format)
+            yuv = small
+
+        if self.output == "gray":
+            return yuv[:out_height]
+        if self.output == "yuv":
+            return yuv
+
+        cv2_cvt_color_flag = {
+            olympe.VDEF_I420: cv2.COLOR_YUV2BGR_I420,
+            olympe.VDEF_NV12: cv2.COLOR_YUV2BGR_NV12,
+        }[vdef_format]
+        return cv2.cvtColor(yuv, cv2_cvt_color_flag, dst=buffers["bgr"])
+
+    def resize_planes(self, src, dst, width, height, out_width, out_height, vdef_format):
+        cv2.resize(src[:height], (out_width, out_height), dst=dst[:out_height], interpolation=self.interpolation)
+        if vdef_format == olympe.VDEF_NV12:
+            # interleaved UV plane, resized as one 2-channel image
+            src_uv = src[height:].reshape(height // 2, width // 2, 2)
+            dst_uv = dst[out_height:].reshape(out_height // 2, out_width // 2, 2)
+            cv2.resize(src_uv, (out_width // 2, out_height // 2), dst=dst_uv, interpolation=self.interpolation)
+        else:
+            # planar U then V, each (height / 2, width / 2), addressed through flat views
+            src_flat, dst_flat = src.reshape(-1), dst.reshape(-1)
+            src_plane_size = (height // 2) * (width // 2)
+            dst_plane_size = (out_height // 2) * (out_width // 2)
+            for plane in range(2):
+                src_start = height * width + plane * src_plane_size
+                dst_start = out_height * out_width + plane * dst_plane_size
+                src_plane = src_flat[src_start:src_start + src_plane_size].reshape(height // 2, width // 2)
+                dst_plane = dst_flat[dst_start:dst_start + dst_plane_size].reshape(out_height // 2, out_width // 2)
+                cv2.resize(src_plane, (out_width // 2, out_height // 2), dst=dst_plane, interpolation=self.interpolation)
+
+    def convert_crop(self, frame, x, y, width, height):
+        """
+        BGR copy of the (x, y, width, height) region of the frame at native resolution.
+        The region is aligned to even coordinates and sizes, as the chroma planes require.
+        """
+        return self.crop_array(frame.as_ndarray(), frame.format(), x, y, width, height)
+
+    def crop_array(self, yuv, vdef_format, x, y, width, height):
+        frame_height, frame_width = yuv.shape[0] * 2 // 3, yuv.shape[1]
+        x, y, width, height = x & ~1, y & ~1, width & ~1, height & ~1
+        crop = np.empty((height * 3 // 2, width), dtype=np.uint8)
+        crop[:height] = yuv[y:y + height, x:x + width]
+        if vdef_format == olympe.VDEF_NV12:
+            # interleaved UV rows, the crop keeps the same layout
+            crop[height:] = yuv[frame_height + y // 2:frame_height + (y + height) // 2, x:x + width]
+            return cv2.cvtColor(crop, cv2.COLOR_YUV2BGR_NV12)
+
+        src_flat, dst_flat = yuv.reshape(-1), crop.reshape(-1)
+        src_plane_size = (frame_height // 2) * (frame_width // 2)
+        dst_plane_size = (height // 2) * (width // 2)
+        for plane in range(2):
+            src_start = frame_height * frame_width + plane * src_plane_size
+            dst_start = height * width + plane * dst_plane_size
+            src_plane = src_flat[src_start:src_start + src_plane_size].reshape(frame_height // 2, frame_width // 2)
+            dst_plane = dst_flat[dst_start:dst_start + dst_plane_size].reshape(height // 2, width // 2)
+            dst_plane[:] = src_plane[y // 2:(y + height) // 2, x // 2:(x + width) // 2]
+        return cv2.cvtColor(crop, cv2.COLOR_YUV2BGR_I420)
+
+    def get_buffers(self, width, height, vdef_format):
+        key = (width, height, vdef_format)
+        buffers = self.buffers.get(key)
+        if buffers is None:
+            out_width, out_height = self.output_size(width, height)
+            buffers = {
+                "yuv": np.empty((out_height * 3 // 2, out_width), dtype=np.uint8),
+                "bgr": np.empty((out_height, out_width, 3), dtype=np.uint8),
+            }
+            self.buffers[key] = buffers
+        return buffers
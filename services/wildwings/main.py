@@ -10,6 +10,7 @@ from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
+from worker import MissionWorker
 
 # Load configuration
 config_path = Path("/app/config.toml")
@@ -37,6 +38,24 @@ current_process = None
 is_running = False
 mission_lat = None
 mission_lon = None
+mission_limits = {}
+
+# Resident worker with the model loaded, missions fall back to launch.sh while it is not ready
+mission_worker = None
+if wildwings_config.get("worker", True):
+    mission_worker = MissionWorker(port=wildwings_config.get("worker_port", 2200))
+
+def run_mission_on_worker():
+    """Run the mission on the resident worker, returns True on success"""
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    output_dir = os.path.join("mission", f"mission_record_{timestamp}")
+    os.makedirs("logs", exist_ok=True)
+    logger.info(f"Starting WildWings mission with timestamp {timestamp} on resident worker")
+    if mission_lat is not None and mission_lon is not None:
+        logger.info(f"Running mission with coordinates: lat={mission_lat}, lon={mission_lon}")
+    if mission_limits:
+        logger.info(f"Mission end conditions: {mission_limits}")
+    return mission_worker.run_mission(output_dir, mission_lat, mission_lon, stop_mission_flag, mission_limits)
 
 def run_mission_background():
     """Execute mission in background thread"""
@@ -62,6 +81,13 @@ def run_mission_background():
         mission_dir = Path("/app/mission")
         mission_dir.mkdir(exist_ok=True)
 
+        if mission_worker is not None and mission_worker.ready:
+            mission_success = run_mission_on_worker()
+            return
+        if mission_worker is not None:
+            logger.info("Mission worker not ready, launching mission with launch.sh")
+            mission_worker.start()
+
         # Execute launch.sh script
         script_path = Path("/app/launch.sh")
         if not script_path.exists():
@@ -80,6 +106,10 @@ def run_mission_background():
         if mission_lon is not None:
             env['MISSION_LON'] = str(mission_lon)
             logger.info(f"Setting MISSION_LON={mission_lon}")
+        # End conditions, read by controller.py
+        for name, value in mission_limits.items():
+            env[f'MISSION_{name.upper()}'] = str(value)
+            logger.info(f"Setting MISSION_{name.upper()}={value}")
 
         with mission_lock:
             current_process = subprocess.Popen(
@@ -157,6 +187,11 @@ def run_mission_background():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("WildWings service starting up")
+    if mission_worker is not None:
+        try:
+            mission_worker.start()
+        except Exception as e:
+            logger.error(f"Failed to start mission worker: {e}")
     yield
     logger.info("WildWings service shutting down")
 
@@ -185,6 +220,9 @@ async def lifespan(app: FastAPI):
     if mission_thread:
         mission_thread.join(timeout=10.0)
 
+    if mission_worker is not None:
+        mission_worker.shutdown()
+
     is_running = False
 
 app = FastAPI(
@@ -210,11 +248,23 @@ async def root():
 @app.post("/start_mission")
 async def start_mission(
     lat: float = Query(None, description="Optional latitude coordinate"),
-    lon: float = Query(None, description="Optional longitude coordinate")
+    lon: float = Query(None, description="Optional longitude coordinate"),
+    max_duration: float = Query(None, gt=0, description="Maximum tracking time in seconds (default 25)"),
+    target_lost_timeout: float = Query(None, gt=0, description="End tracking after this many seconds without any animal in view"),
+    max_frames: int = Query(None, gt=0, description="End tracking once this many detection frames are recorded"),
+    battery_floor: int = Query(None, ge=0, le=100, description="End tracking when the battery is at or below this percentage")
 ):
-    logger.info(f"Start mission endpoint accessed with lat={lat}, lon={lon}")
+    limits = {
+        name: value for name, value in (
+            ("max_duration", max_duration),
+            ("target_lost_timeout", target_lost_timeout),
+            ("max_frames", max_frames),
+            ("battery_floor", battery_floor),
+        ) if value is not None
+    }
+    logger.info(f"Start mission endpoint accessed with lat={lat}, lon={lon}, limits={limits}")
 
-    global mission_thread, stop_mission_flag, is_running, mission_lat, mission_lon
+    global mission_thread, stop_mission_flag, is_running, mission_lat, mission_lon, mission_limits
 
     with mission_lock:
         if mission_thread and mission_thread.is_alive():
@@ -228,6 +278,7 @@ async def start_mission(
         # Store lat/lon for the mission
         mission_lat = lat
         mission_lon = lon
+        mission_limits = limits
 
     try:
         stop_mission_flag.clear()
@@ -247,6 +298,8 @@ async def start_mission(
             response["lat"] = lat
         if lon is not None:
             response["lon"] = lon
+        if limits:
+            response["limits"] = limits
         return response
 
     except Exception as e:
@@ -296,6 +349,15 @@ async def stop_mission():
             logger.info("Waiting for mission thread to finish")
             mission_thread.join(timeout=10)
 
+        # a worker mission still flies home after the stop, run_mission_background clears is_running
+        if mission_thread and mission_thread.is_alive():
+            logger.info("Stop requested, mission is still ending")
+            return {
+                "status": "stopping",
+                "message": "Stop requested, the mission is still ending (see /mission_status)",
+                "was_running": True
+            }
+
         with mission_lock:
             is_running = False
 
@@ -333,7 +395,8 @@ async def mission_status():
         "status": status,
         "thread_alive": thread_alive,
         "stop_requested": stop_requested,
-        "is_running": running_state
+        "is_running": running_state,
+        "worker": mission_worker.status() if mission_worker is not None else None
     }
 
 @app.get("/logs")
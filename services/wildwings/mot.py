@@ -0,0 +1,241 @@
+# Multi-object tracking between detection frames.
+# Detections are associated to tracks by IoU (ByteTrack style: confident detections first, then the
+# low-confidence ones against the tracks left over), every track keeps a constant-velocity Kalman
+# filter on its box, so each animal keeps its ID across frames and its box can be predicted at any
+# time, including frames on which no detection runs. One track is the locked target navigation
+# steers towards, so the target no longer jumps between animals from one detection to the next.
+
+import threading
+import logging
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+logger = logging.getLogger(__name__)
+
+
+def box_iou(a, b):
+    """
+    IoU matrix of two (N, 4) and (M, 4) xyxy box arrays
+    """
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def xyxy_to_state(box):
+    return np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2, box[2] - box[0], box[3] - box[1]], dtype=float)
+
+
+def state_to_xyxy(state):
+    cx, cy = state[0], state[1]
+    w, h = max(state[2], 1.0), max(state[3], 1.0)
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+
+class Track:
+    """
+    One tracked object: a Kalman filter on (cx, cy, w, h) and their velocities, in pixels and
+    pixels per second. Noise levels are fractions of the box size, so small distant animals and
+    large close ones are filtered alike.
+    """
+
+    def __init__(self, track_id, box, conf, cls, stamp, position_noise=0.05, velocity_noise=0.2, measurement_noise=0.05):
+        self.id = track_id
+        self.conf = float(conf)
+        self.cls = int(cls)
+        self.hits = 1
+        self.first_seen = stamp
+        self.last_update = stamp
+        self.stamp = stamp
+        self.position_noise = position_noise
+        self.velocity_noise = velocity_noise
+        self.measurement_noise = measurement_noise
+
+        measurement = xyxy_to_state(box)
+        scale = np.tile(measurement[2:], 2)
+        self.x = np.concatenate([measurement, np.zeros(4)])
+        # position as uncertain as a measurement, velocity unknown
+        self.P = np.diag(np.square(np.concatenate([2 * measurement_noise * scale, 10 * velocity_noise * scale])))
+
+    def transition(self, dt):
+        F = np.eye(8)
+        F[range(4), range(4, 8)] = dt
+        return F
+
+    def predict(self, stamp):
+        """
+        Advance the filter to `stamp`
+        """
+        dt = stamp - self.stamp
+        if dt <= 0:
+            return
+        F = self.transition(dt)
+        scale = np.tile(np.maximum(self.x[2:4], 1.0), 2)
+        Q = np.diag(np.square(np.concatenate([self.position_noise * scale, self.velocity_noise * scale]))) * dt
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+        self.stamp = stamp
+
+    def update(self, box, conf, cls, stamp):
+        self.predict(stamp)
+        z = xyxy_to_state(box)
+        R = np.diag(np.square(self.measurement_noise * np.tile(np.maximum(z[2:], 1.0), 2)))
+        S = self.P[:4, :4] + R
+        K = self.P[:, :4] @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.x[:4])
+        self.P = self.P - K @ self.P[:4, :]
+        self.conf = float(conf)
+        self.cls = int(cls)
+        self.hits += 1
+        self.last_update = stamp
+
+    @property
+    def box(self):
+        return state_to_xyxy(self.x)
+
+    def peek(self, stamp, max_coast=1.0):
+        """
+        Predicted xyxy box at `stamp` without changing the filter. Motion is extrapolated for at
+        most `max_coast` seconds past the last detection, a lost track stays where it was last heading.
+        """
+        dt = min(stamp, self.last_update + max_coast) - self.stamp
+        if dt <= 0:
+            return self.box
+        return state_to_xyxy(self.transition(dt) @ self.x)
+
+
+class MultiObjectTracker:
+    """
+    IoU + Kalman multi-object tracker with a locked target.
+
+    update() takes the detections of one frame, predict() returns the boxes of the live tracks at
+    any time. Boxes are xyxy in whatever coordinates the detections use. The target is locked
+    with lock_target(track_id), or automatically on the widest confirmed track (the closest
+    animal, the one navigation used to pick per frame); when it is lost the widest confirmed
+    track takes over.
+    """
+
+    def __init__(self, high_threshold=0.5, match_iou=0.3, max_age=3.0, min_hits=2, max_coast=1.0):
+        """
+        high_threshold  detections at least that confident start new tracks, the others only extend tracks
+        match_iou       minimum IoU between a predicted track box and a detection to associate them
+        max_age         seconds without a matching detection before a track is dropped
+        min_hits        detections before a track is confirmed and can become the target
+        max_coast       seconds a track's motion is extrapolated past its last detection
+        """
+        self.high_threshold = high_threshold
+        self.match_iou = match_iou
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.max_coast = max_coast
+        self.lock = threading.Lock()
+        self.tracks = []
+        self.next_id = 1
+        self.target_id = None
+        self.last_stamp = None
+        self.created = 0
+        self.target_switches = 0
+
+    def associate(self, tracks, boxes):
+        """
+        Optimal (track index, detection index) pairs with IoU >= match_iou
+        """
+        if not tracks or len(boxes) == 0:
+            return []
+        iou = box_iou(np.array([track.box for track in tracks]), boxes)
+        rows, cols = linear_sum_assignment(-iou)
+        return [(row, col) for row, col in zip(rows, cols) if iou[row, col] >= self.match_iou]
+
+    def update(self, boxes, conf, cls, stamp):
+        """
+        boxes  (N, 4) xyxy detections of the frame captured at `stamp` (seconds), with their conf and cls
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        conf = np.asarray(conf, dtype=float).reshape(-1)
+        cls = np.asarray(cls).reshape(-1)
+        with self.lock:
+            for track in self.tracks:
+                track.predict(stamp)
+
+            # confident detections first, then the remaining tracks get a chance at the weak ones
+            high = np.flatnonzero(conf >= self.high_threshold)
+            low = np.flatnonzero(conf < self.high_threshold)
+            unmatched = list(self.tracks)
+            matched_high = set()
+            for indices in (high, low):
+                pairs = self.associate(unmatched, boxes[indices])
+                for row, col in pairs:
+                    detection = indices[col]
+                    unmatched[row].update(boxes[detection], conf[detection], cls[detection], stamp)
+                    if indices is high:
+                        matched_high.add(detection)
+                matched_tracks = {row for row, _ in pairs}
+                unmatched = [track for i, track in enumerate(unmatched) if i not in matched_tracks]
+
+            for detection in high:
+                if detection not in matched_high:
+                    self.tracks.append(Track(self.next_id, boxes[detection], conf[detection], cls[detection], stamp))
+                    self.next_id += 1
+                    self.created += 1
+
+            self.tracks = [track for track in self.tracks if stamp - track.last_update <= self.max_age]
+            self.last_stamp = stamp
+            self.select_target()
+
+    def select_target(self):
+        """
+        Keep the locked target while it is tracked, otherwise lock onto the widest confirmed track
+        """
+        if any(track.id == self.target_id for track in self.tracks):
+            return
+        confirmed = [track for track in self.tracks if track.hits >= self.min_hits]
+        previous = self.target_id
+        self.target_id = None
+        if confirmed:
+            widest = max(confirmed, key=lambda track: track.box[2] - track.box[0])
+            self.target_id = widest.id
+        if self.target_id != previous:
+            if previous is not None:
+                self.target_switches += 1
+            logger.info(f"Target track: {previous} -> {self.target_id}")
+
+    def lock_target(self, track_id):
+        """
+        Lock onto a track by ID, returns False if no such track is alive
+        """
+        with self.lock:
+            if not any(track.id == track_id for track in self.tracks):
+                return False
+            if track_id != self.target_id:
+                logger.info(f"Target track locked: {self.target_id} -> {track_id}")
+                self.target_id = track_id
+            return True
+
+    def target(self):
+        """
+        The locked target Track, None without one
+        """
+        with self.lock:
+            return next((track for track in self.tracks if track.id == self.target_id), None)
+
+    def predict(self, stamp):
+        """
+        (ids, xyxy boxes, target index or None) of the tracks to steer by at `stamp`: the confirmed
+        tracks plus those started by the latest detection, so a first sighting is used at once
+        """
+        with self.lock:
+            tracks = [track for track in self.tracks
+                      if track.hits >= self.min_hits or track.last_update == self.last_stamp]
+            ids = [track.id for track in tracks]
+            boxes = np.array([track.peek(stamp, self.max_coast) for track in tracks]).reshape(-1, 4)
+            target = ids.index(self.target_id) if self.target_id in ids else None
+            return ids, boxes, target
+
+    def stats(self):
+        with self.lock:
+            return {"tracks": len(self.tracks), "created": self.created, "target": self.target_id,
+                    "target_switches": self.target_switches}
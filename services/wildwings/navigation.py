@@ -4,9 +4,9 @@
 import math
 import cv2
 import sys
-from ultralytics import YOLO
+import numpy as np
+from backends import load_backend
 from PIL import Image
-import pandas as pd
 import time
 import datetime
 import json
@@ -22,6 +22,11 @@ x_dist_no_subject = 20 # move +/- X meters forward if no subject detected
 y_dist = 10 # move +/- X meters in left/right plane
 z_dist = 10 # move +/- X meters in up/down plane
 
+# detector classes that are counted and followed, and their minimum confidence
+# (COCO ids: person 0, dog 16, horse 17, sheep 18, cow 19, zebra 22)
+SPECIES = ["person", "dog", "horse", "sheep", "cow", "zebra"]
+MIN_CONFIDENCE = 0.25
+
 def crop_image(image):
     """
     Crop the image to focus on the herd and improve YOLO results
@@ -34,122 +39,141 @@ def crop_image(image):
     # crop_image = image[int(height_quarter):int(height_quarter*3), int(width_third):int(width_third*2)]
     return crop_image
 
-def count_animals(results):
+class SpeciesFilter:
+    """
+    Class-set and confidence filter shared by counting and navigation.
+
+    Species are detector class names (or ids), resolved against the model's class names.
+    The class ids are also passed to the model as classes=, so NMS only sees those classes.
+    """
+
+    def __init__(self, species=SPECIES, min_confidence=MIN_CONFIDENCE):
+        self.species = list(species)
+        self.min_confidence = min_confidence
+        self.names = None
+        self.class_ids = None
+
+    def resolve(self, names):
+        """
+        Map the species to class ids of a model with the given {id: name} class names
+        """
+        if names is self.names:
+            return self.class_ids
+        ids_by_name = {name: class_id for class_id, name in names.items()}
+        class_ids = []
+        for species in self.species:
+            if isinstance(species, int):
+                class_ids.append(species)
+            elif species in ids_by_name:
+                class_ids.append(ids_by_name[species])
+            else:
+                raise ValueError(f"Unknown species for this model: {species}")
+        self.names = names
+        self.class_ids = np.array(sorted(class_ids))
+        return self.class_ids
+
+    def mask(self, result):
+        """
+        Boolean mask of the boxes of one Results that belong to the species and are confident enough
+        """
+        boxes = result.boxes
+        class_ids = self.resolve(result.names)
+        return np.isin(boxes.cls.numpy(), class_ids) & (boxes.conf.numpy() >= self.min_confidence)
+
+    def apply(self, results):
+        """
+        Drop the boxes outside the species or below the confidence threshold
+        """
+        keep = self.mask(results[0])
+        if not keep.all():
+            results[0] = results[0][keep]
+        return results
+
+default_species = SpeciesFilter()
+
+def count_animals(results, species=None):
     """
     Count the number of animals in the frame
     """
-    count = 0
-    for i in results[0].boxes.cls:
-        # cows: 19
-        # horses: 22
-        # sheep: 18
-        # zebras: 17
-        # dog: 16
-        # person: 0
-        if i == 19 or i == 22 or i == 18 or i == 17 or i==16 or i == 0: 
-            count += 1
-    return count
-
-def detect_animals(frame, model):
+    species = species or default_species
+    return int(species.mask(results[0]).sum())
+
+def detect_animals(frame, model, species=None):
     """
     Detect the animals in the frame
+    model is a detection backend (backends.py) or an ultralytics YOLO model,
+    only the species (default: SPECIES) are detected and returned
     """
-    results = model(frame)
-    count, results = count_animals(results), results
+    species = species or default_species
+    results = model(frame, classes=species.resolve(model.names).tolist())
+    results = species.apply(results)
+    count = len(results[0].boxes)
     return count, results 
 
 def auto_navigation(results):
-    # orig_shape outputs (height, width)
-    centroid_camera = (results[0].orig_shape[1]/2, results[0].orig_shape[0]/2)
-    
-    #px = pd.DataFrame((results[0].boxes.boxes).numpy(), columns = ('x1', 'y1','x2', 'y2', 'confidence', 'class'))
-    px = pd.DataFrame((results[0].boxes.xyxy).numpy(), columns = ('x1', 'y1','x2', 'y2'))
-    # get x, y, w, h for results and convert to dataframe
-    pxywh = pd.DataFrame((results[0].boxes.xywh).numpy(), columns = ('x', 'y','w', 'h'))
-    px = px.join(pxywh)
+    """
+    Next move (x, y, z) in meters that keeps the tracked subject in the frame.
+
+    Works on the raw numpy boxes: the subject is the widest box after a 1.5x expansion,
+    the herd extent is the union of the expanded boxes.
+    """
+    # x, y, w, h of each detection, float32 like the model output
+    return box_navigation(results[0].boxes.xywh.numpy(), results[0].orig_shape)
+
+def box_navigation(xywh, orig_shape, target=None):
+    """
+    auto_navigation on (N, 4) xywh boxes in an image of orig_shape (height, width).
+    target is the index of the subject box, e.g. the locked track; the widest box if None.
+    """
+    image_shape_h, image_shape_w = orig_shape
+    centroid_camera = (image_shape_w/2, image_shape_h/2)
+
+    if len(xywh) == 0:
+        # no detection: the subject is at the camera centre and there is no herd extent
+        return 0, 0, 0
 
     # Increase bounding box size for better tracking (1.5x expansion)
     expansion_factor = 1.5
-    px['w'] = px['w'] * expansion_factor
-    px['h'] = px['h'] * expansion_factor
+    w = xywh[:, 2] * expansion_factor
 
     # Recalculate corner coordinates based on expanded dimensions
-    px['x1'] = px['x'] - (px['w'] / 2)
-    px['y1'] = px['y'] - (px['h'] / 2)
-    px['x2'] = px['x'] + (px['w'] / 2)
-    px['y2'] = px['y'] + (px['h'] / 2)
-
-    # calculate bounding box sizes in terms of pixel width and height
-    bbox_sizes = []
-    for b in results[0].boxes.xywh:
-        bbox_sizes.append((b[2] * expansion_factor, b[3] * expansion_factor)) # get width and height of bounding box
-
-    # get centroid of single person (if multiple detections, use the largest/closest one)
-    if len(px) > 0:
-        # Find the largest bounding box (assuming closest person)
-        largest_idx = px['w'].idxmax()
-        centroid_person = (px.loc[largest_idx, 'x'], px.loc[largest_idx, 'y'])
-    else:
-        # Fallback to center if no detection
-        centroid_person = (results[0].orig_shape[1]/2, results[0].orig_shape[0]/2)
+    x1 = xywh[:, 0] - (w / 2)
+    x2 = xywh[:, 0] + (w / 2)
 
-    # Use single person centroid instead of herd centroid
-    centroid_herd = centroid_person
+    # Find the largest bounding box (assuming closest person), first one on ties
+    largest_idx = np.argmax(w) if target is None else target
+    centroid_herd = (xywh[largest_idx, 0], xywh[largest_idx, 1])
 
-    image_shape_h, image_shape_w = results[0].orig_shape
     x_center_range = image_shape_w/2 - image_shape_w/8, image_shape_w/2 + image_shape_w/8
-    y_center_range = image_shape_h/2 - image_shape_h/8, image_shape_h/2 + image_shape_h/8
 
     # calculate differencee between centroid of herd and camera
     dif_x = centroid_herd[0] - centroid_camera[0]
-    dif_y = centroid_herd[1] - centroid_camera[1]
 
     # get the middle 75% of the image, i.e. 12.5% on each side
-    left_range = results[0].orig_shape[1]/8
-    right_range = results[0].orig_shape[1] - left_range
-    top_range = results[0].orig_shape[0]/8
-    bottom_range = results[0].orig_shape[0] - top_range
+    left_range = image_shape_w/8
+    right_range = image_shape_w - left_range
 
     # get range of x values for herd
-    x_min_herd, x_max_herd = px['x1'].min(), px['x2'].max()
-    y_min_herd, y_max_herd = px['y1'].min(), px['y2'].max()
-
-    # Calculate next move for drone in x, y, z direction
+    x_min_herd, x_max_herd = x1.min(), x2.max()
 
     # navigation policy: move x, y, z, yaw until herd is in center of camera frame, keep checking every 1 sec to adjust
     # continuous adjustments allows us to avoid complex calculations and avoid overshooting
-    # direction_x = "No movement in x-axis"
-    # direction_y = "No movement in y-axis"
-    # direction_z = "No movement in z-axis"
     direction_x = 0
     direction_y = 0
     direction_z = 0
 
     if (centroid_herd[0] < x_center_range[0]) | (centroid_herd[0] > x_center_range[1]):
-        if dif_x > 0:
-            #print("y-axis: Move right")
-            direction_y = +y_dist # move right
-        elif dif_x < 0:
-            #print("y-axis: Move left")
-            direction_y = -y_dist # move left
-        else:
-            #print("y-axis: No movement in y-axis")
-            direction_y = 0
-    else:
-        #print("y-axis: No movement in y-axis")
-        direction_y = 0
+        direction_y = +y_dist if dif_x > 0 else -y_dist # move right / left
 
     # if no movement left or right, move forward or backward
     if direction_y == 0:
         # check to see if herd is in center 75% of camera frame
         if (x_min_herd >= left_range) | (x_max_herd <= right_range):
-            #print("x-axis: Move forward")
             direction_x = x_dist # move forward
-        elif (x_min_herd <= left_range) | (x_max_herd >= right_range):
-            #print("x-axis: Move backward")
+        else:
             direction_y = -x_dist # move backward
     else:
-        #print("No movement in x-axis")
+        # NOTE the policy has always cancelled left/right moves here, kept as is
         direction_y = 0
 
     # note: y-axis in image is actually z-axis in drone; y-axis in image is inverted (0,0 is top left corner)
@@ -158,12 +182,15 @@ def auto_navigation(results):
 
     return  direction_x, direction_y, direction_z
 
-def get_next_action(frame, model, directory, frame_counter):
+def get_next_action(frame, model, directory, frame_counter, frame_writer=None):
     # Get the position of the herd in the frame
     count, results = detect_animals(frame, model)
 
-    # save the frame with bounding boxes
-    results[0].save(directory + '/' + str(frame_counter) + '.jpg')
+    # save the frame with bounding boxes, in the background if a FrameWriter (frame_writer.py) is given
+    if frame_writer is not None:
+        frame_writer.submit(frame_counter, results, time.monotonic(), count)
+    else:
+        results[0].save(directory + '/' + str(frame_counter) + '.jpg')
 
     # animals detected, determine where to move
     x, y, z, = auto_navigation(results)
@@ -174,10 +201,10 @@ def main(image_path, directory):
     #image = cv2.imread(image_path)
 
     # crop the frame to focus on center of image
-    frame = crop_image(image_path)
+    frame = cv2.cvtColor(np.asarray(crop_image(image_path)), cv2.COLOR_RGB2BGR)
 
     # Load the YOLO model to detect animals
-    model = YOLO('yolov5su')
+    model = load_backend('yolov5su')
 
     # Determine where the drone should move to keep the herd in the frame
     # sleep for 1 second to allow drone to move
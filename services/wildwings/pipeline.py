@@ -0,0 +1,161 @@
+# Building blocks for the staged tracking pipeline.
+# Each stage runs on its own thread and hands items to the next one through a bounded Channel.
+# A full channel drops its oldest item instead of blocking the producer, so a slow disk write or
+# a blocking flight command never stalls frame intake or inference; it only skips stale items.
+
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Channel:
+    """
+    Bounded channel between two stages. put() never blocks: when the channel is full the
+    oldest item is dropped. With the default capacity of 1 it is a latest-value slot.
+    """
+
+    def __init__(self, name, capacity=1):
+        self.name = name
+        self.capacity = capacity
+        self.cond = threading.Condition(threading.Lock())
+        self.items = deque()
+        self.closed = False
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if self.closed:
+                return
+            self.put_count += 1
+            if len(self.items) >= self.capacity:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def offer(self, item):
+        """
+        put() only if nothing would be dropped, returns False when the channel is full
+        """
+        with self.cond:
+            if self.closed or len(self.items) >= self.capacity:
+                return False
+            self.put_count += 1
+            self.items.append(item)
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Next item, or None on timeout or once the channel is closed and drained
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.items or self.closed, timeout)
+            if self.items:
+                item = self.items.popleft()
+                self.cond.notify_all()
+                return item
+            return None
+
+    def wait_space(self, timeout=None):
+        """
+        Wait until a put() would not drop anything, returns False on timeout
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.items) < self.capacity or self.closed, timeout)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {"put": self.put_count, "dropped": self.dropped, "pending": len(self.items)}
+
+
+class StageLatency:
+    """
+    Rolling per-stage latency, logged as one breakdown line every `interval` seconds
+    """
+
+    def __init__(self, interval=10.0, window=100):
+        self.interval = interval
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.next_report = time.monotonic() + interval
+
+    def record(self, stage, seconds):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+            due = time.monotonic() >= self.next_report
+            if due:
+                self.next_report = time.monotonic() + self.interval
+        if due:
+            logger.info(f"Stage latency: {self.format()}")
+
+    def summary(self):
+        """
+        {stage: {"mean_ms", "max_ms", "count"}} over the last `window` samples of each stage
+        """
+        with self.lock:
+            return {
+                stage: {
+                    "mean_ms": round(1000 * sum(samples) / len(samples), 1),
+                    "max_ms": round(1000 * max(samples), 1),
+                    "count": len(samples),
+                }
+                for stage, samples in self.samples.items() if samples
+            }
+
+    def format(self):
+        return ", ".join(f"{stage} {values['mean_ms']} ms (max {values['max_ms']})" for stage, values in self.summary().items())
+
+
+class Stage:
+    """
+    Runs handler(item) on its own thread for every item taken from `channel`, and records
+    the handler time under the stage name. The thread ends once the channel is closed and drained.
+    """
+
+    def __init__(self, name, channel, handler, latency):
+        self.name = name
+        self.channel = channel
+        self.handler = handler
+        self.latency = latency
+        self.processed = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self.run, name=f"Tracker-{name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.channel.get(timeout=0.5)
+            if item is None:
+                if self.channel.closed:
+                    return
+                continue
+            start = time.monotonic()
+            try:
+                self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"{self.name} stage failed: {e}")
+            self.latency.record(self.name, time.monotonic() - start)
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {"processed": self.processed, "errors": self.errors, "channel": self.channel.stats()}
@@ -0,0 +1,91 @@
+# Region-of-interest planning for the tracker.
+# Once a target is found, detection runs on a native-resolution window around it instead of on the
+# downscaled full frame: small, distant animals keep all their pixels and the detector input is
+# smaller. The window follows the target box, shifted by its predicted motion and padded. The
+# full frame is used again periodically, to see new animals, and as soon as the target is lost.
+
+import threading
+
+import numpy as np
+
+
+class RoiPlanner:
+    """
+    Chooses the detection window of the next frame from the last target box.
+
+    All coordinates are native frame pixels. plan() returns (x, y, width, height) or None for a
+    full-frame detection, update() takes the detections of the frame that was just processed.
+    The target is the widest box, the same one navigation steers towards.
+    """
+
+    def __init__(self, window=(320, 320), padding=0.5, full_frame_interval=10, max_window_fraction=0.5, smoothing=0.5):
+        """
+        window               minimum (height, width) of the window, the ROI detector input size
+        padding              margin added around the target box, as a fraction of its size
+        full_frame_interval  a full-frame detection every that many frames, even with a target
+        max_window_fraction  larger windows (of the frame width / height) use the full frame instead
+        smoothing            weight of the newest velocity measurement
+        """
+        self.window = window
+        self.padding = padding
+        self.full_frame_interval = full_frame_interval
+        self.max_window_fraction = max_window_fraction
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.box = None
+        self.stamp = None
+        self.velocity = np.zeros(2)
+        self.since_full_frame = 0
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.lost = 0
+
+    def plan(self, frame_width, frame_height, stamp):
+        with self.lock:
+            if self.box is None or self.since_full_frame >= self.full_frame_interval:
+                self.since_full_frame = 0
+                self.full_frames += 1
+                return None
+
+            x1, y1, x2, y2 = self.box
+            # predicted target centre at the capture time of the new frame
+            shift = self.velocity * max(stamp - self.stamp, 0.0)
+            center_x, center_y = (x1 + x2) / 2 + shift[0], (y1 + y2) / 2 + shift[1]
+            width = max(self.window[1], (x2 - x1) * (1 + 2 * self.padding) + 2 * abs(shift[0]))
+            height = max(self.window[0], (y2 - y1) * (1 + 2 * self.padding) + 2 * abs(shift[1]))
+            if width > frame_width * self.max_window_fraction or height > frame_height * self.max_window_fraction:
+                self.full_frames += 1
+                return None
+
+            # even coordinates and sizes, as the chroma planes require
+            width, height = int(width) & ~1, int(height) & ~1
+            x = int(min(max(center_x - width / 2, 0), frame_width - width)) & ~1
+            y = int(min(max(center_y - height / 2, 0), frame_height - height)) & ~1
+            self.since_full_frame += 1
+            self.roi_frames += 1
+            return x, y, width, height
+
+    def update(self, boxes, stamp, window=None):
+        """
+        boxes   (N, 4) xyxy detections of the frame, in native frame pixels
+        stamp   capture time of the frame, in seconds
+        window  the window the frame was detected in, None for the full frame
+        """
+        with self.lock:
+            if len(boxes) == 0:
+                if window is not None:
+                    self.lost += 1
+                self.box = None
+                self.velocity[:] = 0
+                return
+
+            box = boxes[np.argmax(boxes[:, 2] - boxes[:, 0])].astype(float)
+            if self.box is not None and stamp > self.stamp:
+                moved = (box[:2] + box[2:]) / 2 - (self.box[:2] + self.box[2:]) / 2
+                self.velocity += self.smoothing * (moved / (stamp - self.stamp) - self.velocity)
+            self.box = box
+            self.stamp = stamp
+
+    def stats(self):
+        with self.lock:
+            return {"roi_frames": self.roi_frames, "full_frames": self.full_frames, "lost": self.lost}
@@ -0,0 +1,92 @@
+# Frame-synchronous telemetry from the video metadata (vmeta) attached to each stream frame.
+# The pose read from the frame is the pose at capture time; get_drone_coordinates() returns the
+# pose at processing time, possibly hundreds of ms later, and takes a state lookup per call.
+
+import math
+import datetime
+
+TELEMETRY_FIELDS = [
+    "latitude", "longitude", "altitude", "ground_distance",
+    "roll", "pitch", "yaw",
+    "gimbal_roll", "gimbal_pitch", "gimbal_yaw",
+    "speed_north", "speed_east", "speed_down",
+    "hfov", "vfov", "timestamp", "utc_timestamp",
+]
+
+
+def quaternion_to_euler(quat):
+    """
+    Convert a {w, x, y, z} NED quaternion to (roll, pitch, yaw) in degrees, yaw is the heading from north
+    """
+    w, x, y, z = (float(quat.get(k, 0.0)) for k in ("w", "x", "y", "z"))
+    roll = math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = math.asin(max(-1.0, min(1.0, 2 * (w * y - z * x))))
+    yaw = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return math.degrees(roll), math.degrees(pitch), math.degrees(yaw)
+
+
+def vmeta_telemetry(vmeta):
+    """
+    Extract the telemetry of one frame from yuv_frame.vmeta()[1].
+    Handles protobuf metadata ("drone" / "camera") and v3 metadata ("base").
+    Fields the metadata does not provide (e.g. position before GPS fix) are None.
+    """
+    if not vmeta:
+        return None
+    telemetry = dict.fromkeys(TELEMETRY_FIELDS)
+
+    if "drone" in vmeta or "camera" in vmeta:
+        drone = vmeta.get("drone", {})
+        camera = vmeta.get("camera", {})
+        location = drone.get("position") or drone.get("location") or {}
+        drone_quat = drone.get("quat")
+        camera_quat = camera.get("quat")
+        speed = drone.get("speed") or {}
+        telemetry["hfov"] = camera.get("hfov")
+        telemetry["vfov"] = camera.get("vfov")
+        telemetry["timestamp"] = camera.get("timestamp")
+        telemetry["utc_timestamp"] = camera.get("utc_timestamp")
+    else:
+        drone = vmeta.get("base", vmeta)
+        location = drone.get("location") or {}
+        drone_quat = drone.get("drone_quat")
+        camera_quat = drone.get("frame_quat")
+        speed = drone.get("speed") or {}
+        telemetry["timestamp"] = vmeta.get("timestamp")
+
+    # protobuf metadata omits the position until the drone has a fix, v3 flags it
+    if location.get("valid", True) and "latitude" in location:
+        telemetry["latitude"] = float(location["latitude"])
+        telemetry["longitude"] = float(location["longitude"])
+        altitude = location.get("altitude_egm96amsl", location.get("altitude_wgs84", location.get("altitude")))
+        telemetry["altitude"] = float(altitude) if altitude is not None else None
+
+    if drone.get("ground_distance") is not None:
+        telemetry["ground_distance"] = float(drone["ground_distance"])
+    if drone_quat:
+        telemetry["roll"], telemetry["pitch"], telemetry["yaw"] = quaternion_to_euler(drone_quat)
+    if camera_quat:
+        telemetry["gimbal_roll"], telemetry["gimbal_pitch"], telemetry["gimbal_yaw"] = quaternion_to_euler(camera_quat)
+    for axis in ("north", "east", "down"):
+        if speed.get(axis) is not None:
+            telemetry["speed_" + axis] = float(speed[axis])
+    return telemetry
+
+
+def frame_telemetry(frame):
+    """
+    Telemetry of an olympe.VideoFrame, None if the frame carries no metadata
+    """
+    try:
+        return vmeta_telemetry(frame.vmeta()[1])
+    except Exception:
+        return None
+
+
+def capture_time(telemetry):
+    """
+    Capture time of the frame as a datetime, the current time if the metadata has no UTC timestamp
+    """
+    if telemetry and telemetry.get("utc_timestamp"):
+        return datetime.datetime.fromtimestamp(int(telemetry["utc_timestamp"]) / 1e6)
+    return datetime.datetime.now()
@@ -0,0 +1,181 @@
+# Buffered telemetry log for the mission records.
+# The telemetry CSV used to be opened, written one row and closed for every processed frame. The
+# sink keeps the file open for the whole mission, buffers rows in memory and writes them in batches,
+# every `flush_interval` seconds from a background thread, when `flush_rows` rows are waiting, and
+# when the mission ends. A row stays buffered for at least `settle` seconds, so values known only
+# after it was written (when its flight command was sent) still make it into the file. Besides
+# CSV it writes Parquet or an Arrow IPC stream when pyarrow is installed, with typed columns,
+# one row group / record batch per flush.
+
+import os
+import csv
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+# column name and Arrow type of a mission record, in CSV column order
+RECORD_COLUMNS = [
+    ("timestamp", "string"),
+    ("x", "float64"), ("y", "float64"), ("z", "float64"),
+    ("move_x", "float64"), ("move_y", "float64"), ("move_z", "float64"),
+    ("frame", "int64"),
+    ("ground_distance", "float64"),
+    ("roll", "float64"), ("pitch", "float64"), ("yaw", "float64"),
+    ("gimbal_roll", "float64"), ("gimbal_pitch", "float64"), ("gimbal_yaw", "float64"),
+    ("track_id", "int64"),
+    ("detections", "int64"),
+    ("inference_ms", "float64"),
+    ("command_sent_ms", "float64"),
+]
+
+
+class TelemetrySink:
+    """
+    Long-lived, buffered writer of telemetry rows (dicts keyed by column name).
+
+    write(row, key) buffers a row; annotate(key, **values) adds values to a row that is still
+    buffered, or to the row written next under that key, for fields known only after the row was
+    written (e.g. when the flight command for the frame was sent).
+    """
+
+    def __init__(self, path, columns=RECORD_COLUMNS, file_format="csv", flush_interval=2.0, flush_rows=100, settle=1.0):
+        """
+        path            output file, its extension is replaced by the one of the format
+        columns         [(name, arrow type)] of the rows
+        file_format     "csv", "parquet" or "arrow"; without pyarrow, "csv" is used instead
+        flush_interval  seconds between two background flushes
+        flush_rows      buffered rows that trigger a flush on write
+        settle          seconds a row stays buffered before a flush writes it, except on close
+        """
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown telemetry format: {file_format}")
+        if file_format != "csv":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                logger.warning(f"pyarrow is not installed, writing telemetry as CSV instead of {file_format}")
+                file_format = "csv"
+        self.file_format = file_format
+        self.path = os.path.splitext(path)[0] + FORMATS[file_format]
+        self.columns = columns
+        self.names = [name for name, _ in columns]
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.settle = settle
+
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.rows = []
+        self.keyed = {}
+        self.early = {}
+        self.file = None
+        self.writer = None
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="TelemetrySink", daemon=True)
+        self.written = 0
+        self.flushes = 0
+        self.flush_time = 0.0
+        self.open()
+
+    def open(self):
+        if self.file_format == "csv":
+            new_file = not os.path.exists(self.path)
+            self.file = open(self.path, mode='a', newline='', buffering=1 << 16)
+            self.writer = csv.writer(self.file)
+            if new_file:
+                self.writer.writerow(self.names)
+                self.file.flush()
+        else:
+            import pyarrow as pa
+
+            self.schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in self.columns])
+            if self.file_format == "parquet":
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                self.file = pa.OSFile(self.path, "wb")
+                self.writer = pa.ipc.new_stream(self.file, self.schema)
+        os.chmod(self.path, 0o644)
+        logger.info(f"Telemetry log: {self.path}")
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def write(self, row, key=None):
+        with self.lock:
+            if key is not None:
+                row.update(self.early.pop(key, {}))
+                self.keyed[key] = row
+            self.rows.append((time.monotonic(), key, row))
+            due = len(self.rows) >= self.flush_rows
+        if due:
+            self.flush()
+
+    def annotate(self, key, **values):
+        with self.lock:
+            row = self.keyed.get(key)
+            if row is not None:
+                row.update(values)
+            elif len(self.early) < self.flush_rows:
+                self.early.setdefault(key, {}).update(values)
+
+    def flush(self, settled_only=True):
+        with self.write_lock:
+            with self.lock:
+                cutoff = time.monotonic() - self.settle if settled_only else float("inf")
+                count = 0
+                while count < len(self.rows) and self.rows[count][0] <= cutoff:
+                    count += 1
+                rows = [row for _, _, row in self.rows[:count]]
+                for _, key, _ in self.rows[:count]:
+                    self.keyed.pop(key, None)
+                del self.rows[:count]
+            if not rows or self.writer is None:
+                return
+            start = time.monotonic()
+            try:
+                if self.file_format == "csv":
+                    self.writer.writerows([[row.get(name) for name in self.names] for row in rows])
+                    self.file.flush()
+                else:
+                    import pyarrow as pa
+                    table = pa.Table.from_pylist([{name: row.get(name) for name in self.names} for row in rows], schema=self.schema)
+                    self.writer.write_table(table)
+                self.written += len(rows)
+                self.flushes += 1
+                self.flush_time += time.monotonic() - start
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} telemetry rows: {e}")
+
+    def close(self):
+        """
+        Flush the buffered rows and close the file; safe to call more than once
+        """
+        self.closed.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=self.flush_interval + 5)
+        self.flush(settled_only=False)
+        with self.write_lock:
+            if self.writer is not None and self.file_format != "csv":
+                self.writer.close()
+            if self.file is not None:
+                self.file.close()
+            self.writer = None
+            self.file = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "rows": self.written,
+                "flushes": self.flushes,
+                "pending": len(self.rows),
+                "mean_flush_ms": round(1000 * self.flush_time / self.flushes, 1) if self.flushes else None,
+            }
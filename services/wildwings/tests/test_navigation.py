@@ -0,0 +1,45 @@
+# Golden-output regression test for navigation.auto_navigation.
+# tests/data/navigation_detections.npz holds detection sets with the moves the original pandas
+# implementation returned for them, written by benchmarks/navigation_policy.py --write-fixture.
+
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import navigation
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "navigation_detections.npz")
+
+
+class Boxes(np.ndarray):
+    """
+    numpy array with the .numpy() accessor of the ultralytics box tensors
+    """
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+def load_fixture():
+    data = np.load(FIXTURE)
+    orig_shape = tuple(int(v) for v in data["orig_shape"])
+    frames = [key for key in data.files if key not in ("orig_shape", "expected")]
+    return [(key, data[key], orig_shape, tuple(data["expected"][i])) for i, key in enumerate(frames)]
+
+
+CASES = load_fixture()
+
+
+@pytest.mark.parametrize("name, xywh, orig_shape, expected", CASES, ids=[case[0] for case in CASES])
+def test_auto_navigation_matches_reference(name, xywh, orig_shape, expected):
+    results = [SimpleNamespace(boxes=SimpleNamespace(xywh=xywh.view(Boxes)), orig_shape=orig_shape)]
+    assert tuple(navigation.auto_navigation(results)) == expected
+
+
+def test_fixture_covers_every_move():
+    moves = {case[3] for case in CASES}
+    assert moves == {(0, 0, 0), (navigation.x_dist, 0, 0), (0, -navigation.x_dist, 0)}
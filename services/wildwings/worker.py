@@ -0,0 +1,264 @@
+# Resident mission worker.
+# The service starts this process once. It imports olympe/ultralytics, loads and warms the YOLO
+# models and creates the SoftwarePilot instance up front, then waits for missions on a local
+# authenticated socket (multiprocessing.connection), so a mission starts without the cold start
+# of launch.sh -> python3 controller.py. main.py talks to it through MissionWorker and falls back
+# to launch.sh while the worker is not ready.
+
+import os
+import sys
+import time
+import secrets
+import logging
+import threading
+import subprocess
+from multiprocessing.connection import Client, Listener
+
+logger = logging.getLogger("wildwings")
+
+WORKER_KEY_ENV = "WILDWINGS_WORKER_KEY"
+
+
+class MissionWorker:
+    """
+    Service side of the resident worker: starts the process, connects to it and runs missions on it.
+
+    Messages are dicts. The service sends {"cmd": "start", "output_dir", "lat", "lon", "limits"},
+    {"cmd": "stop"} and {"cmd": "shutdown"}; the worker answers {"event": "ready"},
+    {"event": "started"}, {"event": "busy"} and {"event": "finished", "success", "error", "reason"}.
+    """
+
+    def __init__(self, port=2200, connect_timeout=300.0, stop_timeout=60.0):
+        self.address = ("127.0.0.1", port)
+        self.authkey = secrets.token_hex(16).encode()
+        self.connect_timeout = connect_timeout
+        self.stop_timeout = stop_timeout
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.ready_info = None
+        self.connect_thread = None
+
+    @property
+    def ready(self):
+        with self.lock:
+            return self.conn is not None and self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """
+        Start the worker process and connect to it in the background once its model is loaded
+        """
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                return
+            env = os.environ.copy()
+            env["PYTHONUNBUFFERED"] = "1"
+            env[WORKER_KEY_ENV] = self.authkey.decode()
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py"), str(self.address[1])],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=env
+            )
+            self.conn = None
+            self.ready_info = None
+        logger.info(f"Mission worker started (pid {self.process.pid}), waiting for model warm-up")
+        self.connect_thread = threading.Thread(target=self.connect, name="WildWings-WorkerConnect", daemon=True)
+        self.connect_thread.start()
+
+    def connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        process = self.process
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except OSError:
+                # the worker only listens once the model is warm
+                time.sleep(0.5)
+                continue
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                conn.close()
+                time.sleep(0.5)
+                continue
+            with self.lock:
+                if self.process is not process:
+                    conn.close()
+                    return
+                self.conn = conn
+                self.ready_info = message
+            logger.info(f"Mission worker ready: {message}")
+            return
+        logger.error("Mission worker did not become ready, missions will use launch.sh")
+
+    def run_mission(self, output_dir, lat=None, lon=None, stop_flag=None, limits=None):
+        """
+        Run one mission on the worker and block until it finishes.
+        limits is a dict of end conditions (end_conditions.LIMIT_TYPES), None for the defaults.
+        Returns True on success. When stop_flag is set the worker is asked to end the mission;
+        if it has not finished stop_timeout seconds later the worker is killed and restarted.
+        """
+        with self.lock:
+            conn = self.conn
+        conn.send({"cmd": "start", "output_dir": output_dir, "lat": lat, "lon": lon, "limits": limits})
+
+        stop_sent_at = None
+        while True:
+            if stop_flag is not None and stop_flag.is_set() and stop_sent_at is None:
+                logger.info("Stop signal received, asking worker to end the mission")
+                conn.send({"cmd": "stop"})
+                stop_sent_at = time.monotonic()
+            if stop_sent_at is not None and time.monotonic() - stop_sent_at > self.stop_timeout:
+                logger.error("Worker did not end the mission in time, restarting it")
+                self.restart()
+                return False
+            try:
+                if not conn.poll(0.5):
+                    continue
+                message = conn.recv()
+            except (EOFError, OSError):
+                logger.error("Lost connection to mission worker, restarting it")
+                self.restart()
+                return False
+
+            event = message.get("event")
+            if event == "started":
+                logger.info(f"Mission started on worker: {output_dir}")
+            elif event == "busy":
+                logger.error("Worker is still running a previous mission")
+                return False
+            elif event == "finished":
+                if not message.get("success"):
+                    logger.error(f"Mission failed on worker: {message.get('error')}")
+                elif message.get("reason"):
+                    logger.info(f"Mission finished on worker, tracking ended: {message['reason']}")
+                return bool(message.get("success"))
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+    def kill(self):
+        with self.lock:
+            process, conn = self.process, self.conn
+            self.process = None
+            self.conn = None
+        if conn is not None:
+            conn.close()
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait(timeout=5)
+
+    def shutdown(self, timeout=10.0):
+        with self.lock:
+            process, conn = self.process, self.conn
+            self.process = None
+            self.conn = None
+            self.ready_info = None
+        if process is None:
+            return
+        if conn is not None:
+            try:
+                conn.send({"cmd": "shutdown"})
+            except OSError:
+                pass
+            conn.close()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("Mission worker did not exit, killing it")
+            process.kill()
+            process.wait(timeout=5)
+        logger.info("Mission worker stopped")
+
+    def status(self):
+        with self.lock:
+            return {
+                "pid": self.process.pid if self.process is not None else None,
+                "alive": self.process is not None and self.process.poll() is None,
+                "ready": self.conn is not None,
+                "info": self.ready_info,
+            }
+
+
+def serve(port, authkey):
+    """
+    Worker process main loop: warm up, then serve missions to the service one at a time
+    """
+    # heavy imports (olympe, ultralytics, torch) happen here, once per worker
+    import controller
+    from SoftwarePilot import SoftwarePilot
+
+    start = time.monotonic()
+    model = controller.load_model()
+    roi_model = controller.load_roi_model()
+    sp = SoftwarePilot()
+    warmup = time.monotonic() - start
+
+    listener = Listener(("127.0.0.1", port), authkey=authkey)
+    controller.logger.info(f"Mission worker listening on 127.0.0.1:{port}")
+
+    send_lock = threading.Lock()
+    stop_event = threading.Event()
+    mission_thread = None
+    shutdown = False
+
+    def send(conn, message):
+        with send_lock:
+            try:
+                conn.send(message)
+            except OSError:
+                pass
+
+    def mission(conn, output_dir, lat, lon, limits):
+        success, error, reason = False, None, None
+        try:
+            reason = controller.run_mission(output_dir, lat, lon, model=model, sp=sp, stop_event=stop_event,
+                                            roi_model=roi_model, limits=limits)
+            success = True
+        except Exception as e:
+            error = str(e)
+        send(conn, {"event": "finished", "success": success, "error": error, "reason": reason})
+
+    while not shutdown:
+        conn = listener.accept()
+        send(conn, {"event": "ready", "model": controller.MODEL_NAME, "warmup_s": round(warmup, 2)})
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                # the service went away: end the current mission, then wait for it to reconnect
+                stop_event.set()
+                break
+
+            cmd = message.get("cmd")
+            if cmd == "start":
+                if mission_thread is not None and mission_thread.is_alive():
+                    send(conn, {"event": "busy"})
+                    continue
+                stop_event.clear()
+                send(conn, {"event": "started"})
+                mission_thread = threading.Thread(
+                    target=mission,
+                    args=(conn, message["output_dir"], message.get("lat"), message.get("lon"), message.get("limits")),
+                    name="WildWings-WorkerMission"
+                )
+                mission_thread.start()
+            elif cmd == "stop":
+                stop_event.set()
+            elif cmd == "shutdown":
+                stop_event.set()
+                shutdown = True
+                break
+        conn.close()
+        if mission_thread is not None:
+            mission_thread.join()
+
+    listener.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or WORKER_KEY_ENV not in os.environ:
+        print(f"Usage: {WORKER_KEY_ENV}=<key> python worker.py <port>")
+        sys.exit(1)
+    serve(int(sys.argv[1]), os.environ[WORKER_KEY_ENV].encode())